@@ -0,0 +1,71 @@
+"""Command-line batch runner: send a JSONL prompt set to an agent runtime.
+
+Usage:
+    python -m app.batch prompts.jsonl results.jsonl --agent-arn ARN [--region REGION]
+        [--concurrency N] [--rate PER_SECOND] [--retry-failed] [--profile NAME]
+
+Each input line is {"prompt": ...} with optional "id", "agent_arn" and
+"session" fields. Each output line holds the response, any error and the
+per-call latency breakdown. Re-running with the same output file resumes
+where the previous run stopped.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add project root to Python path
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from app.config.settings import BATCH_CONCURRENCY, BATCH_RATE_LIMIT_PER_SECOND, DEFAULT_REGION
+from app.core.aws_client import AwsCredentials
+from app.services.batch_runner import BatchRunner, load_prompts
+
+
+def main(argv=None):
+    """Batch runner entry point."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of prompts")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--agent-arn", default="", help="Agent runtime ARN for lines without one")
+    parser.add_argument("--region", default=DEFAULT_REGION, help="AWS region of agent ARNs without one")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="Sessions run in parallel")
+    parser.add_argument("--rate", type=float, default=BATCH_RATE_LIMIT_PER_SECOND,
+                        help="Maximum agent calls per second (0 = unlimited)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Re-run prompts whose earlier result was an error")
+    parser.add_argument("--profile", help="AWS profile (default: environment credential chain)")
+    args = parser.parse_args(argv)
+
+    credentials = AwsCredentials.from_environment(args.profile)
+    if not credentials:
+        parser.error("No AWS credentials found; set AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY or use --profile")
+
+    prompts = load_prompts(args.input)
+    runner = BatchRunner(
+        credentials,
+        args.region,
+        agent_arn=args.agent_arn,
+        concurrency=args.concurrency,
+        rate_per_second=args.rate
+    )
+
+    done = 0
+
+    def report(record):
+        nonlocal done
+        done += 1
+        status = f"error: {record['error']}" if record["error"] else f"{record['total_seconds']:.2f}s"
+        print(f"[{done}] {record['id']} {status}", file=sys.stderr)
+
+    summary = runner.run(prompts, args.output, retry_failed=args.retry_failed, on_result=report)
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,209 @@
 """Application configuration settings."""
 
+import os
+import tempfile
+
 # Default AWS region
 DEFAULT_REGION = "us-east-1"
 
 # Application title
 APP_TITLE = "🤖 AI Chat Assistant"
 
+# Bytes read from the agent response body per chunk while streaming.
+# Small reads keep time-to-first-token low for event-stream responses.
+STREAM_CHUNK_SIZE = 128
+
+# JSON replies without a text field are shown as JSON; above this many
+# characters they are shown compact instead of pretty-printed
+JSON_PRETTY_PRINT_MAX_CHARS = 100_000
+
+# Maximum number of boto3 clients kept in the process-wide client pool
+AWS_CLIENT_POOL_SIZE = 64
+
+# HTTP connections kept open per pooled client
+AWS_MAX_POOL_CONNECTIONS = 20
+
+# Enable TCP keep-alive on pooled client connections
+AWS_TCP_KEEPALIVE = True
+
+# Seconds a discovered agent list is served before it is refreshed in the background
+AGENT_DISCOVERY_TTL_SECONDS = 300
+
+# Seconds before a failed agent discovery is retried
+AGENT_DISCOVERY_ERROR_TTL_SECONDS = 30
+
+# Seconds between sidebar checks while the very first agent discovery runs
+AGENT_DISCOVERY_POLL_SECONDS = 1.0
+
+# Regions searched for agent runtimes, concurrently, in addition to the region
+# entered on the setup page. Comma-separated in the environment; set it empty
+# to search the entered region only. An agent name found in several regions is
+# offered in the one with the lowest measured latency.
+AGENT_DISCOVERY_REGIONS = tuple(
+    region.strip()
+    for region in os.environ.get(
+        "AGENT_DISCOVERY_REGIONS", "us-east-1,us-west-2,eu-central-1,ap-southeast-2"
+    ).split(",")
+    if region.strip()
+)
+
+# Regions that have not answered after this long are left out of a refresh
+AGENT_DISCOVERY_REGION_TIMEOUT_SECONDS = 5.0
+
+# Weight of the newest round trip in each region's smoothed latency
+AGENT_DISCOVERY_LATENCY_SMOOTHING = 0.5
+
+# Number of most recent chat messages rendered per page of history
+CHAT_HISTORY_PAGE_SIZE = 30
+
+# Maximum number of tokenized messages kept in the process-wide parse cache
+MESSAGE_SEGMENT_CACHE_SIZE = 4096
+
+# How S3 links are delivered: "presigned" lets the browser download directly
+# from S3; "proxy" downloads through the app server (for private networks)
+S3_DOWNLOAD_MODE = "presigned"
+
+# Lifetime of presigned S3 download URLs
+S3_PRESIGNED_URL_EXPIRY_SECONDS = 3600
+
+# Memory budget of the process-wide S3 object cache (proxy download mode)
+S3_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Objects larger than this are kept in the disk cache instead of memory
+S3_CACHE_SPILL_BYTES = 8 * 1024 * 1024
+
+# Directory and size budget of the on-disk S3 object cache
+S3_DISK_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ai-chat-assistant-s3-cache")
+S3_DISK_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Seconds a session reuses a cached object before revalidating its ETag with S3
+S3_CACHE_REVALIDATE_SECONDS = 60
+
+# Objects larger than one part are streamed to the disk cache using parallel
+# ranged GETs of this size instead of being read into memory in one shot
+S3_RANGED_GET_PART_BYTES = 8 * 1024 * 1024
+
+# Concurrent ranged GETs per large object download
+S3_RANGED_GET_CONCURRENCY = 4
+
+# Bytes copied per read while streaming an object body to disk
+S3_DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Proxy mode only: fetch every S3 link of a message concurrently as soon as it
+# renders, instead of waiting for the user to click each link
+S3_PREFETCH_LINKS = False
+
+# Worker threads shared by all sessions for S3 link prefetching
+S3_PREFETCH_CONCURRENCY = 8
+
+# Streaming replies repaint the chat placeholder at most this often...
+STREAM_REPAINT_INTERVAL_MS = 100
+
+# ...unless this many new characters have arrived since the last repaint
+STREAM_REPAINT_MIN_CHARS = 2000
+
+# Worker threads shared by all sessions for running agent invocations
+AGENT_WORKER_POOL_SIZE = 16
+
+# Retries of transient invoke_agent_runtime failures (throttling, 5xx,
+# connection resets) with jittered exponential backoff, within a deadline
+AGENT_INVOKE_MAX_ATTEMPTS = 4
+AGENT_INVOKE_BACKOFF_BASE_SECONDS = 0.5
+AGENT_INVOKE_BACKOFF_MAX_SECONDS = 8.0
+AGENT_INVOKE_DEADLINE_SECONDS = 60.0
+
+# Process-wide admission control of agent calls per (account, agent ARN).
+# Calls over the concurrency ceiling wait in a queue served round-robin across
+# chat sessions. The ceiling grows by one per ceiling's worth of successful
+# calls and is cut by the decrease factor when AgentCore throttles (AIMD).
+AGENT_ADMISSION_ENABLED = True
+AGENT_ADMISSION_INITIAL_LIMIT = 8
+AGENT_ADMISSION_MIN_LIMIT = 1
+AGENT_ADMISSION_MAX_LIMIT = 64
+AGENT_ADMISSION_DECREASE_FACTOR = 0.5
+# A queued call fails after waiting this long for a slot
+AGENT_ADMISSION_QUEUE_TIMEOUT_SECONDS = 120.0
+
+# Warm-up: when an agent is selected or a new conversation starts, a
+# lightweight invocation with AGENT_WARMUP_PAYLOAD starts the runtime session
+# in the background, so the first message does not pay the cold start. Agents
+# should answer this payload without running a model.
+AGENT_WARMUP_ENABLED = False
+AGENT_WARMUP_PAYLOAD = {"warmup": True}
+# A first message waits this long for a warm-up still in flight on its session
+AGENT_WARMUP_WAIT_SECONDS = 30.0
+# Keep-alive: warmed sessions are pinged every interval while their tab has
+# rerun within the idle window, so idle tabs stop costing invocations
+AGENT_KEEPALIVE_ENABLED = False
+AGENT_KEEPALIVE_INTERVAL_SECONDS = 300.0
+AGENT_KEEPALIVE_IDLE_SECONDS = 900.0
+# Process-wide cap on warm-up and keep-alive invocations; over it they are skipped
+AGENT_WARMUP_RATE_PER_SECOND = 0.5
+# Runtime sessions remembered for first-turn and keep-alive tracking
+AGENT_WARMUP_MAX_SESSIONS = 1024
+
+# Opt-in response layer around agent invocations, for QA, demos and load tests:
+#   "live"   - always invoke the agent
+#   "cache"  - answer a repeated turn from a content-addressed disk cache
+#   "record" - invoke the agent and save every reply, with its timing, to the cassette
+#   "replay" - play replies back from the cassette without invoking the agent
+AGENT_RESPONSE_MODE = os.environ.get("AGENT_RESPONSE_MODE", "live")
+# Turns are keyed by agent ARN, qualifier and whitespace-normalized prompt, and
+# by the conversation's earlier prompts unless this is off
+AGENT_RESPONSE_KEY_CONVERSATION = True
+# Directory, size budget and entry lifetime of the response cache
+AGENT_RESPONSE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ai-chat-assistant-responses")
+AGENT_RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+AGENT_RESPONSE_CACHE_TTL_SECONDS = 24 * 60 * 60
+# Directory holding recorded replies, one JSON file per turn
+AGENT_CASSETTE_DIR = os.environ.get("AGENT_CASSETTE_DIR", "cassettes")
+# Replay speed relative to the recording: 1 is real time, 10 ten times faster, 0 instant
+AGENT_REPLAY_SPEED = float(os.environ.get("AGENT_REPLAY_SPEED", 1.0))
+
+# Service models loaded on a background thread after the first page renders,
+# so the first AWS call of a new server process does not parse them
+AWS_SDK_WARM_SERVICES = ("bedrock-agentcore", "bedrock-agentcore-control", "sts", "s3")
+
+# Per-service SDK retry attempts for pooled clients; agent calls are retried
+# by the app itself, so botocore must not retry them a second time
+AWS_CLIENT_RETRY_ATTEMPTS = {"bedrock-agentcore": 1, "bedrock-agentcore-control": 2}
+
+# Per-service (connect, read) timeouts in seconds for pooled clients. Agent
+# listing gives up with its region, so a region that stops answering does not
+# hold a discovery worker for botocore's 60 second default
+AWS_CLIENT_TIMEOUT_SECONDS = {
+    "bedrock-agentcore-control": (AGENT_DISCOVERY_REGION_TIMEOUT_SECONDS, AGENT_DISCOVERY_REGION_TIMEOUT_SECONDS),
+}
+
+# Samples kept per latency histogram for p50/p95/p99
+METRICS_HISTOGRAM_SAMPLES = 1024
+
+# Log every latency observation as a JSON line on the "app.core.metrics" logger
+METRICS_JSON_LOGS = True
+
+# When set, Prometheus text metrics are written to this file after every rerun
+# (e.g. for the node_exporter textfile collector)
+METRICS_PROMETHEUS_FILE = os.environ.get("METRICS_PROMETHEUS_FILE", "")
+
+# Where chat history is persisted: "sqlite" (CONVERSATION_DB_PATH) or "memory"
+CONVERSATION_STORE = os.environ.get("CONVERSATION_STORE", "sqlite")
+CONVERSATION_DB_PATH = os.environ.get(
+    "CONVERSATION_DB_PATH", os.path.join(tempfile.gettempdir(), "ai-chat-assistant", "conversations.db")
+)
+
+# Most recent messages of a conversation held in session memory; older
+# messages are read from the conversation store page by page on demand
+CONVERSATION_MEMORY_MESSAGES = 100
+
+# Batch runs (python -m app.batch): sessions run in parallel, and the overall
+# invoke rate can be capped (0 = unlimited)
+BATCH_CONCURRENCY = 8
+BATCH_RATE_LIMIT_PER_SECOND = 0.0
+
+# Session memory accounting: each Streamlit session's state is estimated on
+# every rerun. Over budget, rebuildable caches are dropped first, then older
+# history is released from memory (it stays in the conversation store).
+# Sessions without a rerun for SESSION_IDLE_TTL_SECONDS are released entirely.
+SESSION_MEMORY_BUDGET_BYTES = int(os.environ.get("SESSION_MEMORY_BUDGET_BYTES", 16 * 1024 * 1024))
+SESSION_MEMORY_GLOBAL_BUDGET_BYTES = int(os.environ.get("SESSION_MEMORY_GLOBAL_BUDGET_BYTES", 512 * 1024 * 1024))
+SESSION_IDLE_TTL_SECONDS = float(os.environ.get("SESSION_IDLE_TTL_SECONDS", 30 * 60))
@@ -1,11 +1,49 @@
 """Core application modules."""
 
-from .session_state import initialize_session_state
-from .aws_client import get_boto3_client, fetch_available_agents
+from .session_state import initialize_session_state, start_new_conversation
+from .aws_client import (
+    AwsCredentials,
+    get_boto3_client,
+    get_pooled_client,
+    invalidate_client_pool,
+    client_pool_stats,
+    fetch_available_agents,
+    region_from_arn,
+)
+from .agent_discovery import get_available_agents, invalidate_available_agents, region_latency_stats
+from .conversation_store import (
+    ConversationStore,
+    MemoryConversationStore,
+    SQLiteConversationStore,
+    ConversationHistory,
+    get_conversation_store,
+    set_conversation_store,
+)
+from .session_memory import SessionMemoryAccountant, get_session_accountant, track_session_memory
+from .metrics import metrics
 
 __all__ = [
     "initialize_session_state",
+    "start_new_conversation",
+    "AwsCredentials",
     "get_boto3_client",
+    "get_pooled_client",
+    "invalidate_client_pool",
+    "client_pool_stats",
     "fetch_available_agents",
+    "region_from_arn",
+    "get_available_agents",
+    "invalidate_available_agents",
+    "region_latency_stats",
+    "ConversationStore",
+    "MemoryConversationStore",
+    "SQLiteConversationStore",
+    "ConversationHistory",
+    "get_conversation_store",
+    "set_conversation_store",
+    "SessionMemoryAccountant",
+    "get_session_accountant",
+    "track_session_memory",
+    "metrics",
 ]
 
@@ -0,0 +1,251 @@
+"""Cached, background-refreshed agent runtime discovery."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait as wait_for_futures
+import streamlit as st
+from app.config.settings import (
+    AGENT_DISCOVERY_TTL_SECONDS,
+    AGENT_DISCOVERY_ERROR_TTL_SECONDS,
+    AGENT_DISCOVERY_LATENCY_SMOOTHING,
+    AGENT_DISCOVERY_REGION_TIMEOUT_SECONDS,
+    AGENT_DISCOVERY_REGIONS,
+)
+from app.core.aws_client import (
+    credentials_fingerprint,
+    get_pooled_client,
+    get_session_credentials,
+    list_agent_runtimes,
+)
+from app.core.metrics import metrics
+
+
+class _DiscoveryEntry:
+    """Cached agent list for one account and set of regions."""
+
+    def __init__(self):
+        self.agents = None
+        self.error = None
+        self.fetched_at = 0.0
+        self.refreshing = False
+        self.loaded = threading.Event()
+
+    def is_stale(self, now, ttl, error_ttl):
+        if self.fetched_at == 0.0:
+            return True
+        return now - self.fetched_at > (error_ttl if self.error else ttl)
+
+
+class AgentDiscoveryCache:
+    """Process-wide agent list cache with stale-while-revalidate refreshes.
+
+    Lookups never call the control-plane API on the caller's thread: a stale or
+    missing entry starts a background refresh and the caller gets whatever is
+    cached right now.
+    """
+
+    def __init__(self, ttl=AGENT_DISCOVERY_TTL_SECONDS, error_ttl=AGENT_DISCOVERY_ERROR_TTL_SECONDS):
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, key, loader, wait=0.0):
+        """Return (agents, error) for key, refreshing in the background when stale.
+
+        Args:
+            key: Cache key, e.g. (account, regions)
+            loader: Callable returning the agent list; runs on a worker thread
+            wait: Seconds to wait when nothing has been loaded yet
+
+        Returns:
+            Tuple: (agents, error); agents is None while the first load runs
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _DiscoveryEntry()
+            if not entry.refreshing and entry.is_stale(time.time(), self.ttl, self.error_ttl):
+                entry.refreshing = True
+                threading.Thread(
+                    target=self._refresh,
+                    args=(entry, loader),
+                    name="agent-discovery",
+                    daemon=True
+                ).start()
+
+        if entry.agents is None and wait:
+            entry.loaded.wait(wait)
+        return entry.agents, entry.error
+
+    def invalidate(self, key=None):
+        """Forget the cached list for key, or every list if key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    @staticmethod
+    def _refresh(entry, loader):
+        try:
+            agents = loader()
+            entry.agents = agents
+            entry.error = None
+        except Exception as e:
+            # Keep serving the previous list, if any
+            entry.error = str(e)
+        finally:
+            entry.fetched_at = time.time()
+            entry.refreshing = False
+            entry.loaded.set()
+
+
+class RegionLatencies:
+    """Smoothed round-trip latency to each region's control-plane endpoint."""
+
+    def __init__(self, smoothing=AGENT_DISCOVERY_LATENCY_SMOOTHING):
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._seconds = {}
+
+    def observe(self, region_name, seconds):
+        with self._lock:
+            previous = self._seconds.get(region_name)
+            if previous is None:
+                self._seconds[region_name] = seconds
+            else:
+                self._seconds[region_name] = previous + self.smoothing * (seconds - previous)
+
+    def get(self, region_name):
+        """Smoothed latency of a region, or None if it was never measured."""
+        with self._lock:
+            return self._seconds.get(region_name)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._seconds)
+
+
+def merge_region_agents(agents_by_region, latencies):
+    """Merge per-region agent lists, keeping one agent per name.
+
+    Each agent is tagged with its region. An agent name found in several
+    regions is kept in the one with the lowest latency; "arns" maps every
+    region it was found in to its ARN there, fastest first.
+
+    Args:
+        agents_by_region: Dict: region -> agent list
+        latencies: RegionLatencies used to rank regions
+
+    Returns:
+        Agent list sorted by name
+    """
+    def rank(region_name):
+        latency = latencies.get(region_name)
+        return (latency is None, latency or 0.0, region_name)
+
+    merged = {}
+    for region_name in sorted(agents_by_region, key=rank):
+        for agent in agents_by_region[region_name]:
+            kept = merged.get(agent['name'])
+            if kept is None:
+                merged[agent['name']] = {**agent, 'region': region_name, 'arns': {region_name: agent['arn']}}
+            else:
+                kept['arns'].setdefault(region_name, agent['arn'])
+    return sorted(merged.values(), key=lambda agent: agent['name'])
+
+
+def discovery_regions(region_name):
+    """The setup page's region followed by the configured discovery regions."""
+    return tuple(dict.fromkeys((region_name, *AGENT_DISCOVERY_REGIONS)))
+
+
+# Process-wide cache shared across Streamlit sessions
+_discovery_cache = AgentDiscoveryCache()
+_region_latencies = RegionLatencies()
+# Regions are listed concurrently, so discovery takes about one region's round trip
+_region_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="agent-discovery-region")
+metrics.register_gauges("agent_discovery_latency", _region_latencies.stats)
+
+
+def _discovery_key(region_name):
+    """Cache key for the current session's account and the regions searched from region_name."""
+    account_id = st.session_state.get("aws_account_id", "")
+    if not account_id:
+        account_id = credentials_fingerprint(*get_session_credentials())
+    return account_id, discovery_regions(region_name)
+
+
+def _list_region(region_name, access_key, secret_key, session_token):
+    """List one region's agent runtimes and record the endpoint's round trip."""
+    client = get_pooled_client(
+        'bedrock-agentcore-control', region_name, access_key, secret_key, session_token
+    )
+    stats = {}
+    agents = list_agent_runtimes(client, stats=stats)
+    _region_latencies.observe(region_name, stats["first_page_seconds"])
+    metrics.observe("agent_discovery_region_seconds", stats["first_page_seconds"], region=region_name)
+    return agents
+
+
+def get_available_agents(region_name, wait=0.0):
+    """Return (agents, error) for the session's account without blocking on AWS.
+
+    Agents are searched in region_name and AGENT_DISCOVERY_REGIONS at once;
+    each agent carries the "region" it is used in.
+
+    Args:
+        region_name: AWS region entered on the setup page
+        wait: Seconds to wait if the list has never been loaded; the UI never waits
+
+    Returns:
+        Tuple: (agents, error); agents is None while the first load runs
+    """
+    access_key, secret_key, session_token = get_session_credentials()
+    if not access_key or not secret_key:
+        return [], "AWS credentials are required. Please configure them in the setup page."
+
+    regions = discovery_regions(region_name)
+
+    def loader():
+        started = time.perf_counter()
+        futures = {
+            region: _region_executor.submit(_list_region, region, access_key, secret_key, session_token)
+            for region in regions
+        }
+        # A slow or unreachable region is left out of this refresh rather than
+        # holding up the others
+        wait_for_futures(futures.values(), timeout=AGENT_DISCOVERY_REGION_TIMEOUT_SECONDS)
+        agents_by_region = {}
+        errors = []
+        for region, future in futures.items():
+            if not future.done():
+                metrics.increment("agent_discovery_region_timeouts", region=region)
+                errors.append(f"{region}: no answer within {AGENT_DISCOVERY_REGION_TIMEOUT_SECONDS:.0f}s")
+                continue
+            try:
+                agents_by_region[region] = future.result()
+            except Exception as e:
+                # A region without AgentCore or access does not hide the others
+                metrics.increment("agent_discovery_region_errors", region=region)
+                errors.append(f"{region}: {e}")
+        metrics.observe("agent_discovery_seconds", time.perf_counter() - started, regions=len(regions))
+        if not agents_by_region:
+            raise Exception("; ".join(errors))
+        return merge_region_agents(agents_by_region, _region_latencies)
+
+    return _discovery_cache.get(_discovery_key(region_name), loader, wait=wait)
+
+
+def region_latency_stats():
+    """Return the smoothed control-plane round trip per region, in seconds."""
+    return _region_latencies.stats()
+
+
+def invalidate_available_agents(region_name=None):
+    """Drop the cached agent list for the session's account, or all cached lists."""
+    if region_name is None:
+        _discovery_cache.invalidate()
+    else:
+        _discovery_cache.invalidate(_discovery_key(region_name))
@@ -1,26 +1,316 @@
 """AWS client utilities and agent management."""
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 import streamlit as st
-import boto3
+from app.core.metrics import metrics
+from app.config.settings import (
+    AWS_CLIENT_POOL_SIZE,
+    AWS_CLIENT_RETRY_ATTEMPTS,
+    AWS_CLIENT_TIMEOUT_SECONDS,
+    AWS_MAX_POOL_CONNECTIONS,
+    AWS_SDK_WARM_SERVICES,
+    AWS_TCP_KEEPALIVE,
+)
 
+# boto3/botocore are imported on first use, not at module load: importing
+# them and parsing service models is the bulk of a cold start, and the
+# credentials setup page needs neither
+_data_loader = None
+_data_loader_lock = threading.Lock()
+_warmup_started = False
 
-def get_boto3_client(service_name, region_name):
-    """Get boto3 client with custom credentials from session state."""
-    access_key = st.session_state.get("aws_access_key_id", "").strip()
-    secret_key = st.session_state.get("aws_secret_access_key", "").strip()
-    session_token = st.session_state.get("aws_session_token", "").strip()
-    
-    if not access_key or not secret_key:
-        raise ValueError("AWS credentials are required. Please configure them in the setup page.")
-    
-    # Use custom credentials
-    session = boto3.Session(
+
+def get_data_loader():
+    """Return the botocore data loader shared by every session in the process.
+
+    The loader caches parsed service models, so with one shared loader each
+    model is parsed once per process instead of once per credentials.
+    """
+    global _data_loader
+    with _data_loader_lock:
+        if _data_loader is None:
+            from botocore.loaders import create_loader
+            _data_loader = create_loader()
+        return _data_loader
+
+
+def new_boto3_session(access_key=None, secret_key=None, session_token=None, profile_name=None):
+    """Create a boto3 session that uses the shared data loader."""
+    import boto3
+    import botocore.session
+
+    botocore_session = botocore.session.get_session()
+    botocore_session.register_component("data_loader", get_data_loader())
+    return boto3.Session(
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
-        aws_session_token=session_token if session_token else None,
-        region_name=region_name
+        aws_session_token=session_token,
+        profile_name=profile_name,
+        botocore_session=botocore_session
     )
-    return session.client(service_name, region_name=region_name)
+
+
+def warm_aws_sdk(services=AWS_SDK_WARM_SERVICES):
+    """Import boto3 and load service models on a background thread, once per process.
+
+    Called after the first page has rendered, so the first client a session
+    builds does not pay for the imports and model parsing.
+    """
+    global _warmup_started
+    with _data_loader_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+
+    def warm():
+        with metrics.timer("aws_sdk_warmup_seconds"):
+            import boto3  # noqa: F401
+            loader = get_data_loader()
+            loader.load_data("endpoints")
+            loader.load_data("partitions")
+            for service_name in services:
+                for type_name in ("service-2", "endpoint-rule-set-1"):
+                    try:
+                        loader.load_service_model(service_name, type_name)
+                    except Exception:
+                        # Older botocore without this service or rule set
+                        pass
+
+    threading.Thread(target=warm, name="aws-sdk-warmup", daemon=True).start()
+
+
+def credentials_fingerprint(access_key, secret_key, session_token=""):
+    """Return a stable hash identifying a set of AWS credentials."""
+    material = "\0".join([access_key or "", secret_key or "", session_token or ""])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ClientPool:
+    """Thread-safe LRU cache of boto3 clients shared by all Streamlit sessions.
+
+    Clients are keyed by credentials fingerprint, service and region, so every
+    chat turn, S3 download and agent listing reuses the same connection pool
+    instead of building a new session, resolving endpoints and handshaking again.
+    """
+
+    def __init__(self, max_size=AWS_CLIENT_POOL_SIZE,
+                 max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+                 tcp_keepalive=AWS_TCP_KEEPALIVE):
+        self.max_size = max_size
+        self.max_pool_connections = max_pool_connections
+        self.tcp_keepalive = tcp_keepalive
+        self._client_config = None
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+        self._sessions = {}
+        self.client_factory = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_client(self, service_name, region_name, access_key, secret_key, session_token=""):
+        """Return a pooled client, creating it on first use."""
+        if self.client_factory is not None:
+            return self.client_factory(service_name, region_name)
+
+        fingerprint = credentials_fingerprint(access_key, secret_key, session_token)
+        key = (fingerprint, service_name, region_name)
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return client
+
+            self.misses += 1
+            # boto3 sessions are not thread-safe, so clients are built under the lock
+            session = self._sessions.get(fingerprint)
+            if session is None:
+                session = new_boto3_session(access_key, secret_key, session_token if session_token else None)
+                self._sessions[fingerprint] = session
+
+            config = self.client_config
+            if service_name in AWS_CLIENT_RETRY_ATTEMPTS:
+                from botocore.config import Config
+                config = config.merge(Config(retries={
+                    "mode": "standard",
+                    "total_max_attempts": AWS_CLIENT_RETRY_ATTEMPTS[service_name]
+                }))
+            if service_name in AWS_CLIENT_TIMEOUT_SECONDS:
+                from botocore.config import Config
+                connect_timeout, read_timeout = AWS_CLIENT_TIMEOUT_SECONDS[service_name]
+                config = config.merge(Config(connect_timeout=connect_timeout, read_timeout=read_timeout))
+            client = session.client(service_name, region_name=region_name, config=config)
+            self._clients[key] = client
+
+            while len(self._clients) > self.max_size:
+                evicted_key, _ = self._clients.popitem(last=False)
+                self.evictions += 1
+                self._drop_unused_session(evicted_key[0])
+
+            return client
+
+    @property
+    def client_config(self):
+        """botocore Config of pooled clients, built on first use."""
+        if self._client_config is None:
+            from botocore.config import Config
+            self._client_config = Config(
+                max_pool_connections=self.max_pool_connections,
+                tcp_keepalive=self.tcp_keepalive
+            )
+        return self._client_config
+
+    def invalidate(self, access_key=None, secret_key=None, session_token=""):
+        """Drop pooled clients for the given credentials, or all clients if none given."""
+        with self._lock:
+            if access_key is None:
+                self._clients.clear()
+                self._sessions.clear()
+                return
+
+            fingerprint = credentials_fingerprint(access_key, secret_key, session_token)
+            for key in [key for key in self._clients if key[0] == fingerprint]:
+                del self._clients[key]
+            self._sessions.pop(fingerprint, None)
+
+    def stats(self):
+        """Return pool size and hit/miss/eviction counters."""
+        with self._lock:
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _drop_unused_session(self, fingerprint):
+        """Forget a boto3 session once no pooled client uses it."""
+        if not any(key[0] == fingerprint for key in self._clients):
+            self._sessions.pop(fingerprint, None)
+
+
+# Process-wide pool shared across Streamlit sessions
+_client_pool = ClientPool()
+metrics.register_gauges("aws_client_pool", _client_pool.stats)
+
+
+def get_pooled_client(service_name, region_name, access_key, secret_key, session_token=""):
+    """Get a pooled boto3 client for explicit credentials."""
+    return _client_pool.get_client(service_name, region_name, access_key, secret_key, session_token)
+
+
+def invalidate_client_pool(access_key=None, secret_key=None, session_token=""):
+    """Invalidate pooled clients for the given credentials, or all of them."""
+    _client_pool.invalidate(access_key, secret_key, session_token)
+
+
+def set_client_factory(factory):
+    """Build every client with factory(service_name, region_name) instead of boto3.
+
+    Used to inject local stand-ins for AWS services, e.g. by the offline
+    benchmarks. Pass None to go back to real boto3 clients.
+    """
+    _client_pool.client_factory = factory
+
+
+def client_pool_stats():
+    """Return hit/miss counters of the process-wide client pool."""
+    return _client_pool.stats()
+
+
+class AwsCredentials:
+    """Explicit AWS credentials for the service layer.
+
+    Lets agent calls run outside a Streamlit script (batch runs, benchmarks),
+    where there is no session state to read credentials from.
+    """
+
+    def __init__(self, access_key, secret_key, session_token=""):
+        self.access_key = (access_key or "").strip()
+        self.secret_key = (secret_key or "").strip()
+        self.session_token = (session_token or "").strip()
+
+    @classmethod
+    def from_environment(cls, profile_name=None):
+        """Resolve credentials through boto3's default chain (env vars, profile, role)."""
+        credentials = new_boto3_session(profile_name=profile_name).get_credentials()
+        if credentials is None:
+            return cls("", "")
+        frozen = credentials.get_frozen_credentials()
+        return cls(frozen.access_key, frozen.secret_key, frozen.token or "")
+
+    def __bool__(self):
+        return bool(self.access_key and self.secret_key)
+
+    def __iter__(self):
+        return iter((self.access_key, self.secret_key, self.session_token))
+
+    @property
+    def fingerprint(self):
+        return credentials_fingerprint(*self)
+
+    def client(self, service_name, region_name, pool=None):
+        """Return a pooled client for these credentials."""
+        if not self:
+            raise ValueError("AWS credentials are required. Please configure them in the setup page.")
+        pool = pool or _client_pool
+        with metrics.timer("get_boto3_client_seconds", service=service_name, region=region_name):
+            return pool.get_client(service_name, region_name, *self)
+
+
+def get_session_credentials():
+    """Return AwsCredentials from session state."""
+    return AwsCredentials(
+        st.session_state.get("aws_access_key_id", ""),
+        st.session_state.get("aws_secret_access_key", ""),
+        st.session_state.get("aws_session_token", "")
+    )
+
+
+def get_boto3_client(service_name, region_name):
+    """Get boto3 client with custom credentials from session state."""
+    # Use custom credentials through the shared client pool
+    return get_session_credentials().client(service_name, region_name)
+
+
+def region_from_arn(arn, default=""):
+    """Return the region field of an ARN, or default if it has none."""
+    parts = (arn or "").split(":")
+    return parts[3] if len(parts) > 5 and parts[3] else default
+
+
+def list_agent_runtimes(client, stats=None):
+    """List every agent runtime, following nextToken pagination.
+
+    Args:
+        client: bedrock-agentcore-control client
+        stats: Optional dict that receives the round trip of the first page
+            as "first_page_seconds"
+    """
+    agents = []
+    request = {'maxResults': 100}
+    while True:
+        started = time.perf_counter()
+        response = client.list_agent_runtimes(**request)
+        if stats is not None:
+            stats.setdefault("first_page_seconds", time.perf_counter() - started)
+        for runtime in response.get('agentRuntimes', []):
+            agents.append({
+                'arn': runtime.get('agentRuntimeArn', ''),
+                'name': runtime.get('agentRuntimeName', 'Unknown'),
+                'status': runtime.get('status', 'Unknown')
+            })
+
+        next_token = response.get('nextToken')
+        if not next_token:
+            return agents
+        request['nextToken'] = next_token
 
 
 def fetch_available_agents(region_name, session=None):
@@ -33,17 +323,7 @@ def fetch_available_agents(region_name, session=None):
             # Use session state credentials
             client = get_boto3_client('bedrock-agentcore-control', region_name)
         
-        response = client.list_agent_runtimes()
-        
-        agents = []
-        for runtime in response.get('agentRuntimes', []):
-            agents.append({
-                'arn': runtime.get('agentRuntimeArn', ''),
-                'name': runtime.get('agentRuntimeName', 'Unknown'),
-                'status': runtime.get('status', 'Unknown')
-            })
-        
-        return agents
+        return list_agent_runtimes(client)
     except Exception as e:
         st.error(f"Error fetching agents: {str(e)}")
         return []
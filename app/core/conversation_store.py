@@ -0,0 +1,287 @@
+"""Persistent chat history with a bounded in-memory window per session."""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from itertools import islice
+from app.config.settings import (
+    CONVERSATION_DB_PATH,
+    CONVERSATION_MEMORY_MESSAGES,
+    CONVERSATION_STORE,
+)
+from app.core.metrics import metrics
+
+# Message fields stored in their own columns; anything else goes to "extra"
+_MESSAGE_COLUMNS = ("id", "role", "content")
+
+
+class ConversationStore(ABC):
+    """Append-only store of chat messages addressed by (session_id, turn).
+
+    Turns are 0-based positions in a conversation, allocated by the store so
+    several tabs can append to one conversation. Each conversation belongs to
+    the identity that claimed it first. Implementations must be safe to share
+    between threads.
+    """
+
+    @abstractmethod
+    def append(self, session_id, message):
+        """Persist one message at the next turn and return that turn."""
+
+    @abstractmethod
+    def claim(self, session_id, owner):
+        """Check whether owner may use a conversation, making it theirs if it is new.
+
+        Conversations that already have messages but no owner are not handed out.
+        """
+
+    @abstractmethod
+    def read(self, session_id, start=0, limit=None):
+        """Return up to limit messages of a conversation from turn start on."""
+
+    @abstractmethod
+    def count(self, session_id):
+        """Return the number of messages in a conversation."""
+
+
+class MemoryConversationStore(ConversationStore):
+    """Process-local store; history is lost when the server restarts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conversations = {}
+        self._owners = {}
+
+    def append(self, session_id, message):
+        with self._lock:
+            messages = self._conversations.setdefault(session_id, [])
+            messages.append(dict(message))
+            return len(messages) - 1
+
+    def claim(self, session_id, owner):
+        with self._lock:
+            if session_id not in self._owners and not self._conversations.get(session_id):
+                self._owners[session_id] = owner
+            return self._owners.get(session_id) == owner
+
+    def read(self, session_id, start=0, limit=None):
+        with self._lock:
+            messages = self._conversations.get(session_id, [])
+            stop = len(messages) if limit is None else start + limit
+            return [dict(message) for message in messages[start:stop]]
+
+    def count(self, session_id):
+        with self._lock:
+            return len(self._conversations.get(session_id, []))
+
+
+class SQLiteConversationStore(ConversationStore):
+    """SQLite-backed store with an index on (session_id, turn)."""
+
+    def __init__(self, path=CONVERSATION_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+            # Readable by this user only; SQLite gives its journal files the same mode
+            os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        self.path = path
+        self._lock = threading.Lock()
+        # One connection shared by all script threads, serialized by the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session_id TEXT NOT NULL,"
+            " turn INTEGER NOT NULL,"
+            " message_id TEXT NOT NULL,"
+            " role TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " extra TEXT,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS messages_session_turn ON messages (session_id, turn)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " session_id TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+
+    def append(self, session_id, message):
+        extra = {key: value for key, value in message.items() if key not in _MESSAGE_COLUMNS}
+        with self._lock:
+            # One statement, so processes sharing the database never pick the same turn
+            cursor = self._conn.execute(
+                "INSERT INTO messages (session_id, turn, message_id, role, content, extra, created_at)"
+                " SELECT ?, COALESCE(MAX(turn), -1) + 1, ?, ?, ?, ?, ? FROM messages WHERE session_id = ?",
+                (
+                    session_id,
+                    message.get("id", ""),
+                    message["role"],
+                    message["content"],
+                    json.dumps(extra) if extra else None,
+                    time.time(),
+                    session_id,
+                )
+            )
+            # Read the turn back by rowid rather than with RETURNING, which needs SQLite 3.35
+            (turn,) = self._conn.execute(
+                "SELECT turn FROM messages WHERE rowid = ?", (cursor.lastrowid,)
+            ).fetchone()
+        return turn
+
+    def claim(self, session_id, owner):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO conversations (session_id, owner, created_at)"
+                " SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM messages WHERE session_id = ?)",
+                (session_id, owner, time.time(), session_id)
+            )
+            row = self._conn.execute(
+                "SELECT owner FROM conversations WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row is not None and row[0] == owner
+
+    def read(self, session_id, start=0, limit=None):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message_id, role, content, extra FROM messages"
+                " WHERE session_id = ? AND turn >= ? ORDER BY turn LIMIT ?",
+                (session_id, start, -1 if limit is None else limit)
+            ).fetchall()
+        messages = []
+        for message_id, role, content, extra in rows:
+            message = {"id": message_id, "role": role, "content": content}
+            if extra:
+                message.update(json.loads(extra))
+            messages.append(message)
+        return messages
+
+    def count(self, session_id):
+        with self._lock:
+            (last_turn,) = self._conn.execute(
+                "SELECT MAX(turn) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return 0 if last_turn is None else last_turn + 1
+
+
+class ConversationHistory:
+    """One session's view of a conversation.
+
+    Every message is written through to the store; only the most recent
+    memory_messages are kept in memory, and older pages are read back from
+    the store when the user scrolls up to them. The memory accountant trims
+    or releases the window from other sessions' threads, so every access to
+    it holds a lock.
+    """
+
+    def __init__(self, session_id, store=None, memory_messages=CONVERSATION_MEMORY_MESSAGES):
+        self.session_id = session_id
+        self.store = store or get_conversation_store()
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=memory_messages)
+        self._length = 0
+        self._released = True
+        with self._lock:
+            self._load()
+
+    def __len__(self):
+        with self._lock:
+            if self._released:
+                self._load()
+            return self._length
+
+    def _load(self, length=None):
+        """Read the memory window back from the store; call with the lock held."""
+        with metrics.timer("conversation_read_seconds"):
+            self._length = self.store.count(self.session_id) if length is None else length
+            start = max(self._length - self._recent.maxlen, 0)
+            self._recent = deque(
+                self.store.read(self.session_id, start, self._length - start), maxlen=self._recent.maxlen
+            )
+        self._released = False
+
+    def append(self, message):
+        """Add a message to the end of the conversation.
+
+        If another tab on the same conversation appended in the meantime, the
+        in-memory window is reloaded so it includes those messages.
+        """
+        turn = self.store.append(self.session_id, message)
+        with self._lock:
+            if self._released or turn != self._length:
+                self._load(turn)
+            self._recent.append(message)
+            self._length = turn + 1
+
+    def page(self, start, stop=None):
+        """Return messages [start, stop), reading turns older than the memory window from the store."""
+        with self._lock:
+            if self._released:
+                self._load()
+            stop = self._length if stop is None else min(stop, self._length)
+            recent_start = self._length - len(self._recent)
+            messages = list(islice(self._recent, max(start - recent_start, 0), max(stop - recent_start, 0)))
+        if start < recent_start:
+            with metrics.timer("conversation_read_seconds"):
+                messages[:0] = self.store.read(self.session_id, start, min(stop, recent_start) - start)
+        return messages
+
+    @property
+    def memory_messages(self):
+        """Number of messages held in memory."""
+        with self._lock:
+            return len(self._recent)
+
+    def memory_bytes(self):
+        """Approximate bytes held by the in-memory window."""
+        with self._lock:
+            recent = list(self._recent)
+        return sum(
+            sys.getsizeof(message) + sum(sys.getsizeof(value) for value in message.values())
+            for message in recent
+        )
+
+    def trim(self, keep):
+        """Release all but the keep most recent messages from memory; the store keeps them all."""
+        with self._lock:
+            while len(self._recent) > keep:
+                self._recent.popleft()
+
+    def release(self):
+        """Drop the whole memory window; the next access reads it back from the store."""
+        with self._lock:
+            self._recent = deque(maxlen=self._recent.maxlen)
+            self._released = True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store():
+    """Return the process-wide conversation store, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if CONVERSATION_STORE == "memory":
+                _store = MemoryConversationStore()
+            elif CONVERSATION_STORE == "sqlite":
+                _store = SQLiteConversationStore()
+            else:
+                raise ValueError(f"Unknown conversation store: {CONVERSATION_STORE}")
+        return _store
+
+
+def set_conversation_store(store):
+    """Use another ConversationStore implementation for all sessions."""
+    global _store
+    with _store_lock:
+        _store = store
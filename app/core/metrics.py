@@ -0,0 +1,212 @@
+"""Latency and counter metrics with Prometheus and JSON log export."""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from app.config.settings import (
+    METRICS_HISTOGRAM_SAMPLES,
+    METRICS_JSON_LOGS,
+    METRICS_PROMETHEUS_FILE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Prefix of every exported Prometheus metric
+METRIC_PREFIX = "ai_chat_"
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def client_region(client):
+    """Return the region a boto3 client was created for, if known."""
+    return getattr(getattr(client, "meta", None), "region_name", "") or ""
+
+
+class Histogram:
+    """Latency samples over a sliding window, with total count and sum."""
+
+    def __init__(self, max_samples=METRICS_HISTOGRAM_SAMPLES):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        """Return the q-quantile of the sampled window (nearest rank)."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(int(q * len(ordered)), len(ordered) - 1)
+        return ordered[index]
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._write_lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        """Add to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record a latency observation in seconds."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+        if METRICS_JSON_LOGS:
+            logger.info(json.dumps({"metric": name, "seconds": round(value, 6), **labels}))
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the duration of a block, counting failures separately."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment(f"{name}_errors", **labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of timer()."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_gauges(self, name, collect):
+        """Register a callable returning a dict of numeric gauges, read at export time."""
+        with self._lock:
+            self._gauges[name] = collect
+
+    def snapshot(self):
+        """Return all metrics as plain dicts."""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self._counters.items()
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    **{f"p{int(q * 100)}": histogram.quantile(q) for q in QUANTILES},
+                }
+                for (name, labels), histogram in self._histograms.items()
+            ]
+            gauge_sources = list(self._gauges.items())
+
+        gauges = []
+        for name, collect in gauge_sources:
+            try:
+                values = collect()
+            except Exception:
+                continue
+            gauges.extend(
+                {"name": f"{name}_{field}", "labels": {}, "value": value}
+                for field, value in values.items()
+                if isinstance(value, (int, float))
+            )
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+
+        def declare(name, kind, help_text):
+            # One HELP/TYPE pair per metric family, however many label sets it has
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for histogram in sorted(snapshot["histograms"], key=lambda h: h["name"]):
+            name = METRIC_PREFIX + histogram["name"]
+            declare(name, "summary", f"{histogram['name']} in seconds")
+            for q in QUANTILES:
+                labels = _format_labels({**histogram["labels"], "quantile": str(q)})
+                lines.append(f"{name}{labels} {histogram[f'p{int(q * 100)}']:.6f}")
+            labels = _format_labels(histogram["labels"])
+            lines.append(f"{name}_count{labels} {histogram['count']}")
+            lines.append(f"{name}_sum{labels} {histogram['sum']:.6f}")
+
+        for counter in sorted(snapshot["counters"], key=lambda c: c["name"]):
+            name = f"{METRIC_PREFIX}{counter['name']}_total"
+            declare(name, "counter", f"Total {counter['name']}")
+            lines.append(f"{name}{_format_labels(counter['labels'])} {counter['value']}")
+
+        for gauge in snapshot["gauges"]:
+            name = METRIC_PREFIX + gauge["name"]
+            declare(name, "gauge", f"Current {gauge['name']}")
+            lines.append(f"{name} {gauge['value']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus_file(self, path=METRICS_PROMETHEUS_FILE):
+        """Atomically write Prometheus metrics to a file, if a path is configured.
+
+        Every session's script thread writes the file after its rerun, so
+        writes are serialized and each goes through its own temp file.
+        """
+        if not path:
+            return
+        text = self.to_prometheus()
+        with self._write_lock:
+            with tempfile.NamedTemporaryFile(
+                "w", dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".",
+                suffix=".tmp", delete=False
+            ) as f:
+                tmp_path = f.name
+            try:
+                with open(tmp_path, "w") as f:
+                    f.write(text)
+                # Readable by the scraper, like a file written with open()
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.remove(tmp_path)
+                raise
+
+
+def _format_labels(labels):
+    """Render a Prometheus label set, escaping values."""
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# Process-wide registry shared across Streamlit sessions
+metrics = MetricsRegistry()
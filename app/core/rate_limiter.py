@@ -0,0 +1,46 @@
+"""Thread-safe token bucket rate limiting."""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """Token bucket allowing rate_per_second calls with bursts of up to burst calls.
+
+    A rate of 0 (or less) disables limiting.
+    """
+
+    def __init__(self, rate_per_second, burst=1):
+        self.rate_per_second = rate_per_second
+        self.burst = max(burst, 1)
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available right now."""
+        if self.rate_per_second <= 0:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        if self.rate_per_second <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait)
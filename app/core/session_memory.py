@@ -0,0 +1,225 @@
+"""Per-session memory accounting with budgets and idle-session release.
+
+Every rerun reports the session's heavy state to a process-wide accountant,
+which estimates its size and keeps each session, and all sessions together,
+within budget. Memory is reclaimed cheapest-first: per-session S3 link caches
+are cleared, then the oldest messages are dropped from the in-memory history
+window; they stay in the conversation store and are read back on demand.
+Sessions idle for the TTL have their history window released entirely.
+"""
+
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+import streamlit as st
+from app.config.settings import (
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_MEMORY_BUDGET_BYTES,
+    SESSION_MEMORY_GLOBAL_BUDGET_BYTES,
+)
+from app.core.metrics import metrics
+
+# Session state keys whose values are accounted
+TRACKED_KEYS = (
+    "messages",
+    "available_agents",
+    "active_invocation",
+    "active_comparison",
+    "s3_presigned_urls",
+    "s3_downloads",
+)
+
+# Session caches rebuilt on demand, cleared first when over budget
+_CACHE_KEYS = ("s3_presigned_urls", "s3_downloads")
+
+
+def estimate_size(value, _seen=None):
+    """Approximate bytes held by a session state value, following containers.
+
+    Objects with a memory_bytes() method report their own size.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    memory_bytes = getattr(value, "memory_bytes", None)
+    if callable(memory_bytes):
+        return memory_bytes()
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in list(value.items()):
+            size += estimate_size(key, seen) + estimate_size(item, seen)
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        for item in list(value):
+            size += estimate_size(item, seen)
+    return size
+
+
+class _SessionEntry:
+    __slots__ = ("values", "bytes", "last_seen")
+
+    def __init__(self):
+        self.values = {}
+        self.bytes = 0
+        self.last_seen = 0.0
+
+
+class SessionMemoryAccountant:
+    """Tracks the bytes each session holds and enforces per-session and global budgets."""
+
+    def __init__(self, session_budget_bytes=SESSION_MEMORY_BUDGET_BYTES,
+                 global_budget_bytes=SESSION_MEMORY_GLOBAL_BUDGET_BYTES,
+                 idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS):
+        self.session_budget_bytes = session_budget_bytes
+        self.global_budget_bytes = global_budget_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.evicted_bytes = 0
+        self.released_sessions = 0
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def track(self, session_key, values, now=None):
+        """Record a session's tracked values, then enforce budgets and the idle TTL.
+
+        Args:
+            session_key: Key identifying the browser session
+            values: Dict of tracked session state values
+            now: Optional time.time() value, for tests and simulations
+
+        Returns:
+            Bytes the session holds after enforcement
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._sessions.get(session_key)
+            if entry is None:
+                entry = self._sessions[session_key] = _SessionEntry()
+            entry.values = values
+            entry.last_seen = now
+            entry.bytes = self._measure(entry)
+            if entry.bytes > self.session_budget_bytes:
+                self._shrink(entry, self.session_budget_bytes)
+            self._release_idle(now)
+            self._enforce_global(session_key)
+            return entry.bytes
+
+    def forget(self, session_key):
+        """Stop tracking a session."""
+        with self._lock:
+            self._sessions.pop(session_key, None)
+
+    def session_bytes(self, session_key):
+        """Bytes last measured for a session, or 0 if it is not tracked."""
+        with self._lock:
+            entry = self._sessions.get(session_key)
+            return entry.bytes if entry is not None else 0
+
+    def stats(self):
+        """Return session count, total and largest session bytes, and eviction counters."""
+        with self._lock:
+            sizes = [entry.bytes for entry in self._sessions.values()]
+            return {
+                "sessions": len(sizes),
+                "bytes": sum(sizes),
+                "largest_session_bytes": max(sizes, default=0),
+                "session_budget_bytes": self.session_budget_bytes,
+                "global_budget_bytes": self.global_budget_bytes,
+                "evicted_bytes": self.evicted_bytes,
+                "released_sessions": self.released_sessions,
+            }
+
+    @staticmethod
+    def _measure(entry):
+        seen = set()
+        return sum(estimate_size(value, seen) for value in entry.values.values())
+
+    def _shrink(self, entry, target_bytes):
+        """Reclaim memory from one session until it holds at most target_bytes.
+
+        Runs on whichever session's thread is being tracked: the caches are
+        cleared in one call and the history window is trimmed under its lock,
+        so the owning session can keep using both.
+        """
+        before = entry.bytes
+        self._clear_caches(entry)
+        entry.bytes = self._measure(entry)
+
+        # Then halve the in-memory history window until under the target
+        history = entry.values.get("messages")
+        trim = getattr(history, "trim", None)
+        while trim is not None and entry.bytes > target_bytes and history.memory_messages:
+            trim(history.memory_messages // 2)
+            entry.bytes = self._measure(entry)
+
+        self._count_evicted(before - entry.bytes)
+
+    def _release_idle(self, now):
+        """Release what sessions without a rerun for the idle TTL hold, and forget them.
+
+        Values with a release() method, such as the chat history, drop all they
+        can read back; a released session that reruns rebuilds them on demand.
+        """
+        if self.idle_ttl_seconds <= 0:
+            return
+        for session_key, entry in list(self._sessions.items()):
+            if now - entry.last_seen > self.idle_ttl_seconds:
+                self._clear_caches(entry)
+                for value in entry.values.values():
+                    release = getattr(value, "release", None)
+                    if callable(release):
+                        release()
+                self._count_evicted(entry.bytes - self._measure(entry))
+                del self._sessions[session_key]
+                self.released_sessions += 1
+
+    @staticmethod
+    def _clear_caches(entry):
+        for key in _CACHE_KEYS:
+            cache = entry.values.get(key)
+            if cache:
+                cache.clear()
+
+    def _count_evicted(self, freed):
+        if freed > 0:
+            self.evicted_bytes += freed
+            metrics.increment("session_memory_evicted_bytes", freed)
+
+    def _enforce_global(self, current_key):
+        """Shrink sessions, least recently active first, until all fit the global budget."""
+        total = sum(entry.bytes for entry in self._sessions.values())
+        if total <= self.global_budget_bytes:
+            return
+        # The session being rendered goes last
+        entries = sorted(
+            self._sessions.items(), key=lambda item: (item[0] == current_key, item[1].last_seen)
+        )
+        for _session_key, entry in entries:
+            excess = total - self.global_budget_bytes
+            if excess <= 0:
+                break
+            before = entry.bytes
+            self._shrink(entry, max(before - excess, 0))
+            total -= before - entry.bytes
+
+
+_accountant = SessionMemoryAccountant()
+metrics.register_gauges("session_memory", _accountant.stats)
+
+
+def get_session_accountant():
+    """Return the process-wide session memory accountant."""
+    return _accountant
+
+
+def track_session_memory():
+    """Account the current session's state; call once per rerun.
+
+    Returns:
+        Bytes the session holds after enforcement
+    """
+    session_key = st.session_state.setdefault("memory_session_key", uuid.uuid4().hex)
+    values = {key: st.session_state[key] for key in TRACKED_KEYS if key in st.session_state}
+    return _accountant.track(session_key, values)
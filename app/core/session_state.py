@@ -1,18 +1,81 @@
 """Initialize and manage Streamlit session state."""
 
+import hashlib
 import uuid
 import streamlit as st
-from app.config.settings import DEFAULT_REGION
+from app.config.settings import DEFAULT_REGION, CHAT_HISTORY_PAGE_SIZE
+from app.core.aws_client import get_session_credentials
+from app.core.conversation_store import ConversationHistory, get_conversation_store
+
+# URL query parameter naming the conversation, so it survives reloads and restarts
+SESSION_QUERY_PARAM = "session"
+
+
+def new_session_id():
+    """Return a new runtime session id (must be 33+ characters)."""
+    return str(uuid.uuid4()) + str(uuid.uuid4())[:5]
+
+
+def agent_session_id(agent_arn):
+    """Runtime session id of one agent in comparison mode.
+
+    Derived from the conversation, so every compared agent keeps its own
+    context across turns, also after the conversation is reopened.
+    """
+    material = f"{st.session_state.session_id}\0{agent_arn}".encode("utf-8")
+    return hashlib.sha256(material).hexdigest()[:40]
+
+
+def start_new_conversation(session_id=None):
+    """Point the session at a new (or given) conversation; stored history is kept."""
+    session_id = session_id or new_session_id()
+    st.session_state.session_id = session_id
+    st.session_state.messages = ConversationHistory(session_id)
+    st.session_state.history_window = CHAT_HISTORY_PAGE_SIZE
+    st.query_params[SESSION_QUERY_PARAM] = session_id
+
+
+def conversation_owner():
+    """Identity that conversations of this session belong to.
+
+    The caller ARN validated on the setup page, or else a fingerprint of the
+    configured credentials.
+    """
+    caller_arn = st.session_state.get("aws_caller_arn", "")
+    return caller_arn or f"credentials:{get_session_credentials().fingerprint}"
+
+
+def claim_conversation():
+    """Make sure the current conversation belongs to this session's AWS identity.
+
+    A conversation reopened from a URL that another identity started is not
+    shown; the session starts a new conversation instead. Call once
+    credentials are configured.
+    """
+    owner = conversation_owner()
+    if st.session_state.get("conversation_claim") == (st.session_state.session_id, owner):
+        return
+    if not get_conversation_store().claim(st.session_state.session_id, owner):
+        start_new_conversation()
+        get_conversation_store().claim(st.session_state.session_id, owner)
+    st.session_state.conversation_claim = (st.session_state.session_id, owner)
 
 
 def initialize_session_state():
     """Initialize all session state variables."""
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    if "session_id" not in st.session_state or "messages" not in st.session_state:
+        # Reopen the conversation named in the URL, if any
+        session_id = st.query_params.get(SESSION_QUERY_PARAM, "")
+        start_new_conversation(session_id if len(session_id) >= 33 else None)
 
-    if "session_id" not in st.session_state:
-        # Session ID must be 33+ characters
-        st.session_state.session_id = str(uuid.uuid4()) + str(uuid.uuid4())[:5]
+    if "active_invocation" not in st.session_state:
+        st.session_state.active_invocation = None
+
+    if "active_comparison" not in st.session_state:
+        st.session_state.active_comparison = None
+
+    if "compare_agent_arns" not in st.session_state:
+        st.session_state.compare_agent_arns = []
 
     if "agent_arn" not in st.session_state:
         st.session_state.agent_arn = ""
@@ -32,6 +95,12 @@ def initialize_session_state():
     if "aws_session_token" not in st.session_state:
         st.session_state.aws_session_token = ""
 
+    if "aws_account_id" not in st.session_state:
+        st.session_state.aws_account_id = ""
+
+    if "aws_caller_arn" not in st.session_state:
+        st.session_state.aws_caller_arn = ""
+
     if "credentials_configured" not in st.session_state:
         st.session_state.credentials_configured = False
 
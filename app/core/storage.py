@@ -0,0 +1,23 @@
+"""Local directories for caches and stores shared by all sessions."""
+
+import os
+import stat
+
+
+def ensure_private_dir(path):
+    """Create a directory only the current user can access, and return its path.
+
+    The default cache locations live under the shared temp directory, so an
+    existing directory must belong to this user; its permissions are narrowed
+    to 0700 if needed.
+
+    Raises:
+        PermissionError: If the directory exists and belongs to another user
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"Cache directory {path} belongs to another user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
@@ -1,7 +1,8 @@
 """Main Streamlit application for AI Chat Assistant."""
 
-import json
 import sys
+import time
+import uuid
 from pathlib import Path
 import streamlit as st
 
@@ -10,11 +11,25 @@ project_root = Path(__file__).parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-from app.config.settings import APP_TITLE, DEFAULT_REGION
-from app.core.session_state import initialize_session_state
-from app.core.aws_client import get_boto3_client
-from app.ui.components import render_credentials_setup, render_sidebar
-from app.services.streaming import stream_agent_response, extract_assistant_message
+from app.config.settings import AGENT_RESPONSE_KEY_CONVERSATION, APP_TITLE, DEFAULT_REGION
+from app.core.session_state import initialize_session_state, agent_session_id, claim_conversation
+from app.core.aws_client import get_boto3_client, get_session_credentials, region_from_arn, warm_aws_sdk
+from app.core.session_memory import track_session_memory
+from app.core.metrics import metrics
+from app.ui.components import (
+    render_credentials_setup,
+    render_sidebar,
+    render_chat_history,
+    render_agent_replies,
+    format_latency,
+    format_response_source,
+)
+from app.ui.streaming_placeholder import ThrottledMarkdown
+from app.services.streaming import recover_response_text
+from app.services.agent_worker import start_agent_invocation
+from app.services.agent_warmup import get_agent_warmer
+from app.services.response_cache import get_response_layer
+from app.services.s3_handler import render_link_styles
 
 
 def render_message_with_s3(text, region, unique_id=""):
@@ -24,10 +39,225 @@ def render_message_with_s3(text, region, unique_id=""):
     render_message_with_s3_links(text, region, unique_id)
 
 
-def main():
-    """Main application entry point."""
+def invocation_status(invocation):
+    """Placeholder text of an invocation that has not produced text yet."""
+    if invocation.queue_position:
+        return f"⏳ Queued (position {invocation.queue_position})"
+    return "💭 Thinking..."
+
+
+def yield_to_streamlit():
+    """Let Streamlit act on a Stop click or other rerun request while an agent is silent.
+
+    Streamlit only handles those requests when the script calls into it;
+    reading session state is the cheapest such call.
+    """
+    st.session_state.get("active_invocation")
+
+
+def render_active_invocation(region):
+    """Drain the in-flight agent invocation into the chat, with a Stop control."""
+    invocation = st.session_state.get("active_invocation")
+    if invocation is None:
+        return
+
+    with st.chat_message("assistant"):
+        stop_placeholder = st.empty()
+        stop_placeholder.button("⏹ Stop", key=f"stop_{invocation.id}", on_click=invocation.cancel)
+        message_placeholder = st.empty()
+        
+        # Repaint what earlier runs already drained, then keep draining
+        streamed_text = ThrottledMarkdown(message_placeholder)
+        status = None
+        
+        def show_status():
+            # Queue position or thinking indicator until the first chunk arrives,
+            # then text the throttle held back while the agent is silent
+            nonlocal status
+            yield_to_streamlit()
+            if invocation.text:
+                streamed_text.tick()
+                return
+            current = invocation_status(invocation)
+            if current != status:
+                message_placeholder.markdown(current)
+                status = current
+        
+        if invocation.text:
+            streamed_text.append(invocation.text)
+        else:
+            show_status()
+        
+        for chunk in invocation.iter_chunks(on_idle=show_status):
+            streamed_text.append(chunk)
+        
+        stop_placeholder.empty()
+        message_placeholder.empty()
+        assistant_message = invocation.text
+        
+        try:
+            if invocation.error is not None:
+                if not invocation.raw_body:
+                    # The agent never replied; retries already ran in the worker
+                    raise invocation.error
+                
+                # The reply arrived but handling it failed: re-parse it, never re-invoke
+                st.warning(f"Streaming failed, showing the full reply: {str(invocation.error)}")
+                assistant_message = recover_response_text(invocation.raw_body, invocation.content_type)
+            
+            # Add to chat history, keeping partial output of a stopped reply
+            if assistant_message:
+                st.session_state.messages.append(
+                    {"id": uuid.uuid4().hex, "role": "assistant", "content": assistant_message}
+                )
+            st.session_state.active_invocation = None
+            
+            # Render final message with S3 links
+            if assistant_message:
+                render_message_with_s3(assistant_message, region, unique_id=f"reply_{invocation.id}")
+            if invocation.cancelled:
+                st.caption("⏹ Stopped")
+            elif invocation.stats.get("response_source"):
+                st.caption(format_response_source(invocation.stats["response_source"]))
+        
+        except Exception as e:
+            st.session_state.active_invocation = None
+            error_msg = f"Error: {str(e)}"
+            st.markdown(f"❌ {error_msg}")
+            st.session_state.messages.append({"id": uuid.uuid4().hex, "role": "assistant", "content": error_msg})
+            st.error(f"Full error: {repr(e)}")
+
+
+def render_active_comparison(region):
+    """Drain the in-flight comparison turn, streaming every agent's reply in its own column."""
+    invocations = st.session_state.get("active_comparison")
+    if not invocations:
+        return
+
+    agent_names = {agent['arn']: agent['name'] for agent in st.session_state.get("available_agents", [])}
+    with st.chat_message("assistant"):
+        stop_placeholder = st.empty()
+        stop_placeholder.button(
+            "⏹ Stop all",
+            key=f"stop_{invocations[0].id}",
+            on_click=lambda: [invocation.cancel() for invocation in invocations]
+        )
+        
+        renderers = []
+        statuses = []
+        for column, invocation in zip(st.columns(len(invocations)), invocations):
+            with column:
+                st.markdown(f"**{agent_names.get(invocation.agent_arn, invocation.agent_arn)}**")
+                renderer = ThrottledMarkdown(st.empty())
+                if invocation.text:
+                    renderer.append(invocation.text)
+                renderers.append(renderer)
+                statuses.append(None)
+        
+        # Poll every agent in turn, so the slowest one bounds the wall time
+        pending = list(range(len(invocations)))
+        while pending:
+            for idx in list(pending):
+                invocation = invocations[idx]
+                chunks = invocation.drain_ready()
+                if chunks:
+                    renderers[idx].append("".join(chunks))
+                elif invocation.text:
+                    renderers[idx].tick()
+                else:
+                    status = invocation_status(invocation)
+                    if status != statuses[idx]:
+                        renderers[idx].placeholder.markdown(status)
+                        statuses[idx] = status
+                if invocation.drained or invocation.cancelled:
+                    pending.remove(idx)
+            if pending:
+                time.sleep(0.05)
+                yield_to_streamlit()
+        
+        stop_placeholder.empty()
+        for renderer in renderers:
+            renderer.placeholder.empty()
+        
+        # Store one assistant message per agent, grouped by comparison id
+        comparison = invocations[0].id
+        replies = []
+        for invocation in invocations:
+            content = invocation.text
+            if invocation.error is not None:
+                if invocation.raw_body:
+                    content = recover_response_text(invocation.raw_body, invocation.content_type)
+                else:
+                    content = f"❌ Error: {str(invocation.error)}"
+            elif invocation.cancelled:
+                content = (content + "\n\n⏹ Stopped").strip()
+            reply = {
+                "id": uuid.uuid4().hex,
+                "role": "assistant",
+                "content": content,
+                "comparison": comparison,
+                "agent_arn": invocation.agent_arn,
+                "agent_name": agent_names.get(invocation.agent_arn, invocation.agent_arn),
+                "latency_seconds": invocation.stats.get("total_seconds"),
+                "first_token_seconds": invocation.stats.get("first_token_seconds"),
+                "response_source": invocation.stats.get("response_source"),
+            }
+            st.session_state.messages.append(reply)
+            replies.append(reply)
+        st.session_state.active_comparison = None
+        
+        render_agent_replies(replies, region, key_prefix=f"reply_{comparison}")
+
+
+def conversation_context():
+    """Return the prompts sent before the latest one, when the response cache keys turns on them."""
+    if not (get_response_layer().enabled and AGENT_RESPONSE_KEY_CONVERSATION):
+        return None
+    messages = st.session_state.messages
+    return [message["content"] for message in messages.page(0, len(messages) - 1) if message["role"] == "user"]
+
+
+def start_invocation(agent_arn, session_id, prompt, region, account_id, context=None):
+    """Start an agent call on a worker thread, in the region the agent runs in.
+
+    The client and caller are resolved here because workers cannot read
+    session state.
+    """
+    agent_region = region_from_arn(agent_arn, region)
+    client = get_boto3_client('bedrock-agentcore', agent_region)
+    return start_agent_invocation(
+        client, agent_arn, session_id, prompt, agent_region, account_id=account_id, context=context,
+        caller=get_session_credentials().fingerprint
+    )
+
+
+def warm_selected_agents(region):
+    """Warm the runtime sessions the next message will go to, and mark them active.
+
+    Covers a newly selected agent as well as a new session id after "Clear
+    Chat"; sessions already warmed or used are only marked active.
+    """
+    if st.session_state.get("compare_mode"):
+        arns = st.session_state.get("compare_agent_arns", [])
+        targets = [(arn, agent_session_id(arn)) for arn in arns]
+    elif st.session_state.get("agent_arn"):
+        targets = [(st.session_state.agent_arn, st.session_state.session_id)]
+    else:
+        return
+    credentials = get_session_credentials()
+    warmer = get_agent_warmer()
+    for agent_arn, session_id in targets:
+        warmer.warm(credentials, agent_arn, session_id, region_from_arn(agent_arn, region),
+                    account_id=st.session_state.get("aws_account_id", ""))
+
+
+def run_app():
+    """Render one run of the application."""
     # Initialize session state
     initialize_session_state()
+
+    # Keep this session, and all sessions together, within their memory budgets
+    track_session_memory()
     
     # Check if credentials are configured
     access_key = st.session_state.get("aws_access_key_id", "").strip()
@@ -38,103 +268,93 @@ def main():
         render_credentials_setup()
         st.stop()
 
+    # A conversation reopened from its URL is only shown to the identity that started it
+    claim_conversation()
+
     # Main app continues here
     st.title(APP_TITLE)
     
+    # One stylesheet for the S3 link buttons of every message on the page
+    render_link_styles()
+    
     # Render sidebar
     render_sidebar()
     
+    # Start the selected agents' runtime sessions before the first message
+    warm_selected_agents(st.session_state.get("region", DEFAULT_REGION))
+    
     # Display chat history
     region = st.session_state.get("region", DEFAULT_REGION)
-    for idx, message in enumerate(st.session_state.messages):
-        with st.chat_message(message["role"]):
-            if message["role"] == "assistant":
-                render_message_with_s3(message["content"], region, unique_id=f"msg_{idx}")
-            else:
-                st.markdown(message["content"])
+    render_chat_history(st.session_state.messages, region)
 
     # Chat input
     if prompt := st.chat_input("Type your message..."):
+        # A new prompt stops a reply that is still streaming
+        if st.session_state.get("active_invocation") is not None:
+            st.session_state.active_invocation.cancel()
+            render_active_invocation(region)
+        if st.session_state.get("active_comparison"):
+            for invocation in st.session_state.active_comparison:
+                invocation.cancel()
+            render_active_comparison(region)
+
         # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        st.session_state.messages.append({"id": uuid.uuid4().hex, "role": "user", "content": prompt})
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Get assistant response
-        with st.chat_message("assistant"):
-            message_placeholder = st.empty()
-            message_placeholder.markdown("💭 Thinking...")
+        try:
+            # Get ARN and region from session state
+            agent_arn = st.session_state.get("agent_arn", "")
+            region = st.session_state.get("region", DEFAULT_REGION)
+            account_id = st.session_state.get("aws_account_id", "")
+            compare_arns = st.session_state.get("compare_agent_arns", [])
+            context = conversation_context()
             
-            try:
-                # Get ARN and region from session state
-                agent_arn = st.session_state.get("agent_arn", "")
-                region = st.session_state.get("region", DEFAULT_REGION)
-                
-                # Validate ARN
-                if not agent_arn or not agent_arn.strip():
-                    raise ValueError("Please select an agent from the sidebar")
-                
-                # Stream the response
-                assistant_message = ""
-                try:
-                    # Use streaming response
-                    response_generator = stream_agent_response(
-                        agent_arn,
-                        st.session_state.session_id,
-                        prompt,
-                        region
-                    )
-                    
-                    # Collect the streamed message
-                    for chunk in response_generator:
-                        assistant_message += chunk
-                        # Show streaming text
-                        message_placeholder.markdown(assistant_message + "▌")
-                    
-                    # Clear streaming cursor and render final message with S3 links
-                    message_placeholder.empty()
-                    if assistant_message:
-                        render_message_with_s3(assistant_message, region, unique_id="streaming")
-                    
-                except Exception as stream_error:
-                    # Fallback to non-streaming if streaming fails
-                    st.warning(f"Streaming failed, using non-streaming mode: {str(stream_error)}")
-                    
-                    # Create Bedrock AgentCore client
-                    client = get_boto3_client('bedrock-agentcore', region)
-                    
-                    # Prepare payload
-                    payload = json.dumps({"message": prompt})
-                    
-                    # Invoke agent runtime
-                    response = client.invoke_agent_runtime(
-                        agentRuntimeArn=agent_arn,
-                        runtimeSessionId=st.session_state.session_id,
-                        payload=payload,
-                        qualifier="DEFAULT"
-                    )
-                    
-                    # Read response
-                    response_body = response['response'].read()
-                    response_data = json.loads(response_body)
-                    
-                    # Extract the assistant message
-                    assistant_message = extract_assistant_message(response_data)
-                    
-                    # Render message with S3 download handling
-                    message_placeholder.empty()
-                    render_message_with_s3(assistant_message, region, unique_id="fallback")
-                
-                # Add to chat history
-                if assistant_message:
-                    st.session_state.messages.append({"role": "assistant", "content": assistant_message})
-
-            except Exception as e:
+            # Validate ARN
+            if st.session_state.get("compare_mode"):
+                if not compare_arns:
+                    raise ValueError("Please select the agents to compare in the sidebar")
+            elif not agent_arn or not agent_arn.strip():
+                raise ValueError("Please select an agent from the sidebar")
+            
+            if st.session_state.get("compare_mode"):
+                # Fan out to every selected agent at once, each in its own runtime session
+                st.session_state.active_comparison = [
+                    start_invocation(arn, agent_session_id(arn), prompt, region, account_id, context)
+                    for arn in compare_arns
+                ]
+            else:
+                st.session_state.active_invocation = start_invocation(
+                    agent_arn,
+                    st.session_state.session_id,
+                    prompt,
+                    region,
+                    account_id,
+                    context
+                )
+        except Exception as e:
+            with st.chat_message("assistant"):
                 error_msg = f"Error: {str(e)}"
-                message_placeholder.markdown(f"❌ {error_msg}")
-                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                st.markdown(f"❌ {error_msg}")
+                st.session_state.messages.append({"id": uuid.uuid4().hex, "role": "assistant", "content": error_msg})
                 st.error(f"Full error: {repr(e)}")
 
+    # Stream the in-flight reply, resuming it after reruns
+    render_active_invocation(region)
+    render_active_comparison(region)
+
+
+def main():
+    """Main application entry point."""
+    try:
+        with metrics.timer("rerun_seconds"):
+            run_app()
+    finally:
+        metrics.write_prometheus_file()
+        # The page is painted; load the AWS SDK before the first call needs it
+        warm_aws_sdk()
+
 
 if __name__ == "__main__":
     main()
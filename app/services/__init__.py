@@ -1,9 +1,27 @@
 """Service layer modules."""
 
 from .streaming import stream_agent_response, extract_assistant_message
+from .agent_worker import AgentInvocation, start_agent_invocation, agent_worker_stats
+from .batch_runner import BatchRunner, load_prompts
+from .response_cache import ResponseLayer, ResponseStore, CassetteMiss, get_response_layer, set_response_layer
+from .admission import AdaptiveConcurrencyLimiter, AdmissionLease, get_agent_limiter, admission_stats
 
 __all__ = [
     "stream_agent_response",
     "extract_assistant_message",
+    "AgentInvocation",
+    "start_agent_invocation",
+    "agent_worker_stats",
+    "BatchRunner",
+    "load_prompts",
+    "ResponseLayer",
+    "ResponseStore",
+    "CassetteMiss",
+    "get_response_layer",
+    "set_response_layer",
+    "AdaptiveConcurrencyLimiter",
+    "AdmissionLease",
+    "get_agent_limiter",
+    "admission_stats",
 ]
 
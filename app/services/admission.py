@@ -0,0 +1,229 @@
+"""Process-wide admission control for agent calls.
+
+One limiter per (account, agent ARN) caps how many invoke_agent_runtime calls
+are in flight across all Streamlit sessions. Calls over the ceiling queue up
+and are admitted round-robin across chat sessions, so one busy session cannot
+starve the others. The ceiling adapts AIMD-style: it grows slowly while calls
+succeed at full utilization and is cut sharply when AgentCore throttles.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from app.config.settings import (
+    AGENT_ADMISSION_DECREASE_FACTOR,
+    AGENT_ADMISSION_INITIAL_LIMIT,
+    AGENT_ADMISSION_MAX_LIMIT,
+    AGENT_ADMISSION_MIN_LIMIT,
+    AGENT_ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
+from app.core.metrics import metrics
+
+
+class AdmissionCancelled(Exception):
+    """The caller gave up while waiting in the queue."""
+
+
+class AdmissionTimeout(Exception):
+    """No slot became free within the queue timeout."""
+
+
+class _Ticket:
+    __slots__ = ("session_key", "admitted", "epoch")
+
+    def __init__(self, session_key):
+        self.session_key = session_key
+        self.admitted = False
+        # Number of ceiling decreases when the ticket was admitted
+        self.epoch = 0
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency ceiling with fair per-session queueing and AIMD adaptation."""
+
+    def __init__(self, initial_limit=AGENT_ADMISSION_INITIAL_LIMIT, min_limit=AGENT_ADMISSION_MIN_LIMIT,
+                 max_limit=AGENT_ADMISSION_MAX_LIMIT, decrease_factor=AGENT_ADMISSION_DECREASE_FACTOR):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.limit = float(initial_limit)
+        self.in_flight = 0
+        self.admitted = 0
+        self.throttled = 0
+        self._cond = threading.Condition()
+        # session key -> queued tickets; the first session is served next
+        self._queues = OrderedDict()
+        self._decreases = 0
+
+    def acquire(self, session_key, on_position=None, should_abort=None,
+                timeout=AGENT_ADMISSION_QUEUE_TIMEOUT_SECONDS, poll_interval=0.1):
+        """Wait for a slot.
+
+        Args:
+            session_key: Key of the chat session, for fair queueing
+            on_position: Optional callback receiving the 1-based queue
+                position while waiting, and None once admitted
+            should_abort: Optional callable; waiting stops when it returns True
+            timeout: Seconds to wait before giving up
+            poll_interval: Seconds between position updates and abort checks
+
+        Returns:
+            Ticket to pass to release()
+        """
+        ticket = _Ticket(session_key)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._queues.setdefault(session_key, deque()).append(ticket)
+            self._admit()
+            reported = None
+            while not ticket.admitted:
+                if should_abort is not None and should_abort():
+                    self._remove(ticket)
+                    raise AdmissionCancelled("Cancelled while queued")
+                if time.monotonic() >= deadline:
+                    self._remove(ticket)
+                    raise AdmissionTimeout(f"Agent is busy: no free slot after {timeout:.0f}s in the queue")
+                position = self._position(ticket)
+                if on_position is not None and position != reported:
+                    on_position(position)
+                    reported = position
+                self._cond.wait(poll_interval)
+        if on_position is not None and reported is not None:
+            on_position(None)
+        return ticket
+
+    def release(self, ticket, throttled=False, succeeded=False):
+        """Free a ticket's slot, adapting the ceiling to how its call went.
+
+        Args:
+            ticket: Ticket returned by acquire()
+            throttled: The call was throttled; the ceiling is cut
+            succeeded: The call completed; the ceiling may grow. Calls that
+                failed otherwise leave it unchanged
+        """
+        with self._cond:
+            saturated = self.in_flight >= int(self.limit) or bool(self._queues)
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                # Calls admitted before the last cut were sent under the old
+                # ceiling; their throttles belong to the burst already handled
+                if ticket.epoch == self._decreases:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._decreases += 1
+            elif succeeded and saturated:
+                # Additive increase: about +1 per ceiling's worth of successes,
+                # and only while the ceiling is actually what limits throughput
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._admit()
+
+    def stats(self):
+        """Return the ceiling, in-flight and queued calls, and counters."""
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "queued": sum(len(tickets) for tickets in self._queues.values()),
+                "admitted": self.admitted,
+                "throttled": self.throttled,
+            }
+
+    def _admit(self):
+        """Admit queued tickets round-robin across sessions while slots are free."""
+        while self._queues and self.in_flight < int(self.limit):
+            session_key, tickets = next(iter(self._queues.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                self._queues.move_to_end(session_key)
+            else:
+                del self._queues[session_key]
+            ticket.admitted = True
+            ticket.epoch = self._decreases
+            self.in_flight += 1
+            self.admitted += 1
+        self._cond.notify_all()
+
+    def _remove(self, ticket):
+        tickets = self._queues.get(ticket.session_key)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._queues[ticket.session_key]
+
+    def _position(self, ticket):
+        """1-based position at which a queued ticket will be admitted."""
+        index = self._queues[ticket.session_key].index(ticket)
+        ahead = 0
+        own_session_seen = False
+        for session_key, tickets in self._queues.items():
+            # Every session gets one ticket per round: all sessions are served
+            # `index` times before this ticket's round...
+            ahead += min(len(tickets), index)
+            # ...and sessions ahead of this one in the round go first
+            if session_key == ticket.session_key:
+                own_session_seen = True
+            elif not own_session_seen and len(tickets) > index:
+                ahead += 1
+        return ahead + 1
+
+
+class AdmissionLease:
+    """One call's claim on a limiter slot, re-acquired for every invoke attempt."""
+
+    def __init__(self, limiter, session_key, on_position=None, should_abort=None):
+        self.limiter = limiter
+        self.session_key = session_key
+        self.on_position = on_position
+        self.should_abort = should_abort
+        self._ticket = None
+
+    @property
+    def held(self):
+        return self._ticket is not None
+
+    def acquire(self):
+        """Wait for a slot unless one is already held."""
+        if self.held:
+            return
+        started = time.perf_counter()
+        self._ticket = self.limiter.acquire(
+            self.session_key, on_position=self.on_position, should_abort=self.should_abort
+        )
+        metrics.observe("agent_admission_wait_seconds", time.perf_counter() - started)
+
+    def release(self, throttled=False, succeeded=False):
+        """Give the slot back, if held, saying how the call went."""
+        ticket, self._ticket = self._ticket, None
+        if ticket is not None:
+            self.limiter.release(ticket, throttled=throttled, succeeded=succeeded)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_agent_limiter(account_id, agent_arn):
+    """Return the process-wide limiter for an account and agent runtime."""
+    key = (account_id, agent_arn)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveConcurrencyLimiter()
+        return limiter
+
+
+def admission_stats():
+    """Return in-flight and queued calls and throttle counts across all limiters."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    totals = {"limiters": len(limiters), "in_flight": 0, "queued": 0, "throttled": 0}
+    for limiter in limiters:
+        stats = limiter.stats()
+        for field in ("in_flight", "queued", "throttled"):
+            totals[field] += stats[field]
+    if limiters:
+        totals["min_limit"] = min(limiter.limit for limiter in limiters)
+    return totals
+
+
+metrics.register_gauges("agent_admission", admission_stats)
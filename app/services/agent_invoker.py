@@ -0,0 +1,115 @@
+"""Single entry point for invoke_agent_runtime with retries of transient failures."""
+
+import json
+import random
+import time
+from app.core.metrics import client_region, metrics
+from app.config.settings import (
+    AGENT_INVOKE_BACKOFF_BASE_SECONDS,
+    AGENT_INVOKE_BACKOFF_MAX_SECONDS,
+    AGENT_INVOKE_DEADLINE_SECONDS,
+    AGENT_INVOKE_MAX_ATTEMPTS,
+)
+
+# Error codes worth retrying: the request was rejected or failed server-side
+TRANSIENT_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "InternalFailure",
+    "RequestTimeout",
+    "RequestTimeoutException",
+}
+
+# Error codes meaning the caller is sending too much; the admission limiter backs off
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+}
+
+
+def is_transient_error(error):
+    """Check whether an invoke error is worth retrying."""
+    # Imported here so loading this module does not import botocore
+    from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+    if isinstance(error, (BotoConnectionError, HTTPClientError, ConnectionResetError)):
+        return True
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in TRANSIENT_ERROR_CODES or status == 429 or status >= 500
+    return False
+
+
+def is_throttling_error(error):
+    """Check whether an invoke error means the agent runtime is throttling us."""
+    from botocore.exceptions import ClientError
+
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code", "")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in THROTTLING_ERROR_CODES or status == 429
+    return False
+
+
+def backoff_delay(attempt, base=AGENT_INVOKE_BACKOFF_BASE_SECONDS, cap=AGENT_INVOKE_BACKOFF_MAX_SECONDS):
+    """Return a full-jitter exponential backoff delay for a 0-based retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def invoke_agent_runtime(client, agent_arn, session_id, prompt, lease=None,
+                         max_attempts=AGENT_INVOKE_MAX_ATTEMPTS, deadline_seconds=AGENT_INVOKE_DEADLINE_SECONDS):
+    """Invoke an agent runtime, retrying transient failures before any reply arrives.
+
+    Only the invoke call itself is retried; once the response body starts
+    streaming the agent has run, so later failures are never retried.
+
+    With an admission lease, every attempt first waits for a slot; a failed
+    attempt gives the slot back (reporting throttling), a successful one keeps
+    it for the caller to release once the body has been read.
+
+    Args:
+        client: bedrock-agentcore client
+        agent_arn: Agent runtime ARN
+        session_id: Runtime session id
+        prompt: User prompt
+        lease: Optional AdmissionLease
+        max_attempts: Maximum number of invoke attempts
+        deadline_seconds: Give up retrying once this much time has passed
+
+    Returns:
+        The invoke_agent_runtime response dict
+    """
+    # Prepare payload
+    payload = json.dumps({"message": prompt})
+    deadline = time.monotonic() + deadline_seconds
+    labels = {"agent_arn": agent_arn, "region": client_region(client)}
+
+    attempt = 0
+    with metrics.timer("agent_invoke_seconds", **labels):
+        while True:
+            if lease is not None:
+                lease.acquire()
+            try:
+                return client.invoke_agent_runtime(
+                    agentRuntimeArn=agent_arn,
+                    runtimeSessionId=session_id,
+                    payload=payload,
+                    qualifier="DEFAULT"
+                )
+            except Exception as e:
+                if lease is not None:
+                    lease.release(throttled=is_throttling_error(e))
+                attempt += 1
+                if attempt >= max_attempts or not is_transient_error(e):
+                    raise
+                delay = backoff_delay(attempt - 1)
+                if time.monotonic() + delay > deadline:
+                    raise
+                metrics.increment("agent_invoke_retries", **labels)
+                time.sleep(delay)
+
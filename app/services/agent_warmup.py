@@ -0,0 +1,275 @@
+"""Background warm-up and keep-alive of agent runtime sessions.
+
+The first invocation of a runtime session pays the AgentCore cold start. A
+warm-up sends a lightweight payload on the session as soon as it is known
+(an agent was selected, a conversation was started), so the user's first
+message finds it running. Keep-alive pings then hold sessions warm while their
+tab stays active. Both share a process-wide rate cap, and pings over the cap
+are skipped rather than queued. A ping sent is admitted like any other call
+to its agent, so warm-ups never push a runtime past its admission limit.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.config.settings import (
+    AGENT_ADMISSION_ENABLED,
+    AGENT_KEEPALIVE_ENABLED,
+    AGENT_KEEPALIVE_IDLE_SECONDS,
+    AGENT_KEEPALIVE_INTERVAL_SECONDS,
+    AGENT_WARMUP_ENABLED,
+    AGENT_WARMUP_MAX_SESSIONS,
+    AGENT_WARMUP_PAYLOAD,
+    AGENT_WARMUP_RATE_PER_SECOND,
+    AGENT_WARMUP_WAIT_SECONDS,
+)
+from app.core.metrics import client_region, metrics
+from app.core.rate_limiter import RateLimiter
+from app.services.admission import AdmissionLease, get_agent_limiter
+from app.services.agent_invoker import is_throttling_error
+
+
+class _WarmTarget:
+    """One runtime session known to the warmer."""
+
+    __slots__ = ("agent_arn", "session_id", "region_name", "account_id", "caller", "credentials", "client",
+                 "state", "turns", "last_active", "last_invoked", "done")
+
+    def __init__(self, agent_arn, session_id, region_name, account_id="", caller=None, credentials=None,
+                 client=None):
+        self.agent_arn = agent_arn
+        self.session_id = session_id
+        self.region_name = region_name
+        # Admission limiter key, and fingerprint of the credentials the session is used with
+        self.account_id = account_id
+        self.caller = caller
+        self.credentials = credentials
+        self.client = client
+        # "cold", "warming", "warm" or "failed"
+        self.state = "cold"
+        self.turns = 0
+        # Last rerun of a tab using the session, and last invocation sent on it
+        self.last_active = time.time()
+        self.last_invoked = 0.0
+        self.done = threading.Event()
+
+
+class AgentWarmer:
+    """Warms runtime sessions before their first turn and keeps active ones warm."""
+
+    def __init__(self, warmup_enabled=AGENT_WARMUP_ENABLED, keepalive_enabled=AGENT_KEEPALIVE_ENABLED,
+                 rate_per_second=AGENT_WARMUP_RATE_PER_SECOND,
+                 keepalive_interval=AGENT_KEEPALIVE_INTERVAL_SECONDS,
+                 keepalive_idle=AGENT_KEEPALIVE_IDLE_SECONDS,
+                 payload=AGENT_WARMUP_PAYLOAD, max_sessions=AGENT_WARMUP_MAX_SESSIONS):
+        self.warmup_enabled = warmup_enabled
+        self.keepalive_enabled = keepalive_enabled
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_idle = keepalive_idle
+        self.payload = json.dumps(payload)
+        self.max_sessions = max_sessions
+        self.rate_limiter = RateLimiter(rate_per_second, burst=max(int(rate_per_second), 1))
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._targets = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="agent-warmup")
+        self._keepalive_thread = None
+
+    def warm(self, credentials, agent_arn, session_id, region_name, account_id=""):
+        """Warm a runtime session in the background unless it is already known.
+
+        Also marks the session's tab as active for keep-alive. Cheap enough to
+        call on every rerun.
+
+        Args:
+            credentials: AwsCredentials the session is used with
+            agent_arn: Agent runtime ARN
+            session_id: Runtime session id
+            region_name: Region of the agent runtime
+            account_id: AWS account id, for per-account admission control
+
+        Returns:
+            The session's state: "cold", "warming", "warm", "failed", or None
+            if it is not tracked (warm-up disabled or over the rate cap)
+        """
+        key = (agent_arn, session_id)
+        with self._lock:
+            target = self._targets.get(key)
+            if target is not None:
+                target.last_active = time.time()
+                if target.credentials is None:
+                    target.credentials = credentials
+                    target.caller = credentials.fingerprint if credentials else None
+                self._targets.move_to_end(key)
+                return target.state
+            if not (self.warmup_enabled and credentials):
+                return None
+            if not self.rate_limiter.try_acquire():
+                # Not registered, so a later rerun tries again
+                self.skipped += 1
+                return None
+            target = self._track(key, _WarmTarget(
+                agent_arn, session_id, region_name, account_id=account_id,
+                caller=credentials.fingerprint, credentials=credentials
+            ))
+            target.state = "warming"
+        self._executor.submit(self._ping, target, "warmup")
+        self._ensure_keepalive()
+        return target.state
+
+    def begin_turn(self, client, agent_arn, session_id, region_name, account_id="", caller=None,
+                   wait=AGENT_WARMUP_WAIT_SECONDS):
+        """Note a user turn on a runtime session.
+
+        Waits for a warm-up still in flight on the session, so the turn does
+        not race it onto a second cold start. account_id and caller are
+        recorded for keep-alive pings, as in warm().
+
+        Returns:
+            "warm" or "cold" for the session's first turn, None for later turns
+        """
+        key = (agent_arn, session_id)
+        with self._lock:
+            target = self._targets.get(key)
+            if target is None:
+                target = self._track(key, _WarmTarget(
+                    agent_arn, session_id, region_name, account_id=account_id, caller=caller, client=client
+                ))
+            target.client = target.client or client
+            target.caller = target.caller or caller
+            target.turns += 1
+            first_turn = target.turns == 1
+            warming = target.state == "warming"
+        if warming:
+            target.done.wait(wait)
+        with self._lock:
+            target.last_invoked = target.last_active = time.time()
+            warmth = "warm" if target.state == "warm" else "cold"
+            # The turn itself starts the session; keep-alive takes over from here
+            target.state = "warm"
+        self._ensure_keepalive()
+        return warmth if first_turn else None
+
+    def forget(self, caller):
+        """Stop warming and pinging the sessions used with a credentials fingerprint.
+
+        Call when those credentials are reconfigured, together with
+        invalidate_client_pool, so no ping goes out with the old clients.
+        """
+        with self._lock:
+            for key in [key for key, target in self._targets.items() if target.caller == caller]:
+                target = self._targets.pop(key)
+                # Keep-alive skips it even if it was already picked for a ping
+                target.state = "failed"
+                target.done.set()
+
+    def stats(self):
+        """Return tracked sessions per state and skipped pings."""
+        with self._lock:
+            states = [target.state for target in self._targets.values()]
+            return {
+                "sessions": len(states),
+                "warming": states.count("warming"),
+                "warm": states.count("warm"),
+                "failed": states.count("failed"),
+                "skipped": self.skipped,
+            }
+
+    def _track(self, key, target):
+        self._targets[key] = target
+        while len(self._targets) > self.max_sessions:
+            self._targets.popitem(last=False)
+        return target
+
+    def _ping(self, target, kind):
+        """Send the warm-up payload on a session and read the reply to the end.
+
+        The ping waits for an admission slot like a user turn and gives it
+        back once the reply has been read.
+        """
+        started = time.perf_counter()
+        labels = {"kind": kind, "agent_arn": target.agent_arn}
+        lease = None
+        if AGENT_ADMISSION_ENABLED:
+            lease = AdmissionLease(
+                get_agent_limiter(target.account_id, target.agent_arn),
+                target.session_id,
+                should_abort=lambda: target.state == "failed"
+            )
+        throttled = False
+        try:
+            if lease is not None:
+                lease.acquire()
+            if target.client is None:
+                target.client = target.credentials.client('bedrock-agentcore', target.region_name)
+            labels["region"] = client_region(target.client)
+            response = target.client.invoke_agent_runtime(
+                agentRuntimeArn=target.agent_arn,
+                runtimeSessionId=target.session_id,
+                payload=self.payload,
+                qualifier="DEFAULT"
+            )
+            body = response['response']
+            try:
+                while body.read(65536):
+                    pass
+            finally:
+                body.close()
+        except Exception as e:
+            throttled = is_throttling_error(e)
+            metrics.increment("agent_warmup_errors", **labels)
+            state = "failed"
+        else:
+            metrics.observe("agent_warmup_seconds", time.perf_counter() - started, **labels)
+            state = "warm"
+        finally:
+            if lease is not None:
+                lease.release(throttled=throttled, succeeded=not throttled and state == "warm")
+        with self._lock:
+            target.last_invoked = time.time()
+            if target.state == "warming" or state == "warm":
+                target.state = state
+        target.done.set()
+
+    def _ensure_keepalive(self):
+        if not self.keepalive_enabled:
+            return
+        with self._lock:
+            if self._keepalive_thread is not None:
+                return
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop,
+                name="agent-keepalive",
+                daemon=True
+            )
+        self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while True:
+            time.sleep(min(self.keepalive_interval / 4, 30.0))
+            now = time.time()
+            with self._lock:
+                due = [
+                    target for target in self._targets.values()
+                    if target.state == "warm"
+                    and now - target.last_active <= self.keepalive_idle
+                    and now - target.last_invoked >= self.keepalive_interval
+                ]
+            for target in due:
+                if not self.rate_limiter.try_acquire():
+                    with self._lock:
+                        self.skipped += len(due) - due.index(target)
+                    break
+                target.last_invoked = now
+                self._executor.submit(self._ping, target, "keepalive")
+
+
+_warmer = AgentWarmer()
+metrics.register_gauges("agent_warmup", _warmer.stats)
+
+
+def get_agent_warmer():
+    """Return the process-wide agent warmer."""
+    return _warmer
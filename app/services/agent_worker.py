@@ -0,0 +1,257 @@
+"""Background agent invocations drained by the Streamlit script thread."""
+
+import queue
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from app.config.settings import AGENT_ADMISSION_ENABLED, AGENT_WORKER_POOL_SIZE
+from app.core.metrics import metrics
+from app.services.admission import AdmissionLease, get_agent_limiter
+from app.services.agent_warmup import get_agent_warmer
+from app.services.streaming import stream_agent_response
+
+# Marks the end of an invocation's chunk queue
+_DONE = object()
+
+
+class AgentInvocation:
+    """One agent call running on a worker thread.
+
+    The worker pushes text chunks onto a queue that the UI drains. Text the UI
+    has drained is kept on the invocation, so a rerun can repaint it and carry
+    on draining where the previous run stopped.
+    """
+
+    def __init__(self, agent_arn, session_id, prompt, region_name, account_id="", context=None, caller=None):
+        self.id = uuid.uuid4().hex
+        self.agent_arn = agent_arn
+        self.session_id = session_id
+        self.prompt = prompt
+        self.context = context
+        self.caller = caller
+        self.region_name = region_name
+        self.account_id = account_id
+        self.stats = {}
+        # 1-based position while waiting for an admission slot, else None
+        self.queue_position = None
+        self.error = None
+        # Raw reply bytes, kept so a failed parse can be redone without re-invoking
+        self.raw_body = bytearray()
+        self.content_type = ""
+        self.queue = queue.Queue()
+        self._parts = []
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._drained = threading.Event()
+        self._body = None
+        self._lock = threading.Lock()
+
+    @property
+    def text(self):
+        """Return the text drained so far."""
+        return "".join(self._parts)
+
+    def memory_bytes(self):
+        """Approximate bytes held by the drained text and raw reply."""
+        return sum(sys.getsizeof(part) for part in list(self._parts)) + len(self.raw_body)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self):
+        """Whether the worker has stopped producing chunks."""
+        return self._finished.is_set()
+
+    @property
+    def drained(self):
+        """Whether every chunk the worker produced has been drained."""
+        return self._drained.is_set()
+
+    def cancel(self):
+        """Stop the invocation and close its response stream."""
+        self._cancelled.set()
+        with self._lock:
+            body = self._body
+        if body is not None:
+            try:
+                body.close()
+            except Exception:
+                pass
+
+    def iter_chunks(self, poll_interval=0.1, on_idle=None):
+        """Yield chunks as the worker produces them until it finishes or is cancelled.
+
+        on_idle, if given, is called on the draining thread every poll_interval
+        without a chunk, e.g. to show the queue position or to let Streamlit
+        handle a Stop click. Cancellation is checked again after it returns.
+        """
+        while True:
+            try:
+                chunk = self.queue.get(timeout=poll_interval)
+            except queue.Empty:
+                if on_idle is not None and not self.cancelled:
+                    on_idle()
+                if self.cancelled:
+                    return
+                continue
+            if chunk is _DONE:
+                self._drained.set()
+                return
+            self._parts.append(chunk)
+            yield chunk
+
+    def drain_ready(self):
+        """Return the chunks produced so far without waiting, e.g. to drain several invocations in turn."""
+        chunks = []
+        while True:
+            try:
+                chunk = self.queue.get_nowait()
+            except queue.Empty:
+                return chunks
+            if chunk is _DONE:
+                self._drained.set()
+                return chunks
+            self._parts.append(chunk)
+            chunks.append(chunk)
+
+    def run(self, client):
+        """Worker body: invoke the agent and feed the chunk queue."""
+        lease = None
+        if AGENT_ADMISSION_ENABLED:
+            lease = AdmissionLease(
+                get_agent_limiter(self.account_id, self.agent_arn),
+                self.session_id,
+                on_position=self._set_queue_position,
+                should_abort=lambda: self.cancelled
+            )
+        started = time.perf_counter()
+        try:
+            if self.cancelled:
+                return
+            warmth = get_agent_warmer().begin_turn(
+                client, self.agent_arn, self.session_id, self.region_name,
+                account_id=self.account_id, caller=self.caller
+            )
+            for chunk in stream_agent_response(
+                self.agent_arn,
+                self.session_id,
+                self.prompt,
+                self.region_name,
+                stats=self.stats,
+                client=client,
+                on_response=self._set_response,
+                raw_body=self.raw_body,
+                lease=lease,
+                context=self.context,
+                caller=self.caller
+            ):
+                if self.cancelled:
+                    break
+                self.queue.put(chunk)
+            if warmth and not self.cancelled and "first_token_seconds" in self.stats:
+                # Includes any wait for the session's warm-up to finish
+                first_token = self.stats["started"] + self.stats["first_token_seconds"] - started
+                metrics.observe("agent_first_turn_seconds", first_token, agent_arn=self.agent_arn, session=warmth)
+        except Exception as e:
+            # Closing the body on cancel makes the read fail; that is not an error
+            if not self.cancelled:
+                self.error = e
+        finally:
+            if self.cancelled:
+                # Release the connection instead of reading the rest of the reply
+                self.cancel()
+            self._finished.set()
+            self.queue.put(_DONE)
+
+    def _set_queue_position(self, position):
+        self.queue_position = position
+
+    def _set_response(self, response):
+        self.content_type = response.get('contentType', '')
+        with self._lock:
+            self._body = response['response']
+        # Cancelled while the invoke call was still in flight
+        if self.cancelled:
+            self.cancel()
+
+
+class AgentWorkerPool:
+    """Process-wide thread pool running agent invocations for all sessions."""
+
+    def __init__(self, max_workers=AGENT_WORKER_POOL_SIZE):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-worker")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._busy_seconds = 0.0
+        self._started_at = time.perf_counter()
+
+    def submit(self, invocation, client):
+        """Queue an invocation to run on the pool."""
+        with self._lock:
+            self._queued += 1
+        self._executor.submit(self._run, invocation, client)
+        return invocation
+
+    def stats(self):
+        """Return pool size, active/queued workers and utilization since start."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._started_at
+            return {
+                "pool_size": self.max_workers,
+                "active": self._active,
+                "queued": self._queued,
+                "completed": self._completed,
+                "utilization": self._active / self.max_workers,
+                "average_utilization": self._busy_seconds / (elapsed * self.max_workers) if elapsed else 0.0,
+            }
+
+    def _run(self, invocation, client):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        started = time.perf_counter()
+        try:
+            invocation.run(client)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._busy_seconds += time.perf_counter() - started
+
+
+# Process-wide pool shared across Streamlit sessions
+_worker_pool = AgentWorkerPool()
+metrics.register_gauges("agent_worker", _worker_pool.stats)
+
+
+def start_agent_invocation(client, agent_arn, session_id, prompt, region_name, account_id="", context=None,
+                           caller=None):
+    """Start an agent invocation on the shared worker pool.
+
+    Args:
+        client: bedrock-agentcore client, created on the script thread
+        agent_arn: Agent runtime ARN
+        session_id: Runtime session id
+        prompt: User prompt
+        region_name: AWS region
+        account_id: AWS account id, for per-account admission control
+        context: Optional earlier prompts of the conversation, for the response cache
+        caller: Optional credentials fingerprint the response cache is scoped to
+
+    Returns:
+        AgentInvocation to drain from the UI
+    """
+    invocation = AgentInvocation(agent_arn, session_id, prompt, region_name, account_id, context, caller)
+    return _worker_pool.submit(invocation, client)
+
+
+def agent_worker_stats():
+    """Return utilization and queue depth of the shared agent worker pool."""
+    return _worker_pool.stats()
@@ -0,0 +1,200 @@
+"""Headless batch invocation of agents over a JSONL prompt set."""
+
+import hashlib
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.config.settings import (
+    AWS_MAX_POOL_CONNECTIONS,
+    AWS_TCP_KEEPALIVE,
+    BATCH_CONCURRENCY,
+    BATCH_RATE_LIMIT_PER_SECOND,
+)
+from app.core.aws_client import ClientPool, region_from_arn
+from app.core.rate_limiter import RateLimiter
+from app.services.streaming import stream_agent_response
+
+
+def load_prompts(path):
+    """Read prompts from a JSONL file.
+
+    Each line is an object with a "prompt" and optionally an "id", an
+    "agent_arn" and a "session" name. Lines sharing a session run in order in
+    one runtime session; every other line gets a session of its own. Lines
+    without an id are identified by their line number.
+    """
+    prompts = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"prompt": record}
+            if not record.get("prompt"):
+                raise ValueError(f"{path}:{line_number}: missing prompt")
+            record["id"] = str(record.get("id", line_number))
+            prompts.append(record)
+    return prompts
+
+
+def load_completed(path, include_failed=False):
+    """Return ids already written to an output JSONL file, for resuming a run."""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A run killed mid-write leaves a partial last line
+                continue
+            if include_failed or not record.get("error"):
+                completed.add(str(record["id"]))
+    return completed
+
+
+def runtime_session_id(namespace, session):
+    """Deterministic runtime session id, so a resumed run continues the same sessions."""
+    return hashlib.sha256(f"{namespace}\0{session}".encode("utf-8")).hexdigest()[:40]
+
+
+class BatchRunner:
+    """Runs prompts against agent runtimes with bounded concurrency and rate limiting.
+
+    Sessions run in parallel on up to concurrency threads; prompts of one
+    session run sequentially. Results are appended to the output file as
+    each call finishes, so an interrupted run can be resumed.
+    """
+
+    def __init__(self, credentials, region_name, agent_arn="", concurrency=BATCH_CONCURRENCY,
+                 rate_per_second=BATCH_RATE_LIMIT_PER_SECOND, client=None):
+        self.credentials = credentials
+        self.region_name = region_name
+        self.agent_arn = agent_arn
+        self.concurrency = max(concurrency, 1)
+        self.rate_limiter = RateLimiter(rate_per_second, burst=self.concurrency)
+        self.client = client
+        # A pool of its own, with a client per region and a connection per worker thread
+        self._client_pool = ClientPool(
+            max_size=16,
+            max_pool_connections=max(self.concurrency, AWS_MAX_POOL_CONNECTIONS),
+            tcp_keepalive=AWS_TCP_KEEPALIVE
+        )
+        self._write_lock = threading.Lock()
+
+    def _get_client(self, region_name):
+        if self.client is not None:
+            return self.client
+        return self.credentials.client('bedrock-agentcore', region_name, pool=self._client_pool)
+
+    def run(self, prompts, output_path, retry_failed=False, on_result=None):
+        """Run every prompt not yet completed in output_path.
+
+        Args:
+            prompts: Prompt records from load_prompts
+            output_path: JSONL file results are appended to
+            retry_failed: Also re-run prompts whose earlier result was an error
+            on_result: Optional callback receiving each result record
+
+        Returns:
+            Summary dict with counts, throughput and latency percentiles
+        """
+        completed = load_completed(output_path, include_failed=not retry_failed)
+        pending = [prompt for prompt in prompts if prompt["id"] not in completed]
+
+        namespace = os.path.abspath(output_path)
+        sessions = {}
+        for prompt in pending:
+            session = prompt.get("session") or f"prompt:{prompt['id']}"
+            sessions.setdefault(session, []).append(prompt)
+
+        results = []
+        started = time.perf_counter()
+        with open(output_path, "a", encoding="utf-8") as output, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as executor:
+            futures = [
+                executor.submit(
+                    self._run_session, runtime_session_id(namespace, session), items, output, on_result
+                )
+                for session, items in sessions.items()
+            ]
+            for future in as_completed(futures):
+                results.extend(future.result())
+        elapsed = time.perf_counter() - started
+
+        latencies = [r["total_seconds"] for r in results if not r["error"]]
+        return {
+            "prompts": len(prompts),
+            "skipped": len(prompts) - len(pending),
+            "completed": len(latencies),
+            "failed": len(results) - len(latencies),
+            "elapsed_seconds": elapsed,
+            "calls_per_second": len(results) / elapsed if elapsed else 0.0,
+            "p50_seconds": statistics.median(latencies) if latencies else 0.0,
+            "p95_seconds": _percentile(latencies, 0.95),
+        }
+
+    def _run_session(self, session_id, items, output, on_result=None):
+        records = []
+        for index, item in enumerate(items):
+            context = [earlier["prompt"] for earlier in items[:index]]
+            record = self._invoke(session_id, item, context)
+            line = json.dumps(record, ensure_ascii=False)
+            with self._write_lock:
+                output.write(line + "\n")
+                output.flush()
+                if on_result is not None:
+                    on_result(record)
+            records.append(record)
+        return records
+
+    def _invoke(self, session_id, item, context=None):
+        agent_arn = item.get("agent_arn") or self.agent_arn
+        # Each line's agent is called in its own region, like agents picked in the UI
+        region_name = region_from_arn(agent_arn, self.region_name)
+        self.rate_limiter.acquire()
+        started = time.perf_counter()
+        stats = {}
+        record = {
+            "id": item["id"],
+            "agent_arn": agent_arn,
+            "session_id": session_id,
+            "prompt": item["prompt"],
+            "response": "",
+            "error": None,
+            "started_at": time.time(),
+        }
+        try:
+            if not agent_arn:
+                raise ValueError("No agent ARN given for this prompt")
+            record["response"] = "".join(stream_agent_response(
+                agent_arn,
+                session_id,
+                item["prompt"],
+                region_name,
+                stats=stats,
+                client=self._get_client(region_name),
+                context=context,
+                caller=self.credentials.fingerprint if self.credentials else None
+            ))
+        except Exception as e:
+            record["error"] = str(e)
+        for stat in ("invoke_seconds", "first_byte_seconds", "first_token_seconds", "total_seconds"):
+            record[stat] = stats.get(stat)
+        if record["total_seconds"] is None:
+            record["total_seconds"] = time.perf_counter() - started
+        return record
+
+
+def _percentile(values, q):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
@@ -0,0 +1,372 @@
+"""Response cache and record/replay cassettes for agent invocations.
+
+An opt-in layer in front of invoke_agent_runtime. Turns are identified by a
+content address: the agent ARN, qualifier, whitespace-normalized prompt and,
+optionally, the conversation's earlier prompts. In "cache" mode a repeated
+turn from the same caller is answered from a TTL- and size-bounded disk cache. In "record" mode
+every reply is saved with the arrival time of its bytes, and in "replay" mode
+the saved replies are streamed back at recorded or accelerated speed without
+calling AWS, for load tests and UI development.
+
+Stored replies are the raw response bodies, so they go through the same
+parsers as live replies.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from app.config.settings import (
+    AGENT_CASSETTE_DIR,
+    AGENT_REPLAY_SPEED,
+    AGENT_RESPONSE_CACHE_DIR,
+    AGENT_RESPONSE_CACHE_MAX_BYTES,
+    AGENT_RESPONSE_CACHE_TTL_SECONDS,
+    AGENT_RESPONSE_KEY_CONVERSATION,
+    AGENT_RESPONSE_MODE,
+)
+from app.core.metrics import metrics
+from app.core.storage import ensure_private_dir
+
+RESPONSE_MODES = ("live", "cache", "record", "replay")
+
+# Reads arriving within this many seconds of a stored chunk are merged into it
+_CHUNK_MERGE_SECONDS = 0.005
+
+
+class CassetteMiss(LookupError):
+    """Replay mode found no recorded reply for a turn."""
+
+
+def normalize_prompt(prompt):
+    """Collapse runs of whitespace, so trivially reformatted prompts share a key."""
+    return " ".join(prompt.split())
+
+
+def response_key(agent_arn, prompt, context=None, qualifier="DEFAULT", caller=None):
+    """Return the content address of a turn.
+
+    Args:
+        agent_arn: Agent runtime ARN
+        prompt: User prompt
+        context: Optional earlier prompts of the conversation, oldest first
+        qualifier: Agent runtime qualifier
+        caller: Optional identity the turn is scoped to, e.g. a credentials fingerprint
+    """
+    material = {
+        "agent_arn": agent_arn,
+        "qualifier": qualifier,
+        "prompt": normalize_prompt(prompt),
+        "context": [normalize_prompt(text) for text in context] if context is not None else None,
+    }
+    if caller is not None:
+        material["caller"] = caller
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class Recording:
+    """A reply body as (seconds after the invoke started, bytes) chunks."""
+
+    def __init__(self, content_type, chunks):
+        self.content_type = content_type
+        self.chunks = chunks
+
+    @property
+    def size(self):
+        return sum(len(data) for _offset, data in self.chunks)
+
+    @property
+    def duration(self):
+        return self.chunks[-1][0] if self.chunks else 0.0
+
+    def to_dict(self):
+        return {
+            "content_type": self.content_type,
+            "chunks": [[round(offset, 4), base64.b64encode(data).decode("ascii")] for offset, data in self.chunks],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["content_type"], [(offset, base64.b64decode(chunk)) for offset, chunk in data["chunks"]])
+
+    def response(self, speed=0.0):
+        """Return an invoke_agent_runtime-style response that streams this recording."""
+        return {"response": ReplayBody(self.chunks, speed), "contentType": self.content_type, "replayed": True}
+
+
+class ReplayBody:
+    """Streaming body over recorded chunks, released at their recorded offsets divided by speed.
+
+    A speed of 0 or less releases every chunk at once. Closing the body, e.g.
+    on cancel, ends the stream.
+    """
+
+    def __init__(self, chunks, speed=0.0):
+        self._chunks = chunks
+        self._speed = speed
+        self._index = 0
+        self._buffer = b""
+        self._position = 0
+        self._closed = threading.Event()
+        self._started = time.perf_counter()
+
+    def read(self, amt=None):
+        if amt is None:
+            parts = []
+            while True:
+                part = self.read(65536)
+                if not part:
+                    return b"".join(parts)
+                parts.append(part)
+        if self._position >= len(self._buffer) and not self._next_chunk():
+            return b""
+        part = self._buffer[self._position:self._position + amt]
+        self._position += len(part)
+        return part
+
+    def close(self):
+        self._closed.set()
+
+    def _next_chunk(self):
+        """Wait until the next chunk is due and make it the buffer; False at the end or once closed."""
+        if self._closed.is_set() or self._index >= len(self._chunks):
+            return False
+        offset, data = self._chunks[self._index]
+        self._index += 1
+        if self._speed > 0:
+            delay = self._started + offset / self._speed - time.perf_counter()
+            if delay > 0 and self._closed.wait(delay):
+                return False
+        self._buffer, self._position = data, 0
+        return True
+
+
+class RecordingBody:
+    """Streaming body wrapper that notes when each read's bytes arrived."""
+
+    def __init__(self, body, started):
+        self._body = body
+        self._started = started
+        self.chunks = []
+
+    def read(self, *args, **kwargs):
+        data = self._body.read(*args, **kwargs)
+        if data:
+            offset = time.perf_counter() - self._started
+            if self.chunks and offset - self.chunks[-1][0] < _CHUNK_MERGE_SECONDS:
+                self.chunks[-1][1].extend(data)
+            else:
+                self.chunks.append((offset, bytearray(data)))
+        return data
+
+    def close(self):
+        self._body.close()
+
+    def recording(self, content_type):
+        return Recording(content_type, [(offset, bytes(data)) for offset, data in self.chunks])
+
+
+class ResponseStore:
+    """Directory of recorded replies, one JSON file per turn key.
+
+    With a TTL, entries older than it are ignored and removed; with a byte
+    budget, least recently read entries are removed once it is exceeded.
+    """
+
+    def __init__(self, directory, max_bytes=None, ttl_seconds=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # Bytes on disk, scanned on the first write to a budgeted store
+        self._bytes = None
+
+    def get(self, key):
+        """Return the Recording stored under key, or None if missing or expired."""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl_seconds and time.time() - stat.st_mtime > self.ttl_seconds:
+                self._remove(path, stat.st_size)
+                return None
+            with open(path, encoding="utf-8") as f:
+                recording = Recording.from_dict(json.load(f))
+            if self.max_bytes:
+                # The access time orders eviction; the modification time keeps the TTL
+                os.utime(path, (time.time(), stat.st_mtime))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return recording
+
+    def put(self, key, recording, **meta):
+        """Store a recording under key, with optional metadata saved alongside it."""
+        # Replies may hold data only their caller is allowed to see
+        ensure_private_dir(self.directory)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**meta, "recorded_at": time.time(), **recording.to_dict()}, f)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        os.replace(tmp_path, path)
+        if self.max_bytes:
+            with self._lock:
+                if self._bytes is None:
+                    self._bytes = sum(size for _path, size, _atime in self._scan())
+                else:
+                    self._bytes += os.path.getsize(path) - previous
+                if self._bytes > self.max_bytes:
+                    self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _scan(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_atime))
+        return entries
+
+    def _evict(self):
+        """Remove least recently read entries until the store fits its budget."""
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        self._bytes = sum(size for _path, size, _atime in entries)
+        for path, size, _atime in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._bytes -= size
+
+    def _remove(self, path, size):
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes -= size
+
+
+class ResponseLayer:
+    """Decides per turn whether to invoke the agent, answer from the cache, record or replay."""
+
+    def __init__(self, mode=AGENT_RESPONSE_MODE, cache=None, cassette=None, replay_speed=AGENT_REPLAY_SPEED,
+                 key_conversation=AGENT_RESPONSE_KEY_CONVERSATION):
+        if mode not in RESPONSE_MODES:
+            raise ValueError(f"Unknown agent response mode {mode!r}, expected one of {', '.join(RESPONSE_MODES)}")
+        self.mode = mode
+        self.cache = cache or ResponseStore(
+            AGENT_RESPONSE_CACHE_DIR,
+            max_bytes=AGENT_RESPONSE_CACHE_MAX_BYTES,
+            ttl_seconds=AGENT_RESPONSE_CACHE_TTL_SECONDS
+        )
+        self.cassette = cassette or ResponseStore(AGENT_CASSETTE_DIR)
+        self.replay_speed = replay_speed
+        self.key_conversation = key_conversation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+
+    @property
+    def enabled(self):
+        return self.mode != "live"
+
+    def key(self, agent_arn, prompt, context=None, caller=None):
+        """Return the turn's key, or None when the layer is off.
+
+        Cached replies are only served to the caller they were fetched for, so
+        in "cache" mode a turn without a caller is not cached. Cassettes are
+        recorded to be replayed without AWS and are not keyed on the caller.
+        """
+        if not self.enabled or (self.mode == "cache" and not caller):
+            return None
+        return response_key(
+            agent_arn,
+            prompt,
+            context if self.key_conversation else None,
+            caller=caller if self.mode == "cache" else None
+        )
+
+    def lookup(self, key):
+        """Return a stored reply as an invoke response, or None to invoke the agent.
+
+        Raises:
+            CassetteMiss: In replay mode, when the cassette has no reply for the turn
+        """
+        if self.mode == "cache":
+            recording, speed = self.cache.get(key), 0.0
+        elif self.mode == "replay":
+            recording, speed = self.cassette.get(key), self.replay_speed
+        else:
+            return None
+        with self._lock:
+            if recording is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.increment("agent_response_lookups", mode=self.mode, result="miss" if recording is None else "hit")
+        if recording is None:
+            if self.mode == "replay":
+                raise CassetteMiss(f"No recorded reply for this prompt in cassette {self.cassette.directory}")
+            return None
+        return recording.response(speed)
+
+    def watch(self, response, started):
+        """Wrap a live response body so its reply can be stored once read; returns the recorder or None."""
+        if self.mode not in ("cache", "record"):
+            return None
+        recorder = RecordingBody(response['response'], started)
+        response['response'] = recorder
+        return recorder
+
+    def save(self, key, recorder, content_type, **meta):
+        """Store a fully read reply in the cache or the cassette."""
+        store = self.cassette if self.mode == "record" else self.cache
+        store.put(key, recorder.recording(content_type), **meta)
+        with self._lock:
+            self.saved += 1
+
+    def stats(self):
+        """Return the mode and lookup/save counters."""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "hits": self.hits,
+                "misses": self.misses,
+                "saved": self.saved,
+            }
+
+
+# Process-wide layer shared across Streamlit sessions
+_response_layer = ResponseLayer()
+metrics.register_gauges("agent_responses", lambda: _response_layer.stats())
+
+
+def get_response_layer():
+    """Return the process-wide response layer."""
+    return _response_layer
+
+
+def set_response_layer(layer):
+    """Use another response layer for all sessions, e.g. to switch modes in a benchmark."""
+    global _response_layer
+    _response_layer = layer
@@ -0,0 +1,316 @@
+"""Process-wide S3 object cache for proxied downloads."""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.core.metrics import client_region, metrics
+from app.core.storage import ensure_private_dir
+from app.config.settings import (
+    S3_CACHE_MAX_BYTES,
+    S3_CACHE_SPILL_BYTES,
+    S3_DISK_CACHE_DIR,
+    S3_DISK_CACHE_MAX_BYTES,
+    S3_DOWNLOAD_CHUNK_BYTES,
+    S3_RANGED_GET_CONCURRENCY,
+    S3_RANGED_GET_PART_BYTES,
+)
+
+
+def object_digest(bucket, key):
+    """Return a stable cache key for an S3 object."""
+    return hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()
+
+
+def _is_not_modified(error):
+    """Check whether a get_object error is a 304 answer to If-None-Match."""
+    response = getattr(error, "response", None) or {}
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    code = response.get("Error", {}).get("Code")
+    return status == 304 or code in ("304", "NotModified")
+
+
+def _is_invalid_range(error):
+    """Check whether a get_object error rejected the requested byte range."""
+    response = getattr(error, "response", None) or {}
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    code = response.get("Error", {}).get("Code")
+    return status == 416 or code == "InvalidRange"
+
+
+def _object_size(response):
+    """Return the full object size from a (possibly ranged) get_object response."""
+    content_range = response.get("ContentRange", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    return response.get("ContentLength", 0)
+
+
+def _copy_body(body, f, chunk_bytes=S3_DOWNLOAD_CHUNK_BYTES):
+    """Stream an object body into an open file without holding it in memory."""
+    while True:
+        chunk = body.read(chunk_bytes)
+        if not chunk:
+            break
+        f.write(chunk)
+
+
+class CachedObject:
+    """A cached S3 object held either in memory or in the disk cache."""
+
+    def __init__(self, etag, size, data=None, path=None):
+        self.etag = etag
+        self.size = size
+        self.data = data
+        self.path = path
+
+    def read(self):
+        """Return the object bytes.
+
+        Raises:
+            FileNotFoundError: If the object was evicted from the disk cache
+        """
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def is_available(self):
+        """Check whether the object's bytes are still held, in memory or on disk."""
+        return self.data is not None or os.path.exists(self.path)
+
+
+class S3ObjectCache:
+    """Byte-budgeted LRU of S3 objects shared by all Streamlit sessions.
+
+    Small objects are kept in memory, large ones are spilled to a disk cache
+    directory that survives restarts. Objects larger than one ranged-GET part
+    are streamed to disk with parallel ranged requests and never buffered whole.
+    Cached objects are revalidated with If-None-Match, so S3 still authorizes
+    every caller and unchanged objects are not downloaded again.
+    """
+
+    def __init__(self, max_bytes=S3_CACHE_MAX_BYTES, spill_bytes=S3_CACHE_SPILL_BYTES,
+                 cache_dir=S3_DISK_CACHE_DIR, max_disk_bytes=S3_DISK_CACHE_MAX_BYTES,
+                 part_bytes=S3_RANGED_GET_PART_BYTES, range_concurrency=S3_RANGED_GET_CONCURRENCY):
+        self.max_bytes = max_bytes
+        self.spill_bytes = spill_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.part_bytes = part_bytes
+        self.range_concurrency = range_concurrency
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._cache_dir_ready = False
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def fetch(self, s3_client, bucket, key):
+        """Return a CachedObject, downloading it only if missing or changed in S3."""
+        digest = object_digest(bucket, key)
+        entry = self._lookup(digest)
+
+        # The first request doubles as the first part of a ranged download
+        request = {"Bucket": bucket, "Key": key, "Range": f"bytes=0-{self.part_bytes - 1}"}
+        if entry is not None:
+            request["IfNoneMatch"] = entry.etag
+        try:
+            with metrics.timer("s3_get_object_seconds", region=client_region(s3_client)):
+                response = s3_client.get_object(**request)
+        except Exception as e:
+            if entry is not None and _is_not_modified(e):
+                with self._lock:
+                    self.revalidated += 1
+                return entry
+            if not _is_invalid_range(e):
+                raise
+            # Empty objects reject every byte range
+            response = s3_client.get_object(Bucket=bucket, Key=key)
+
+        with self._lock:
+            self.misses += 1
+        etag = response.get("ETag", "")
+        size = _object_size(response)
+        if size <= self.part_bytes:
+            return self._store(digest, etag, response["Body"].read())
+        return self._store_large(s3_client, bucket, key, digest, etag, size, response["Body"])
+
+    def get_cached(self, bucket, key):
+        """Return the cached object without contacting S3, or None."""
+        entry = self._lookup(object_digest(bucket, key))
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+        return entry
+
+    def stats(self):
+        """Return cache sizes and hit/revalidation/miss counters."""
+        with self._lock:
+            return {
+                "objects": len(self._entries),
+                "memory_bytes": self.memory_bytes,
+                "disk_bytes": self.disk_bytes,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+            }
+
+    def _lookup(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                if entry.is_available():
+                    self._entries.move_to_end(digest)
+                    return entry
+                # The disk file was removed behind the cache, e.g. by another process
+                del self._entries[digest]
+                self._forget(entry)
+
+        # Objects spilled to disk by an earlier process
+        entry = self._load_from_disk(digest)
+        if entry is not None:
+            with self._lock:
+                if digest not in self._entries:
+                    self._entries[digest] = entry
+                    self.disk_bytes += entry.size
+                    self._evict()
+        return entry
+
+    def _store(self, digest, etag, data):
+        if len(data) > self.spill_bytes:
+            entry = self._write_to_disk(digest, etag, data)
+        else:
+            entry = CachedObject(etag, len(data), data=data)
+        return self._register(digest, entry)
+
+    def _store_large(self, s3_client, bucket, key, digest, etag, size, first_part):
+        """Stream a large object to the disk cache with parallel ranged GETs."""
+        path = self._disk_path(digest)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+                _copy_body(first_part, f)
+
+            ranges = [
+                (start, min(start + self.part_bytes, size) - 1)
+                for start in range(self.part_bytes, size, self.part_bytes)
+            ]
+            with ThreadPoolExecutor(max_workers=self.range_concurrency) as executor:
+                futures = [
+                    executor.submit(self._fetch_range, s3_client, bucket, key, etag, start, end, tmp_path)
+                    for start, end in ranges
+                ]
+                for future in futures:
+                    future.result()
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._write_metadata(path, etag, size)
+        return self._register(digest, CachedObject(etag, size, path=path))
+
+    @staticmethod
+    def _fetch_range(s3_client, bucket, key, etag, start, end, path):
+        """Download one byte range of an object into its place in the file."""
+        # IfMatch keeps every part on the same version of the object
+        with metrics.timer("s3_get_object_seconds", region=client_region(s3_client)):
+            response = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag)
+        with open(path, "r+b") as f:
+            f.seek(start)
+            _copy_body(response["Body"], f)
+
+    def _register(self, digest, entry):
+        with self._lock:
+            previous = self._entries.pop(digest, None)
+            if previous is not None:
+                self._forget(previous)
+            self._entries[digest] = entry
+            if entry.path:
+                self.disk_bytes += entry.size
+            else:
+                self.memory_bytes += entry.size
+            self._evict()
+        return entry
+
+    def _evict(self):
+        """Drop least recently used entries until both budgets are met."""
+        for digest in list(self._entries):
+            if self.memory_bytes <= self.max_bytes and self.disk_bytes <= self.max_disk_bytes:
+                return
+            entry = self._entries[digest]
+            if (entry.path and self.disk_bytes > self.max_disk_bytes) or \
+                    (not entry.path and self.memory_bytes > self.max_bytes):
+                del self._entries[digest]
+                self._forget(entry, remove_file=True)
+
+    def _forget(self, entry, remove_file=False):
+        if entry.path:
+            self.disk_bytes -= entry.size
+            if remove_file:
+                for path in (entry.path, entry.path + ".json"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        else:
+            self.memory_bytes -= entry.size
+
+    def _disk_path(self, digest):
+        if not self._cache_dir_ready:
+            # Cached objects may be private to the callers that fetched them
+            ensure_private_dir(self.cache_dir)
+            self._cache_dir_ready = True
+        return os.path.join(self.cache_dir, digest)
+
+    def _write_to_disk(self, digest, etag, data):
+        path = self._disk_path(digest)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._write_metadata(path, etag, len(data))
+        return CachedObject(etag, len(data), path=path)
+
+    @staticmethod
+    def _write_metadata(path, etag, size):
+        with open(path + ".json", "w") as f:
+            json.dump({"etag": etag, "size": size}, f)
+
+    def _load_from_disk(self, digest):
+        try:
+            path = self._disk_path(digest)
+            with open(path + ".json") as f:
+                meta = json.load(f)
+            if os.path.getsize(path) != meta["size"]:
+                return None
+        except (OSError, ValueError, KeyError):
+            return None
+        return CachedObject(meta["etag"], meta["size"], path=path)
+
+
+# Process-wide cache shared across Streamlit sessions
+_object_cache = S3ObjectCache()
+metrics.register_gauges("s3_cache", lambda: _object_cache.stats())
+
+
+def get_object_cache():
+    """Return the process-wide S3 object cache."""
+    return _object_cache
+
+
+def set_object_cache(cache):
+    """Use another object cache for all sessions, e.g. one in a scratch directory for a benchmark."""
+    global _object_cache
+    _object_cache = cache
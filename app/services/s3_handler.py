@@ -1,121 +1,392 @@
 """S3 link detection and download handling."""
 
+import hashlib
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote, unquote
 import streamlit as st
-from app.core.aws_client import get_boto3_client
+from app.config.settings import (
+    MESSAGE_SEGMENT_CACHE_SIZE,
+    S3_CACHE_REVALIDATE_SECONDS,
+    S3_DOWNLOAD_MODE,
+    S3_PREFETCH_CONCURRENCY,
+    S3_PREFETCH_LINKS,
+    S3_PRESIGNED_URL_EXPIRY_SECONDS,
+)
+from app.core.aws_client import get_boto3_client, get_session_credentials
+from app.core.metrics import metrics
+from app.services.s3_cache import get_object_cache, object_digest
+
+# S3 object URLs: s3://bucket/key and virtual-hosted-style https URLs such as
+# https://bucket.s3.us-west-2.amazonaws.com/key
+_S3_URI = r"s3://[^\s/()\[\]<>`]+/[^\s()\[\]<>`]+"
+# One character class and no nested quantifier, so matching a host stays
+# linear however many hyphens or dots follow ".s3"
+_S3_HOST_SUFFIX = r"\.s3[a-z0-9.-]*\.amazonaws\.com(?:\.cn)?"
+_S3_VIRTUAL_HOST_URL = rf"https://[^\s/()\[\]<>`]+?{_S3_HOST_SUFFIX}/[^\s()\[\]<>`]+"
+
+# One pass over a message finds, in order: code (left alone), markdown links
+# to S3 objects, and bare S3 URLs outside a markdown link target
+LINK_TOKEN_PATTERN = re.compile(
+    rf"""
+    (?P<code>```.*?```|`[^`\n]+`)
+    | \[(?P<text>[^\]]+)\]\((?P<target>{_S3_URI}|{_S3_VIRTUAL_HOST_URL})\)
+    | (?<!\]\()(?P<bare>{_S3_URI}|{_S3_VIRTUAL_HOST_URL})
+    """,
+    re.VERBOSE | re.DOTALL | re.IGNORECASE
+)
+
+# Bucket and key of an S3 object URL; URLs with a query string (e.g. already
+# presigned) are left as they are
+S3_URL_PATTERN = re.compile(
+    r"s3://(?P<bucket>[^/]+)/(?P<key>.+)"
+    rf"|https://(?P<host_bucket>[^/]+?){_S3_HOST_SUFFIX}/(?P<host_key>[^?#]+)",
+    re.IGNORECASE
+)
+
+# Trailing punctuation that ends a sentence rather than a bare URL
+_BARE_URL_TRAILERS = ".,;:!?'\""
+
+# Makes the download buttons of S3 links look like links; injected once per page
+LINK_BUTTON_STYLESHEET = """
+<style>
+[class*="st-key-s3_dl_"] button {
+    background: transparent !important;
+    border: none !important;
+    color: #0066cc !important;
+    text-decoration: underline !important;
+    padding: 0 !important;
+    margin: 0 !important;
+    font-size: inherit !important;
+    font-family: inherit !important;
+    box-shadow: none !important;
+    cursor: pointer !important;
+    font-weight: normal !important;
+    text-align: left !important;
+    min-height: auto !important;
+    height: auto !important;
+    line-height: inherit !important;
+    display: inline !important;
+    width: auto !important;
+}
+[class*="st-key-s3_dl_"] button:hover {
+    color: #0052a3 !important;
+    background: transparent !important;
+}
+</style>
+"""
+
+# Process-wide cache of tokenized messages: (message_id, content_hash) -> segments
+_segment_cache = OrderedDict()
+_segment_cache_lock = threading.Lock()
+
+# Bounded pool shared by all sessions for concurrent S3 link prefetching
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=S3_PREFETCH_CONCURRENCY,
+    thread_name_prefix="s3-prefetch"
+)
 
 
 def parse_s3_url(url):
-    """Parse S3 URL to extract bucket and key.
+    """Parse an s3:// or virtual-hosted-style https S3 URL to extract bucket and key.
     
     Returns:
         Tuple: (bucket, key) or (None, None) if invalid
     """
-    s3_match = re.match(r's3://([^/]+)/(.+)', url)
-    if s3_match:
-        return s3_match.group(1), s3_match.group(2)
-    return None, None
+    match = S3_URL_PATTERN.fullmatch(url)
+    if match is None:
+        return None, None
+    if match.group("bucket"):
+        return match.group("bucket"), match.group("key")
+    # https keys are percent-encoded
+    return match.group("host_bucket"), unquote(match.group("host_key"))
+
+
+def tokenize_message(text):
+    """Split message text into text and S3 link segments in a single pass.
+    
+    Markdown links and bare URLs to S3 objects become links; code spans and
+    blocks are kept as text. Adjacent text is merged into one segment.
+    
+    Returns:
+        Tuple of segments: ("text", text) or ("s3", link_text, url, bucket, key)
+    """
+    segments = []
+    pending_text = []
+    last_end = 0
+    for match in LINK_TOKEN_PATTERN.finditer(text):
+        pending_text.append(text[last_end:match.start()])
+        last_end = match.end()
+        if match.group("code"):
+            pending_text.append(match.group("code"))
+            continue
+        
+        link_text, url = match.group("text"), match.group("target")
+        if url is None:
+            url = match.group("bare").rstrip(_BARE_URL_TRAILERS)
+            last_end = match.start() + len(url)
+            link_text = url
+        bucket, key = parse_s3_url(url)
+        if not (bucket and key):
+            pending_text.append(match.group(0)[:last_end - match.start()])
+            continue
+        
+        if any(pending_text):
+            segments.append(("text", "".join(pending_text)))
+        pending_text = []
+        segments.append(("s3", link_text, url, bucket, key))
+    pending_text.append(text[last_end:])
+    if any(pending_text):
+        segments.append(("text", "".join(pending_text)))
+    return tuple(segments)
+
+
+def get_message_segments(text, message_id=""):
+    """Return cached segments for a message, tokenizing it on first use."""
+    content_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    cache_key = (message_id, content_hash)
+    
+    with _segment_cache_lock:
+        segments = _segment_cache.get(cache_key)
+        if segments is not None:
+            _segment_cache.move_to_end(cache_key)
+            return segments
+    
+    segments = tokenize_message(text)
+    with _segment_cache_lock:
+        _segment_cache[cache_key] = segments
+        while len(_segment_cache) > MESSAGE_SEGMENT_CACHE_SIZE:
+            _segment_cache.popitem(last=False)
+    return segments
+
+
+def get_presigned_download_url(bucket, key, region, filename):
+    """Return a presigned GET URL that makes the browser download the object.
+    
+    URLs are reused within a session for half their lifetime so reruns keep
+    rendering the same link instead of re-signing it.
+    """
+    presigned_urls = st.session_state.setdefault("s3_presigned_urls", {})
+    cache_key = f"{region}/{bucket}/{key}"
+    now = time.time()
+    
+    cached = presigned_urls.get(cache_key)
+    if cached and cached[1] > now:
+        return cached[0]
+    
+    s3_client = get_boto3_client('s3', region)
+    url = s3_client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': bucket,
+            'Key': key,
+            'ResponseContentDisposition': f"attachment; filename*=UTF-8''{quote(filename)}"
+        },
+        ExpiresIn=S3_PRESIGNED_URL_EXPIRY_SECONDS
+    )
+    presigned_urls[cache_key] = (url, now + S3_PRESIGNED_URL_EXPIRY_SECONDS / 2)
+    return url
+
+
+def _render_presigned_links(segments, region):
+    """Render a message in one markdown call with S3 links as presigned URLs."""
+    parts = []
+    failures = []
+    for segment in segments:
+        if segment[0] == "text":
+            parts.append(segment[1])
+            continue
+        
+        _, link_text, url, bucket, key = segment
+        filename = key.split('/')[-1] or 'download'
+        try:
+            presigned_url = get_presigned_download_url(bucket, key, region, filename)
+            parts.append(f"[{link_text}]({presigned_url})")
+        except Exception as e:
+            # Signing failed, show original link
+            failures.append(f"{filename}: {str(e)}")
+            parts.append(f"[{link_text}]({url})")
+    
+    st.markdown("".join(parts), unsafe_allow_html=True)
+    if failures:
+        st.error("Error creating download links for " + "; ".join(failures))
+
+
+def render_link_styles():
+    """Inject the stylesheet of S3 link buttons; call once per page run.
+    
+    Style-only HTML goes to Streamlit's event container, so it takes no space.
+    """
+    st.html(LINK_BUTTON_STYLESHEET)
+
+
+def _fresh_cached_object(bucket, key, digest):
+    """Return the cached object if this session validated it recently, else None."""
+    downloads = st.session_state.setdefault("s3_downloads", {})
+    if time.time() - downloads.get(digest, 0.0) < S3_CACHE_REVALIDATE_SECONDS:
+        return get_object_cache().get_cached(bucket, key)
+    return None
+
+
+def _start_prefetch(segments, region):
+    """Fetch every S3 link of a message concurrently on the shared pool.
+    
+    Returns:
+        Dict: object digest -> future for links that need the network
+    """
+    object_cache = get_object_cache()
+    futures = {}
+    s3_client = None
+    for segment in segments:
+        if segment[0] != "s3":
+            continue
+        bucket, key = segment[3], segment[4]
+        digest = object_digest(bucket, key)
+        if digest in futures or _fresh_cached_object(bucket, key, digest) is not None:
+            continue
+        
+        if s3_client is None:
+            # Pooled clients are thread-safe and shared by all prefetch workers
+            s3_client = get_boto3_client('s3', region)
+        futures[digest] = _prefetch_executor.submit(object_cache.fetch, s3_client, bucket, key)
+    return futures
+
+
+def _deferred_object_data(bucket, key, region, cached_object=None):
+    """Return a callable that reads an S3 object when its download is clicked.
+    
+    Streamlit calls it only on click, so reruns render the button without
+    fetching the object or copying it into the session's media files. The
+    object comes from the shared cache while this session validated it
+    recently, and is fetched (or revalidated) otherwise. A prefetched object
+    evicted from the disk cache since the page rendered is fetched again.
+    """
+    # The callable runs outside the script thread, without session state
+    credentials = get_session_credentials()
+    downloads = st.session_state.setdefault("s3_downloads", {})
+    digest = object_digest(bucket, key)
+    
+    def read_object():
+        if cached_object is not None:
+            try:
+                return cached_object.read()
+            except FileNotFoundError:
+                pass
+        elif time.time() - downloads.get(digest, 0.0) < S3_CACHE_REVALIDATE_SECONDS:
+            fresh_object = get_object_cache().get_cached(bucket, key)
+            if fresh_object is not None:
+                try:
+                    return fresh_object.read()
+                except FileNotFoundError:
+                    pass
+        s3_client = credentials.client('s3', region)
+        fetched_object = get_object_cache().fetch(s3_client, bucket, key)
+        downloads[digest] = time.time()
+        return fetched_object.read()
+    
+    return read_object
 
 
-def render_message_with_s3_links(text, region, unique_id=""):
-    """Render message with S3 markdown links replaced by clickable download buttons.
+def _render_download_button(link_text, filename, download_key, bucket, key, region, cached_object=None):
+    """Render a download button styled as a link that fetches its object on click."""
+    st.download_button(
+        label=link_text,
+        data=_deferred_object_data(bucket, key, region, cached_object),
+        file_name=filename,
+        mime="application/octet-stream",
+        key=download_key,
+        use_container_width=False
+    )
+
+
+def _render_download_error(error, link_text, url, filename):
+    """Render a failed download, falling back to the original link."""
+    st.error(f"Error downloading {filename}: {str(error)}")
+    # Show original link text on error
+    st.markdown(f"[{link_text}]({url})", unsafe_allow_html=True)
+
+
+@metrics.timed("render_message_seconds")
+def render_message_with_s3_links(text, region, unique_id="", message_id=""):
+    """Render message with S3 links replaced by clickable download links.
+    
+    Markdown links and bare URLs to S3 objects (s3:// or virtual-hosted-style
+    https) are handled. The buttons of proxy mode are styled by the shared
+    stylesheet from render_link_styles().
     
     Args:
-        text: Message text with markdown links [text](s3://...)
+        text: Message text with S3 links
         region: AWS region
         unique_id: Unique identifier to make keys unique
+        message_id: Stable message id used to cache the tokenized message
     """
-    # Pattern to find markdown links: [text](s3://...)
-    markdown_pattern = r'\[([^\]]+)\]\((s3://[^\)]+)\)'
+    segments = get_message_segments(text, message_id)
     
-    matches = list(re.finditer(markdown_pattern, text))
-    
-    if not matches:
+    if not any(segment[0] == "s3" for segment in segments):
         # No S3 links, render normally
         st.markdown(text, unsafe_allow_html=True)
         return
     
-    # Replace S3 links with download buttons
-    last_end = 0
-    for idx, match in enumerate(matches):
-        link_text = match.group(1)
-        url = match.group(2)
+    if S3_DOWNLOAD_MODE == "presigned":
+        # Browser downloads straight from S3, no object bytes pass through the app
+        _render_presigned_links(segments, region)
+        return
+    
+    # Proxy mode: replace S3 links with buttons that download on demand
+    downloads = st.session_state.setdefault("s3_downloads", {})
+    prefetches = {}
+    if S3_PREFETCH_LINKS:
+        try:
+            prefetches = _start_prefetch(segments, region)
+        except Exception:
+            # Links fall back to fetching on click
+            prefetches = {}
+    pending_links = []
+    idx = -1
+    for segment in segments:
+        if segment[0] == "text":
+            # Render text between links; whitespace between buttons needs no element
+            if segment[1].strip():
+                st.markdown(segment[1], unsafe_allow_html=True)
+            continue
         
-        # Render text before the link
-        if match.start() > last_end:
-            st.markdown(text[last_end:match.start()], unsafe_allow_html=True)
+        _, link_text, url, bucket, key = segment
+        idx += 1
         
         # Render download button styled as link
-        bucket, key = parse_s3_url(url)
-        if bucket and key:
-            filename = key.split('/')[-1] or 'download'
-            cache_key = f"s3_file_{hash(url)}"
-            download_key = f"s3_dl_{unique_id}_{idx}_{hash(url)}"
-            
-            # Download file if not cached
-            if cache_key not in st.session_state:
-                try:
-                    s3_client = get_boto3_client('s3', region)
-                    response = s3_client.get_object(Bucket=bucket, Key=key)
-                    file_bytes = response['Body'].read()
-                    st.session_state[cache_key] = (file_bytes, filename)
-                except Exception as e:
-                    st.error(f"Error downloading {filename}: {str(e)}")
-                    # Show original link text on error
-                    st.markdown(f"[{link_text}]({url})", unsafe_allow_html=True)
-                    last_end = match.end()
-                    continue
-            
-            # Get cached file and show download button styled as link
-            file_bytes, filename = st.session_state[cache_key]
-            
-            # Style download button to look like a link
-            st.markdown(
-                f"""
-                <style>
-                button[data-testid="baseButton-{download_key}"] {{
-                    background: transparent !important;
-                    border: none !important;
-                    color: #0066cc !important;
-                    text-decoration: underline !important;
-                    padding: 0 !important;
-                    margin: 0 !important;
-                    font-size: inherit !important;
-                    font-family: inherit !important;
-                    box-shadow: none !important;
-                    cursor: pointer !important;
-                    font-weight: normal !important;
-                    text-align: left !important;
-                    min-height: auto !important;
-                    height: auto !important;
-                    line-height: inherit !important;
-                    display: inline !important;
-                    width: auto !important;
-                }}
-                button[data-testid="baseButton-{download_key}"]:hover {{
-                    color: #0052a3 !important;
-                    background: transparent !important;
-                }}
-                </style>
-                """,
-                unsafe_allow_html=True
-            )
-            
-            st.download_button(
-                label=link_text,
-                data=file_bytes,
-                file_name=filename,
-                mime="application/octet-stream",
-                key=download_key,
-                use_container_width=False
-            )
-        else:
-            # Invalid S3 URL, show original link
-            st.markdown(f"[{link_text}]({url})", unsafe_allow_html=True)
+        filename = key.split('/')[-1] or 'download'
+        digest = object_digest(bucket, key)
+        download_key = f"s3_dl_{unique_id}_{idx}_{digest[:16]}"
         
-        last_end = match.end()
+        if digest in prefetches:
+            # Filled in once the concurrent fetch completes
+            placeholder = st.empty()
+            placeholder.markdown(f"⏳ {link_text}")
+            pending_links.append((digest, placeholder, link_text, url, filename, download_key, bucket, key))
+            continue
+        
+        try:
+            # Nothing is fetched until the user clicks the link
+            _render_download_button(link_text, filename, download_key, bucket, key, region)
+        except Exception as e:
+            _render_download_error(e, link_text, url, filename)
     
-    # Render remaining text
-    if last_end < len(text):
-        st.markdown(text[last_end:], unsafe_allow_html=True)
-
+    # Render prefetched links as each object arrives; errors stay per link
+    digests_by_future = {future: digest for digest, future in prefetches.items()}
+    for future in as_completed(digests_by_future):
+        digest = digests_by_future[future]
+        error = future.exception()
+        if error is None:
+            downloads[digest] = time.time()
+        for link_digest, placeholder, link_text, url, filename, download_key, bucket, key in pending_links:
+            if link_digest != digest:
+                continue
+            with placeholder.container():
+                try:
+                    _render_download_button(link_text, filename, download_key, bucket, key, region,
+                                            cached_object=future.result())
+                except Exception as e:
+                    _render_download_error(e, link_text, url, filename)
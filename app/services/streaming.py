@@ -1,12 +1,36 @@
 """Streaming response handling."""
 
+import codecs
+import io
 import json
+import re
 import time
+from app.config.settings import JSON_PRETTY_PRINT_MAX_CHARS, STREAM_CHUNK_SIZE
 from app.core.aws_client import get_boto3_client
+from app.core.metrics import metrics
+from app.services.agent_invoker import invoke_agent_runtime
+from app.services.response_cache import get_response_layer
 
 
-def extract_assistant_message(response_data):
-    """Extract assistant message from response data."""
+def _format_json(value, pretty_max_chars=JSON_PRETTY_PRINT_MAX_CHARS):
+    """Serialize a reply that has no text field, pretty-printing it unless it is huge.
+
+    Pass pretty_max_chars=None to pretty-print regardless of size.
+    """
+    # The compact encoder runs in C; indent=2 falls back to pure Python
+    compact = json.dumps(value)
+    if pretty_max_chars is not None and len(compact) > pretty_max_chars:
+        return compact
+    return json.dumps(value, indent=2)
+
+
+@metrics.timed("extract_assistant_message_seconds")
+def extract_assistant_message(response_data, pretty_max_chars=JSON_PRETTY_PRINT_MAX_CHARS):
+    """Extract assistant message from response data.
+
+    Replies without a text field are returned as JSON, pretty-printed up to
+    pretty_max_chars characters (None: always).
+    """
     assistant_message = ""
     
     if isinstance(response_data, dict) and "result" in response_data:
@@ -21,53 +45,470 @@ def extract_assistant_message(response_data):
             else:
                 assistant_message = str(assistant_msg)
         else:
-            assistant_message = json.dumps(result, indent=2)
+            assistant_message = _format_json(result, pretty_max_chars)
     else:
-        assistant_message = json.dumps(response_data, indent=2)
+        assistant_message = _format_json(response_data, pretty_max_chars)
     
     return assistant_message
 
 
-def stream_agent_response(agent_arn, session_id, prompt, region_name):
-    """Stream agent response by simulating streaming from complete response."""
+def _iter_body_chunks(body, chunk_size):
+    """Yield raw byte chunks from a streaming response body."""
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _event_text(event):
+    """Extract displayable text from a single SSE or NDJSON event payload."""
     try:
-        # Create Bedrock AgentCore client
-        client = get_boto3_client('bedrock-agentcore', region_name)
-        
-        # Prepare payload
-        payload = json.dumps({"message": prompt})
-        
-        # Invoke agent runtime
-        response = client.invoke_agent_runtime(
-            agentRuntimeArn=agent_arn,
-            runtimeSessionId=session_id,
-            payload=payload,
-            qualifier="DEFAULT"
+        data = json.loads(event)
+    except ValueError:
+        # Not JSON, treat the payload as raw text
+        return event
+
+    if isinstance(data, str):
+        return data
+    if not isinstance(data, dict):
+        return ""
+
+    if "result" in data:
+        return extract_assistant_message(data)
+    for field in ("response", "text", "data", "delta"):
+        value = data.get(field)
+        if isinstance(value, str):
+            return value
+        if isinstance(value, dict) and isinstance(value.get("text"), str):
+            return value["text"]
+
+    # Bedrock converse-style delta nested under "event"
+    event_data = data.get("event")
+    if isinstance(event_data, dict):
+        delta = event_data.get("contentBlockDelta", {}).get("delta", {})
+        if isinstance(delta, dict) and isinstance(delta.get("text"), str):
+            return delta["text"]
+
+    # Metadata and lifecycle events carry no text
+    return ""
+
+
+def _detect_format(content_type, head):
+    """Decide how to parse a response body from its content type and first characters."""
+    content_type = (content_type or "").lower()
+    if "event-stream" in content_type:
+        return "sse"
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    if "json" in content_type:
+        return "json"
+
+    stripped = head.lstrip()
+    if stripped.startswith(("data:", "event:", "id:", ":")):
+        return "sse"
+    if stripped.startswith(("{", "[")):
+        return "json"
+    return "text"
+
+
+def _iter_sse(text_chunks):
+    """Yield event text from server-sent event frames."""
+    buffer = ""
+    data_lines = []
+    for text in text_chunks:
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line:
+                # Blank line dispatches the pending event
+                if data_lines:
+                    event_text = _event_text("\n".join(data_lines))
+                    data_lines = []
+                    if event_text:
+                        yield event_text
+            elif line.startswith("data:"):
+                value = line[5:]
+                data_lines.append(value[1:] if value.startswith(" ") else value)
+            # Comments and event/id/retry fields carry no text
+
+    # Dispatch an event left unterminated at end of stream
+    if buffer.startswith("data:"):
+        value = buffer[5:].rstrip("\r")
+        data_lines.append(value[1:] if value.startswith(" ") else value)
+    if data_lines:
+        event_text = _event_text("\n".join(data_lines))
+        if event_text:
+            yield event_text
+
+
+def _iter_ndjson_lines(lines):
+    """Yield event text from newline-delimited JSON lines."""
+    for line in lines:
+        line = line.strip()
+        if line:
+            event_text = _event_text(line)
+            if event_text:
+                yield event_text
+
+
+def _iter_ndjson(text_chunks):
+    """Yield event text from an NDJSON stream as each line completes."""
+    buffer = ""
+    for text in text_chunks:
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        yield from _iter_ndjson_lines(lines)
+    yield from _iter_ndjson_lines([buffer])
+
+
+# Where extract_assistant_message finds the assistant text in a JSON reply;
+# result.response wins over result.messages[1][0] wherever it appears
+_JSON_RESPONSE_PATH = ("result", "response")
+_JSON_MESSAGES_PATH = ("result", "messages", 1, 0)
+_JSON_STRUCTURE = re.compile(r'["{}\[\],:]')
+# Raw string content up to the closing quote, or up to a backslash ending the chunk
+_JSON_STRING_BODY = re.compile(r'(?:[^"\\]+|\\.)*', re.DOTALL)
+
+
+class _JsonTextExtractor:
+    """Incremental scanner that streams the assistant text out of a JSON reply.
+
+    Tracks the key path of every value while the document arrives, and
+    decodes the string at result.response as soon as its characters are
+    received. The string at result.messages[1][0] is only held back: it is
+    the assistant text if result closes without a response key. Strings
+    elsewhere are skipped without being decoded, and escapes split across
+    chunk boundaries are held back until complete.
+    """
+
+    def __init__(self):
+        # One frame per open container: [key, expecting_key] for objects, [index] for arrays
+        self.stack = []
+        self.found = False
+        self.finished = False
+        self.in_string = False
+        self.string_role = None
+        self.escape_pending = False
+        self.key_parts = []
+        self.pending = ""
+        # Raw result.messages[1][0] string, once seen and while no response key was
+        self.candidate_parts = None
+        self.candidate_complete = False
+        self.saw_response = False
+
+    def feed(self, text):
+        """Scan a chunk of the document and yield any assistant text it completes."""
+        pos = 0
+        end = len(text)
+        while pos < end and not self.finished:
+            if self.in_string:
+                start = pos
+                if self.escape_pending:
+                    self.escape_pending = False
+                    pos += 1
+                pos = _JSON_STRING_BODY.match(text, pos).end()
+                closed = pos < end and text[pos] == '"'
+                if closed:
+                    pos += 1
+                elif pos < end:
+                    # A backslash ends the chunk; the escaped character is in the next one
+                    self.escape_pending = True
+                    pos = end
+                content = text[start:pos - 1] if closed else text[start:pos]
+                if self.string_role == "key":
+                    self.key_parts.append(content)
+                elif self.string_role == "candidate":
+                    self.candidate_parts.append(content)
+                elif self.string_role == "text":
+                    decoded = self._decode(content, final=closed)
+                    if decoded:
+                        yield decoded
+                if closed:
+                    self._close_string()
+                continue
+
+            match = _JSON_STRUCTURE.search(text, pos)
+            if match is None:
+                break
+            pos = match.end()
+            text_found = self._structure(match.group())
+            if text_found:
+                yield text_found
+
+    def _structure(self, char):
+        """Track one structural character; returns the held-back text once it is known to be the reply."""
+        frame = self.stack[-1] if self.stack else None
+        if char == '"':
+            self.in_string = True
+            path = self._path()
+            if frame is not None and len(frame) == 2 and frame[1]:
+                self.string_role = "key"
+            elif not self.found and path == _JSON_RESPONSE_PATH:
+                self.string_role = "text"
+                self.found = True
+            elif not self.saw_response and self.candidate_parts is None and path == _JSON_MESSAGES_PATH:
+                self.string_role = "candidate"
+                self.candidate_parts = []
+            else:
+                self.string_role = None
+        elif char == "{":
+            self.stack.append([None, True])
+        elif char == "[":
+            self.stack.append([0])
+        elif char in "}]":
+            if len(self.stack) == 2 and self.stack[0][0] == "result" and self.candidate_complete \
+                    and not self.saw_response:
+                # result closed without a response key: the held-back message is the reply
+                self.found = True
+                self.finished = True
+                return json.loads('"' + "".join(self.candidate_parts) + '"')
+            if self.stack:
+                self.stack.pop()
+        elif char == "," and frame is not None:
+            if len(frame) == 2:
+                frame[0], frame[1] = None, True
+            else:
+                frame[0] += 1
+
+    def _path(self):
+        return tuple(frame[0] for frame in self.stack)
+
+    def _close_string(self):
+        self.in_string = False
+        if self.string_role == "key":
+            frame = self.stack[-1]
+            frame[0] = json.loads('"' + "".join(self.key_parts) + '"')
+            frame[1] = False
+            self.key_parts = []
+            if self._path() == _JSON_RESPONSE_PATH:
+                # extract_assistant_message prefers result.response, whatever its type
+                self.saw_response = True
+                self.candidate_parts = None
+                self.candidate_complete = False
+        elif self.string_role == "candidate":
+            self.candidate_complete = True
+        elif self.string_role == "text":
+            # Nothing after the assistant text is needed
+            self.finished = True
+        self.string_role = None
+
+    def _decode(self, content, final):
+        """Decode raw string content, holding back an incomplete trailing escape."""
+        raw = self.pending + content
+        self.pending = ""
+        if final:
+            return json.loads('"' + raw + '"')
+        # An escape is at most 12 characters long (a \uXXXX surrogate pair)
+        for cut in range(len(raw), max(len(raw) - 12, 0) - 1, -1):
+            try:
+                decoded = json.loads('"' + raw[:cut] + '"')
+            except ValueError:
+                continue
+            if decoded and "\ud800" <= decoded[-1] <= "\udbff":
+                # High surrogate: wait for the \uXXXX carrying its other half
+                continue
+            self.pending = raw[cut:]
+            return decoded
+        self.pending = raw
+        return ""
+
+
+def _iter_json(text_chunks):
+    """Yield the assistant message from a single JSON document as it arrives.
+
+    The assistant text at result.response is streamed while the body is
+    still being received; the text at result.messages[1][0] is yielded as
+    soon as result closes without a response. Other documents are parsed
+    once the body completes.
+    """
+    extractor = _JsonTextExtractor()
+    buffered = []
+    for text in text_chunks:
+        if not extractor.found:
+            buffered.append(text)
+        yield from extractor.feed(text)
+        if extractor.found:
+            # The text is streamed directly; the body is no longer needed
+            buffered = []
+    if extractor.found:
+        return
+
+    body = "".join(buffered)
+    try:
+        response_data = json.loads(body)
+    except ValueError:
+        # Several JSON documents in one body, parse them line by line
+        yield from _iter_ndjson_lines(body.split("\n"))
+        return
+
+    assistant_message = extract_assistant_message(response_data)
+    if assistant_message:
+        yield assistant_message
+
+
+def iter_response_text(body, content_type="", chunk_size=STREAM_CHUNK_SIZE, stats=None, raw_body=None):
+    """Yield assistant text from an invoke_agent_runtime body as it arrives.
+
+    Args:
+        body: Streaming body exposing read(amt), e.g. response['response']
+        content_type: Response content type, used to pick the parser
+        chunk_size: Bytes to read per chunk
+        stats: Optional dict that receives timing information; when it holds a
+            "started" perf_counter value, first byte/token offsets are recorded
+        raw_body: Optional bytearray that receives every byte read
+    """
+    stats = stats if stats is not None else {}
+    started = stats.setdefault("started", time.perf_counter())
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def decoded_chunks():
+        for chunk in _iter_body_chunks(body, chunk_size):
+            if "first_byte_seconds" not in stats:
+                stats["first_byte_seconds"] = time.perf_counter() - started
+            if raw_body is not None:
+                raw_body.extend(chunk)
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    text_chunks = decoded_chunks()
+
+    # Peek at the first characters to detect the format when needed
+    head = ""
+    for text in text_chunks:
+        head += text
+        if head.strip():
+            break
+
+    response_format = _detect_format(content_type, head)
+    stats["format"] = response_format
+
+    def all_chunks():
+        if head:
+            yield head
+        yield from text_chunks
+
+    parsers = {
+        "sse": _iter_sse,
+        "ndjson": _iter_ndjson,
+        "json": _iter_json,
+    }
+    parser = parsers.get(response_format)
+    pieces = parser(all_chunks()) if parser else all_chunks()
+
+    for piece in pieces:
+        if "first_token_seconds" not in stats:
+            stats["first_token_seconds"] = time.perf_counter() - started
+        yield piece
+
+    stats["total_seconds"] = time.perf_counter() - started
+
+
+def recover_response_text(raw_body, content_type=""):
+    """Re-parse a response body that was already received, without re-invoking.
+
+    Falls back to the decoded raw text if the body cannot be parsed.
+    """
+    try:
+        return "".join(iter_response_text(io.BytesIO(bytes(raw_body)), content_type))
+    except Exception:
+        return bytes(raw_body).decode("utf-8", errors="replace")
+
+
+def stream_agent_response(agent_arn, session_id, prompt, region_name, stats=None, client=None,
+                          on_response=None, raw_body=None, credentials=None,
+                          lease=None, context=None, caller=None):
+    """Stream agent response text as the runtime produces it.
+
+    Server-sent events, NDJSON and chunked text bodies are yielded incrementally,
+    and so is the assistant text inside a single JSON document.
+    Transient invoke failures are retried. Once the reply arrives it is never
+    re-invoked: a failed parse is redone from raw_body.
+
+    Args:
+        agent_arn: Agent runtime ARN
+        session_id: Runtime session id
+        prompt: User prompt
+        region_name: AWS region
+        stats: Optional dict filled with first byte/token and total timings
+        client: Optional bedrock-agentcore client; defaults to one built from
+            credentials, or from session state if none are given, so pass one
+            of them explicitly when running off the script thread
+        on_response: Optional callback receiving the raw invoke response, e.g.
+            to close its body from another thread
+        raw_body: Optional bytearray that receives the raw response body, so
+            it can be re-parsed with recover_response_text if handling fails
+        credentials: Optional AwsCredentials used to build the client
+        lease: Optional AdmissionLease, held from the invoke until the body is read
+        context: Optional earlier prompts of the conversation, keying the turn
+            in the response cache and cassettes
+        caller: Optional identity the response cache scopes the turn to;
+            defaults to the fingerprint of credentials, if given. Turns
+            without one are not cached
+    """
+    stats = stats if stats is not None else {}
+    stats["started"] = time.perf_counter()
+    raw_body = raw_body if raw_body is not None else bytearray()
+    # Only a fully read reply lets the admission limiter raise its ceiling
+    succeeded = False
+    try:
+        # Opt-in cache and cassettes: a stored reply replaces the invoke call
+        responses = get_response_layer()
+        if caller is None and credentials is not None:
+            caller = credentials.fingerprint
+        response_key = responses.key(agent_arn, prompt, context, caller)
+        response = responses.lookup(response_key) if response_key else None
+        recorder = None
+        if response is not None:
+            stats["response_source"] = responses.mode
+        else:
+            # Create Bedrock AgentCore client
+            if client is None and credentials is not None:
+                client = credentials.client('bedrock-agentcore', region_name)
+            elif client is None:
+                client = get_boto3_client('bedrock-agentcore', region_name)
+
+            # Invoke agent runtime, retrying transient failures
+            response = invoke_agent_runtime(
+                client,
+                agent_arn,
+                session_id,
+                prompt,
+                lease=lease
+            )
+            if response_key:
+                recorder = responses.watch(response, stats["started"])
+        stats["invoke_seconds"] = time.perf_counter() - stats["started"]
+        if on_response is not None:
+            on_response(response)
+
+        # Yield text as the body arrives
+        content_type = response.get('contentType', '')
+        yield from iter_response_text(
+            response['response'],
+            content_type=content_type,
+            stats=stats,
+            raw_body=raw_body
         )
-        
-        # Read the response
-        response_body = response['response'].read()
-        response_data = json.loads(response_body)
-        
-        # Extract the assistant message
-        assistant_message = extract_assistant_message(response_data)
-        
-        # Simulate streaming by yielding words/sentences
-        # This provides a better UX even if the API doesn't support true streaming
-        if assistant_message:
-            # Split into words and yield incrementally
-            words = assistant_message.split(' ')
-            
-            for i, word in enumerate(words):
-                # Yield only the new word with a space (except for the last word)
-                if i < len(words) - 1:
-                    yield word + " "
-                else:
-                    yield word
-                
-                # Small delay to make streaming visible (optional)
-                time.sleep(0.02)  # 20ms delay between words
-                
+        succeeded = True
+        if recorder is not None:
+            responses.save(response_key, recorder, content_type, agent_arn=agent_arn, prompt=prompt, context=context)
+
+        # Per-turn latency breakdown, of the agent itself only
+        labels = {"agent_arn": agent_arn, "region": region_name}
+        for stat, metric in (("first_byte_seconds", "agent_first_byte_seconds"),
+                             ("first_token_seconds", "agent_first_token_seconds"),
+                             ("total_seconds", "agent_response_seconds")):
+            if stat in stats and "response_source" not in stats:
+                metrics.observe(metric, stats[stat], **labels)
+
     except Exception as e:
         raise Exception(f"Error streaming response: {str(e)}")
-
+    finally:
+        if lease is not None:
+            lease.release(succeeded=succeeded)
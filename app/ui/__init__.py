@@ -1,9 +1,13 @@
 """UI components module."""
 
-from .components import render_credentials_setup, render_sidebar
+from .components import render_credentials_setup, render_sidebar, render_chat_history, render_diagnostics
+from .streaming_placeholder import ThrottledMarkdown
 
 __all__ = [
     "render_credentials_setup",
     "render_sidebar",
+    "render_chat_history",
+    "render_diagnostics",
+    "ThrottledMarkdown",
 ]
 
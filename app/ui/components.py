@@ -1,10 +1,15 @@
 """UI components for the Streamlit application."""
 
-import uuid
+import json
 import streamlit as st
-import boto3
-from app.config.settings import DEFAULT_REGION
-from app.core.aws_client import fetch_available_agents
+from app.config.settings import AGENT_DISCOVERY_POLL_SECONDS, DEFAULT_REGION, CHAT_HISTORY_PAGE_SIZE
+from app.core.aws_client import credentials_fingerprint, get_pooled_client, invalidate_client_pool, region_from_arn
+from app.core.agent_discovery import get_available_agents, invalidate_available_agents
+from app.core.session_state import start_new_conversation
+from app.core.session_memory import get_session_accountant
+from app.core.metrics import metrics
+from app.services.agent_warmup import get_agent_warmer
+from app.services.s3_handler import render_message_with_s3_links
 
 
 def render_credentials_setup():
@@ -56,23 +61,21 @@ def render_credentials_setup():
                 
                 # Test credentials
                 try:
-                    session = boto3.Session(
-                        aws_access_key_id=form_access_key.strip(),
-                        aws_secret_access_key=form_secret_key.strip(),
-                        aws_session_token=form_session_token.strip() if form_session_token.strip() else None,
-                        region_name=form_region.strip() or DEFAULT_REGION
+                    test_client = get_pooled_client(
+                        'sts',
+                        form_region.strip() or DEFAULT_REGION,
+                        form_access_key.strip(),
+                        form_secret_key.strip(),
+                        form_session_token.strip()
                     )
-                    test_client = session.client('sts', region_name=form_region.strip() or DEFAULT_REGION)
                     identity = test_client.get_caller_identity()
                     st.session_state.credentials_configured = True
+                    st.session_state.aws_account_id = identity.get('Account', '')
+                    st.session_state.aws_caller_arn = identity.get('Arn', '')
                     st.success(f"✅ Credentials validated! Account: {identity.get('Account', 'N/A')}")
                     
-                    # Fetch available agents
-                    with st.spinner("Fetching available agents..."):
-                        st.session_state.available_agents = fetch_available_agents(
-                            form_region.strip() or DEFAULT_REGION,
-                            session=session
-                        )
+                    # Start fetching available agents in the background
+                    get_available_agents(form_region.strip() or DEFAULT_REGION, wait=0)
                     
                     st.rerun()
                 except Exception as e:
@@ -81,6 +84,25 @@ def render_credentials_setup():
                 st.error("Please provide both Access Key ID and Secret Access Key")
 
 
+def agent_label(agent):
+    """Selector label of a discovered agent, tagged with its region."""
+    label = f"{agent['name']} ({agent['status']})"
+    if agent.get('region'):
+        label += f" · {agent['region']}"
+    return label
+
+
+@st.fragment(run_every=AGENT_DISCOVERY_POLL_SECONDS)
+def _rerun_when_agents_load(region_name):
+    """Poll the discovery cache and rerun the page once the first agent list is in.
+    
+    Only this fragment reruns while waiting, so the page is never blocked on AWS.
+    """
+    agents, discovery_error = get_available_agents(region_name)
+    if agents is not None or discovery_error:
+        st.rerun()
+
+
 def render_sidebar():
     """Render the sidebar with agent selection and settings."""
     with st.sidebar:
@@ -89,25 +111,50 @@ def render_sidebar():
         
         # Fetch available agents
         if st.button("🔄 Refresh Agents", use_container_width=True):
-            st.session_state.available_agents = []
+            invalidate_available_agents(st.session_state.region)
             st.rerun()
         
-        if not st.session_state.available_agents:
-            with st.spinner("Fetching available agents..."):
-                st.session_state.available_agents = fetch_available_agents(st.session_state.region)
+        # Served from the shared discovery cache, refreshed in the background
+        agents, discovery_error = get_available_agents(st.session_state.region)
+        if agents is None and discovery_error:
+            # The first discovery failed; it is retried once the error expires
+            st.error(f"Error fetching agents: {discovery_error}")
+            st.button("Check again", use_container_width=True)
+        elif agents is None:
+            st.info("⏳ Fetching available agents...")
+            _rerun_when_agents_load(st.session_state.region)
+        else:
+            st.session_state.available_agents = agents
+            if discovery_error and not agents:
+                st.error(f"Error fetching agents: {discovery_error}")
         
-        if st.session_state.available_agents:
+        compare_mode = st.toggle(
+            "🔀 Compare agents",
+            key="compare_mode",
+            help="Send each message to several agents at once and show the replies side by side"
+        )
+        
+        if st.session_state.available_agents and compare_mode:
+            agent_labels = {agent['arn']: agent_label(agent) for agent in st.session_state.available_agents}
+            st.session_state.compare_agent_arns = st.multiselect(
+                "Agents to compare",
+                options=list(agent_labels),
+                default=[arn for arn in st.session_state.compare_agent_arns if arn in agent_labels],
+                format_func=agent_labels.get,
+                help="Each agent gets its own runtime session"
+            )
+        elif st.session_state.available_agents:
             # Create options for selectbox
-            agent_options = [f"{agent['name']} ({agent['status']})" for agent in st.session_state.available_agents]
+            agent_options = [agent_label(agent) for agent in st.session_state.available_agents]
             agent_arns = [agent['arn'] for agent in st.session_state.available_agents]
             
-            # Find current selection index
+            # Find current selection index; an agent selected in a region that
+            # is no longer the fastest stays selected there
             current_index = 0
-            if st.session_state.agent_arn:
-                try:
-                    current_index = agent_arns.index(st.session_state.agent_arn)
-                except ValueError:
-                    current_index = 0
+            for index, agent in enumerate(st.session_state.available_agents):
+                if st.session_state.agent_arn in (agent['arn'], *agent.get('arns', {}).values()):
+                    current_index = index
+                    break
             
             selected_agent = st.selectbox(
                 "Available Agents",
@@ -118,17 +165,24 @@ def render_sidebar():
             
             if selected_agent:
                 selected_index = agent_options.index(selected_agent)
-                st.session_state.agent_arn = agent_arns[selected_index]
                 selected_agent_data = st.session_state.available_agents[selected_index]
+                if st.session_state.agent_arn not in selected_agent_data.get('arns', {}).values():
+                    st.session_state.agent_arn = agent_arns[selected_index]
                 
                 # Display complete agent details
                 st.divider()
                 st.subheader("Agent Details")
                 st.write(f"**Name:** {selected_agent_data['name']}")
                 st.write(f"**Status:** {selected_agent_data['status']}")
+                agent_region = region_from_arn(st.session_state.agent_arn)
+                if agent_region:
+                    st.write(f"**Region:** {agent_region}")
+                other_regions = [region for region in selected_agent_data.get('arns', {}) if region != agent_region]
+                if other_regions:
+                    st.caption(f"Also in {', '.join(other_regions)}")
                 st.write(f"**ARN:**")
-                st.code(selected_agent_data['arn'], language=None)
-        else:
+                st.code(st.session_state.agent_arn, language=None)
+        elif agents is not None:
             st.warning("No agents found. Please check your credentials and region.")
             st.session_state.agent_arn = ""
         
@@ -145,7 +199,17 @@ def render_sidebar():
         
         # Option to reconfigure credentials
         if st.button("🔐 Reconfigure Credentials", use_container_width=True):
+            # Drop pooled clients built with the old credentials, and stop pinging with them
+            old_credentials = (
+                st.session_state.aws_access_key_id,
+                st.session_state.aws_secret_access_key,
+                st.session_state.aws_session_token
+            )
+            invalidate_client_pool(*old_credentials)
+            get_agent_warmer().forget(credentials_fingerprint(*old_credentials))
             st.session_state.credentials_configured = False
+            st.session_state.aws_account_id = ""
+            st.session_state.aws_caller_arn = ""
             st.session_state.aws_access_key_id = ""
             st.session_state.aws_secret_access_key = ""
             st.session_state.aws_session_token = ""
@@ -154,7 +218,162 @@ def render_sidebar():
         st.divider()
         
         if st.button("Clear Chat"):
-            st.session_state.messages = []
-            st.session_state.session_id = str(uuid.uuid4()) + str(uuid.uuid4())[:5]
+            if st.session_state.get("active_invocation") is not None:
+                st.session_state.active_invocation.cancel()
+                st.session_state.active_invocation = None
+            for invocation in st.session_state.get("active_comparison") or []:
+                invocation.cancel()
+            st.session_state.active_comparison = None
+            # The old conversation stays in the store; only the pointer moves
+            start_new_conversation()
             st.rerun()
+        
+        st.divider()
+        
+        if st.checkbox("📊 Show diagnostics", key="show_diagnostics"):
+            render_diagnostics()
+
 
+
+def render_chat_history(messages, region):
+    """Render the most recent page of chat history with on-demand earlier pages.
+
+    Args:
+        messages: ConversationHistory of the current session
+        region: AWS region for S3 links
+    """
+    window = st.session_state.get("history_window", CHAT_HISTORY_PAGE_SIZE)
+    start = max(len(messages) - window, 0)
+    
+    if start > 0:
+        if st.button(f"⬆️ Load earlier messages ({start} hidden)", use_container_width=True):
+            st.session_state.history_window = window + CHAT_HISTORY_PAGE_SIZE
+            st.rerun()
+    
+    page = messages.page(start)
+    position = 0
+    while position < len(page):
+        message = page[position]
+        idx = start + position
+        
+        # Replies of one comparison turn are stored back to back
+        comparison = message.get("comparison")
+        if comparison:
+            end = position + 1
+            while end < len(page) and page[end].get("comparison") == comparison:
+                end += 1
+            replies = page[position:end]
+            with st.chat_message("assistant"):
+                render_agent_replies(replies, region, key_prefix=f"msg_{idx}")
+            position += len(replies)
+            continue
+        
+        with st.chat_message(message["role"]):
+            if message["role"] == "assistant":
+                render_message_with_s3_links(
+                    message["content"],
+                    region,
+                    unique_id=f"msg_{idx}",
+                    message_id=message.get("id", "")
+                )
+            else:
+                st.markdown(message["content"])
+        position += 1
+
+
+def format_latency(total_seconds, first_token_seconds=None):
+    """Return a short latency caption for an agent reply."""
+    caption = f"⏱ {total_seconds:.2f}s"
+    if first_token_seconds is not None:
+        caption += f" · first token {first_token_seconds:.2f}s"
+    return caption
+
+
+def format_response_source(source):
+    """Return a caption for a reply served by the response cache or a cassette, else ""."""
+    return {"cache": "♻️ From response cache", "replay": "📼 Replayed from cassette"}.get(source, "")
+
+
+def format_bytes(size):
+    """Format a byte count for display, e.g. "512 KB" or "1.5 MB"."""
+    if size < 1024 * 1024:
+        return f"{size / 1024:.0f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def render_agent_replies(replies, region, key_prefix):
+    """Render the replies of several agents to one prompt side by side.
+
+    Args:
+        replies: Assistant messages with agent_name and latency fields
+        region: AWS region for S3 links
+        key_prefix: Prefix of widget keys, unique per comparison turn
+    """
+    for column, (idx, reply) in zip(st.columns(len(replies)), enumerate(replies)):
+        with column:
+            st.markdown(f"**{reply.get('agent_name', 'Agent')}**")
+            render_message_with_s3_links(
+                reply["content"],
+                region,
+                unique_id=f"{key_prefix}_{idx}",
+                message_id=reply.get("id", "")
+            )
+            if reply.get("latency_seconds") is not None:
+                st.caption(format_latency(reply["latency_seconds"], reply.get("first_token_seconds")))
+            if reply.get("response_source"):
+                st.caption(format_response_source(reply["response_source"]))
+
+
+def render_diagnostics():
+    """Render latency histograms, session memory, pool gauges and metric exports."""
+    snapshot = metrics.snapshot()
+    
+    st.caption("Latency (seconds)")
+    if snapshot["histograms"]:
+        st.dataframe(
+            [
+                {
+                    "metric": histogram["name"],
+                    "labels": ", ".join(f"{key}={value}" for key, value in histogram["labels"].items()),
+                    "count": histogram["count"],
+                    "p50": round(histogram["p50"], 3),
+                    "p95": round(histogram["p95"], 3),
+                    "p99": round(histogram["p99"], 3),
+                }
+                for histogram in sorted(snapshot["histograms"], key=lambda h: h["name"])
+            ],
+            use_container_width=True
+        )
+    else:
+        st.write("No measurements yet.")
+    
+    accountant = get_session_accountant()
+    memory = accountant.stats()
+    session_bytes = accountant.session_bytes(st.session_state.get("memory_session_key"))
+    st.caption("Session memory")
+    st.write(
+        f"This session: {format_bytes(session_bytes)} of {format_bytes(memory['session_budget_bytes'])} · "
+        f"{memory['sessions']} sessions: {format_bytes(memory['bytes'])} of "
+        f"{format_bytes(memory['global_budget_bytes'])}"
+    )
+    
+    st.caption("Pools and caches")
+    st.dataframe(
+        [{"gauge": gauge["name"], "value": gauge["value"]} for gauge in snapshot["gauges"]],
+        use_container_width=True
+    )
+    
+    st.download_button(
+        "Prometheus metrics",
+        data=metrics.to_prometheus(),
+        file_name="metrics.prom",
+        mime="text/plain",
+        use_container_width=True
+    )
+    st.download_button(
+        "JSON metrics",
+        data=json.dumps(snapshot, indent=2),
+        file_name="metrics.json",
+        mime="application/json",
+        use_container_width=True
+    )
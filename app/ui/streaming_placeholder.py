@@ -0,0 +1,63 @@
+"""Throttled rendering of streamed text into a Streamlit placeholder."""
+
+import time
+from app.config.settings import STREAM_REPAINT_INTERVAL_MS, STREAM_REPAINT_MIN_CHARS
+
+
+class ThrottledMarkdown:
+    """Coalesce streamed chunks and repaint a placeholder at a bounded rate.
+
+    Every repaint re-sends the whole reply, so painting after each chunk is
+    quadratic in reply length. Chunks are buffered in a list and the
+    placeholder is repainted once the interval has elapsed or enough new
+    text has arrived, with a final flush at the end.
+    """
+
+    def __init__(self, placeholder, interval_ms=STREAM_REPAINT_INTERVAL_MS,
+                 min_chars=STREAM_REPAINT_MIN_CHARS, cursor="▌"):
+        self.placeholder = placeholder
+        self.interval = interval_ms / 1000.0
+        self.min_chars = min_chars
+        self.cursor = cursor
+        self._parts = []
+        self._length = 0
+        self._painted_length = 0
+        self._last_paint = 0.0
+        self.repaints = 0
+        self.bytes_sent = 0
+
+    @property
+    def text(self):
+        """Return the text received so far."""
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def append(self, chunk):
+        """Add a chunk, repainting only when the throttle allows it."""
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        self._length += len(chunk)
+
+        now = time.perf_counter()
+        if now - self._last_paint >= self.interval or \
+                self._length - self._painted_length >= self.min_chars:
+            self._paint(self.text + self.cursor, now)
+
+    def tick(self):
+        """Paint text held back by the throttle once the interval has passed."""
+        now = time.perf_counter()
+        if self._length > self._painted_length and now - self._last_paint >= self.interval:
+            self._paint(self.text + self.cursor, now)
+
+    def flush(self, cursor=False):
+        """Paint everything received so far, with or without the cursor."""
+        self._paint(self.text + (self.cursor if cursor else ""), time.perf_counter())
+
+    def _paint(self, content, now):
+        self.placeholder.markdown(content)
+        self._painted_length = self._length
+        self._last_paint = now
+        self.repaints += 1
+        self.bytes_sent += len(content.encode("utf-8"))
@@ -0,0 +1 @@
+"""Offline benchmarks for the chat app; run with ``python -m benchmarks.run``."""
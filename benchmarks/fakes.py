@@ -0,0 +1,330 @@
+"""Local stand-ins for the AWS services used by the app.
+
+Every fake mimics the slice of the boto3 client API the app calls, with
+configurable latency, body size and chunking, so benchmarks run offline.
+"""
+
+import io
+import json
+import threading
+import time
+from botocore.exceptions import ClientError, HTTPClientError
+
+
+class FakeConfig:
+    """Knobs shared by all fake clients of one benchmark run."""
+
+    def __init__(self, **overrides):
+        # bedrock-agentcore
+        self.reply_words = 200
+        self.reply_format = "sse"
+        self.reply_link_count = 0
+        # When set, only prompts containing this word get reply_link_count links
+        self.link_keyword = ""
+        self.chunk_bytes = 64
+        self.first_byte_latency = 0.05
+        self.chunk_latency = 0.0
+        # Throttle invocations above this many concurrent ones (0 = never)
+        self.max_concurrency = 0
+        # Extra first-byte latency of a runtime session's first invocation, and
+        # of one idle for longer than session_idle_timeout (0 = never expires)
+        self.cold_start_latency = 0.0
+        self.session_idle_timeout = 0.0
+        # Failures of the first fail_times invocations: an error with HTTP
+        # status fail_status, or a dropped connection when fail_connection is
+        # "reset" or "http"
+        self.fail_times = 0
+        self.fail_status = 0
+        self.fail_connection = ""
+        # Reset the connection once this many reply bytes were read (0 = never)
+        self.reset_after_bytes = 0
+        # bedrock-agentcore-control
+        self.agent_count = 5
+        self.agents_page_size = 100
+        self.control_latency = 0.02
+        # Per-region control-plane latency overriding control_latency
+        self.region_latency = {}
+        # s3
+        self.s3_latency = 0.02
+        self.s3_object_bytes = 1024
+        for name, value in overrides.items():
+            if not hasattr(self, name):
+                raise ValueError(f"Unknown fake setting: {name}")
+            setattr(self, name, value)
+
+
+class _Meta:
+    def __init__(self, region_name):
+        self.region_name = region_name
+
+
+class _FakeClientError(ClientError):
+    """botocore ClientError with the given error code and HTTP status."""
+
+    def __init__(self, code, status, operation_name="GetObject"):
+        super().__init__(
+            {"Error": {"Code": code, "Message": code}, "ResponseMetadata": {"HTTPStatusCode": status}},
+            operation_name
+        )
+
+
+# Error codes of injected invoke failures by HTTP status
+_ERROR_CODES = {
+    400: "ValidationException",
+    429: "ThrottlingException",
+    500: "InternalServerException",
+    503: "ServiceUnavailableException",
+}
+
+
+class FakeStreamingBody:
+    """Streaming body that hands out data in chunks with per-chunk latency."""
+
+    def __init__(self, data, chunk_bytes=64, first_byte_latency=0.0, chunk_latency=0.0, on_finish=None,
+                 reset_after_bytes=0):
+        self._data = io.BytesIO(data)
+        self.chunk_bytes = chunk_bytes
+        self.reset_after_bytes = reset_after_bytes
+        self.first_byte_latency = first_byte_latency
+        self.chunk_latency = chunk_latency
+        self._started = False
+        self._on_finish = on_finish
+        self.closed = False
+
+    def read(self, amt=None):
+        if self.closed:
+            raise ValueError("I/O operation on closed body")
+        if not self._started:
+            self._started = True
+            time.sleep(self.first_byte_latency)
+        elif self.chunk_latency:
+            time.sleep(self.chunk_latency)
+        size = self.chunk_bytes if amt is None or amt < 0 else min(amt, self.chunk_bytes)
+        if self.reset_after_bytes:
+            remaining = self.reset_after_bytes - self._data.tell()
+            if remaining <= 0:
+                self._finish()
+                raise ConnectionResetError("Connection reset by peer")
+            size = min(size, remaining)
+        data = self._data.read(size)
+        if not data:
+            self._finish()
+        return data
+
+    def close(self):
+        self.closed = True
+        self._finish()
+
+    def _finish(self):
+        on_finish, self._on_finish = self._on_finish, None
+        if on_finish is not None:
+            on_finish()
+
+
+class PatternBody:
+    """Object body generated on the fly, so large objects cost no fake-side memory."""
+
+    def __init__(self, start, end, on_read=None):
+        self._position = start
+        self._end = end
+        self._on_read = on_read
+
+    def read(self, amt=None):
+        if self._on_read is not None:
+            self._on_read()
+        remaining = self._end - self._position
+        size = remaining if amt is None or amt < 0 else min(amt, remaining)
+        self._position += size
+        return b"x" * size
+
+    def close(self):
+        pass
+
+
+def build_reply(words, link_count=0):
+    """Return a reply text of the given length with optional S3 links."""
+    text = " ".join(f"word{i}" for i in range(words))
+    links = " ".join(f"[report {i}](s3://bench-bucket/reports/report-{i}.csv)" for i in range(link_count))
+    return f"{text} {links}".strip()
+
+
+def encode_reply(text, reply_format):
+    """Encode reply text the way an agent runtime would send it."""
+    if reply_format == "json":
+        return json.dumps({"result": {"response": text}}).encode("utf-8"), "application/json"
+    words = [word + " " for word in text.split(" ")]
+    if reply_format == "sse":
+        frames = "".join(f"data: {json.dumps(word)}\n\n" for word in words)
+        return frames.encode("utf-8"), "text/event-stream"
+    if reply_format == "ndjson":
+        lines = "".join(json.dumps({"text": word}) + "\n" for word in words)
+        return lines.encode("utf-8"), "application/x-ndjson"
+    return text.encode("utf-8"), "text/plain"
+
+
+class FakeAgentCoreClient:
+    """bedrock-agentcore: streams a generated reply, throttling above max_concurrency.
+
+    The first config.fail_times invocations fail as configured, to exercise
+    retries.
+    """
+
+    def __init__(self, config, region_name):
+        self.config = config
+        self.meta = _Meta(region_name)
+        self._lock = threading.Lock()
+        self.invocations = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.cold_starts = 0
+        self.warmups = 0
+        self._session_last_used = {}
+
+    def _finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def invoke_agent_runtime(self, agentRuntimeArn, runtimeSessionId, payload, qualifier="DEFAULT", **kwargs):
+        config = self.config
+        with self._lock:
+            self.invocations += 1
+            if self.invocations <= config.fail_times:
+                if config.fail_connection == "reset":
+                    raise ConnectionResetError("Connection reset by peer")
+                if config.fail_connection == "http":
+                    raise HTTPClientError(error=ConnectionResetError("Connection reset by peer"))
+                code = _ERROR_CODES.get(config.fail_status, "InternalServerException")
+                raise _FakeClientError(code, config.fail_status, "InvokeAgentRuntime")
+            if config.max_concurrency and self.in_flight >= config.max_concurrency:
+                self.throttled += 1
+                raise _FakeClientError("ThrottlingException", 429, "InvokeAgentRuntime")
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            now = time.monotonic()
+            last_used = self._session_last_used.get(runtimeSessionId)
+            cold = last_used is None or (
+                config.session_idle_timeout and now - last_used > config.session_idle_timeout
+            )
+            self._session_last_used[runtimeSessionId] = now
+            self.cold_starts += bool(cold)
+            message = json.loads(payload)
+            warmup = message.get("warmup", False)
+            self.warmups += bool(warmup)
+        link_count = config.reply_link_count
+        if config.link_keyword and config.link_keyword not in message.get("message", ""):
+            link_count = 0
+        text = "ok" if warmup else build_reply(config.reply_words, link_count)
+        data, content_type = encode_reply(text, config.reply_format)
+        body = FakeStreamingBody(
+            data,
+            chunk_bytes=config.chunk_bytes,
+            first_byte_latency=config.first_byte_latency + (config.cold_start_latency if cold else 0.0),
+            chunk_latency=config.chunk_latency,
+            on_finish=self._finish,
+            reset_after_bytes=config.reset_after_bytes
+        )
+        return {"response": body, "contentType": content_type, "statusCode": 200}
+
+
+class FakeAgentCoreControlClient:
+    """bedrock-agentcore-control: paginated agent runtime listing."""
+
+    def __init__(self, config, region_name):
+        self.config = config
+        self.meta = _Meta(region_name)
+
+    def list_agent_runtimes(self, maxResults=100, nextToken=None):
+        time.sleep(self.config.region_latency.get(self.meta.region_name, self.config.control_latency))
+        start = int(nextToken or 0)
+        page_size = min(maxResults, self.config.agents_page_size)
+        end = min(start + page_size, self.config.agent_count)
+        region = self.meta.region_name
+        response = {
+            "agentRuntimes": [
+                {
+                    "agentRuntimeArn": f"arn:aws:bedrock-agentcore:{region}:123456789012:runtime/bench-agent-{i}",
+                    "agentRuntimeName": f"bench-agent-{i}",
+                    "status": "READY",
+                }
+                for i in range(start, end)
+            ]
+        }
+        if end < self.config.agent_count:
+            response["nextToken"] = str(end)
+        return response
+
+
+class FakeStsClient:
+    """sts: fixed caller identity."""
+
+    def __init__(self, config, region_name):
+        self.meta = _Meta(region_name)
+
+    def get_caller_identity(self):
+        return {"Account": "123456789012", "Arn": "arn:aws:iam::123456789012:user/bench"}
+
+
+class FakeS3Client:
+    """s3: generated objects with ranged and conditional GETs."""
+
+    ETAG = '"bench-etag"'
+
+    def __init__(self, config, region_name):
+        self.config = config
+        self.meta = _Meta(region_name)
+        self.get_object_calls = 0
+        self.body_reads = 0
+        self.bytes_served = 0
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None, IfMatch=None):
+        self.get_object_calls += 1
+        time.sleep(self.config.s3_latency)
+        if IfNoneMatch == self.ETAG:
+            raise _FakeClientError("304", 304)
+        if IfMatch is not None and IfMatch != self.ETAG:
+            raise _FakeClientError("PreconditionFailed", 412)
+
+        size = self.config.s3_object_bytes
+        start, end = 0, size
+        response = {"ETag": self.ETAG}
+        if Range:
+            if size == 0:
+                raise _FakeClientError("InvalidRange", 416)
+            first, last = Range[len("bytes="):].split("-")
+            start, end = int(first), min(int(last) + 1, size)
+            response["ContentRange"] = f"bytes {start}-{end - 1}/{size}"
+        response["ContentLength"] = end - start
+        response["Body"] = PatternBody(start, end, on_read=self._count_read)
+        self.bytes_served += end - start
+        return response
+
+    def _count_read(self):
+        self.body_reads += 1
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600):
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+FAKE_CLIENTS = {
+    "bedrock-agentcore": FakeAgentCoreClient,
+    "bedrock-agentcore-control": FakeAgentCoreControlClient,
+    "sts": FakeStsClient,
+    "s3": FakeS3Client,
+}
+
+
+class FakeAws:
+    """Client factory handing out one fake client per (service, region)."""
+
+    def __init__(self, config=None):
+        self.config = config or FakeConfig()
+        self.clients = {}
+
+    def __call__(self, service_name, region_name):
+        key = (service_name, region_name)
+        if key not in self.clients:
+            if service_name not in FAKE_CLIENTS:
+                raise ValueError(f"No fake client for service {service_name}")
+            self.clients[key] = FAKE_CLIENTS[service_name](self.config, region_name)
+        return self.clients[key]
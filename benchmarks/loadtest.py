@@ -0,0 +1,321 @@
+"""Capacity curve: many simulated chat users against one app process.
+
+Every simulated user is an AppTest session of app/main.py on its own thread,
+so script runs of different sessions compete for the interpreter the way they
+do in a Streamlit server. The users follow a scripted conversation against the
+fake AgentCore backend in benchmarks/fakes.py. Replies have configurable size
+and latency, and one turn of the script asks for an S3-link-heavy reply.
+
+For each session count the run reports:
+- turn throughput
+- page load, rerun and turn latency
+- scheduler lag of a probe thread, a stand-in for event loop saturation
+- agent worker pool saturation
+- CPU use
+- RSS per session
+
+It also reports the largest session count whose rerun p95 stays within the SLO.
+
+Usage:
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --sessions 1,10,25,50 --turns 5 --output capacity.json
+    python -m benchmarks.loadtest --reply-words 2000 --first-byte-latency 1.0 --chunk-latency 0.02
+"""
+
+import argparse
+import gc
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+# One simulated user's conversation; the "files" turn gets a reply full of S3 links
+SCRIPT = (
+    "Hello, what can you help me with?",
+    "List the report files generated this quarter",
+    "Summarize the main findings",
+    "What should we look at next?",
+)
+LINK_KEYWORD = "files"
+
+# Interval of the lag probe; its oversleep is the scheduling delay under load
+PROBE_INTERVAL_SECONDS = 0.01
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+@contextmanager
+def _concurrent_app_tests():
+    """Let AppTest sessions run concurrently, sharing what a server shares.
+
+    AppTest installs its mock runtime as the process-wide Runtime singleton
+    for the length of a run and clears it at the end, which would pull it out
+    from under sessions still running; meanwhile every session sees the most
+    recently installed one. AppTest also compiles the script on every run,
+    where a server compiles it once into a shared script cache.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    original_instance = Runtime.__dict__["instance"]
+    original_exists = Runtime.__dict__["exists"]
+    latest = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            latest[:] = [cls._instance]
+        if not latest:
+            raise RuntimeError("Runtime hasn't been created!")
+        return latest[0]
+
+    def exists(cls):
+        return cls._instance is not None or bool(latest)
+
+    script_cache = ScriptCache()
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    try:
+        yield
+    finally:
+        Runtime.instance = original_instance
+        Runtime.exists = original_exists
+        app_test.ScriptCache = local_script_runner.ScriptCache = ScriptCache
+
+
+class _Probe:
+    """Samples scheduler lag, agent worker pool load and RSS on a background thread."""
+
+    def __init__(self):
+        self.lags = []
+        self.peak_active_workers = 0
+        self.peak_queued_invocations = 0
+        self.peak_rss_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="loadtest-probe", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        from app.services.agent_worker import agent_worker_stats
+        from benchmarks.run import rss_bytes
+
+        samples = 0
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            time.sleep(PROBE_INTERVAL_SECONDS)
+            self.lags.append(max(time.perf_counter() - started - PROBE_INTERVAL_SECONDS, 0.0))
+            workers = agent_worker_stats()
+            self.peak_active_workers = max(self.peak_active_workers, workers["active"])
+            self.peak_queued_invocations = max(self.peak_queued_invocations, workers["queued"])
+            samples += 1
+            if samples % 10 == 0:
+                self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes())
+
+
+def _simulate_user(turns, think_time, start, page_loads, reruns, turn_times, errors):
+    """One user: open the chat, then per turn type a prompt and interact with the page once."""
+    from benchmarks.run import make_app
+
+    def timed(action, samples):
+        started = time.perf_counter()
+        at = action()
+        samples.append(time.perf_counter() - started)
+        if at.exception:
+            errors.append(str(at.exception[0].value))
+
+    try:
+        at = make_app()
+        start.wait()
+        timed(at.run, page_loads)
+        for turn in range(turns):
+            time.sleep(think_time)
+            prompt = SCRIPT[turn % len(SCRIPT)]
+            timed(lambda: at.chat_input[0].set_value(prompt).run(), turn_times)
+            # Any widget interaction reruns the whole script
+            time.sleep(think_time)
+            timed(at.run, reruns)
+    except Exception as e:
+        errors.append(repr(e))
+
+
+def run_sessions(sessions, turns=3, think_time=0.5):
+    """Run concurrent simulated users through the scripted conversation and return load metrics."""
+    from app.services.agent_worker import agent_worker_stats
+    from benchmarks.run import rss_bytes
+
+    gc.collect()
+    rss_before = rss_bytes()
+    page_loads, reruns, turn_times, errors = [], [], [], []
+    start = threading.Event()
+    users = [
+        threading.Thread(
+            target=_simulate_user,
+            args=(turns, think_time, start, page_loads, reruns, turn_times, errors),
+            name=f"loadtest-user-{i}"
+        )
+        for i in range(sessions)
+    ]
+    for user in users:
+        user.start()
+    with _concurrent_app_tests(), _Probe() as probe:
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        start.set()
+        for user in users:
+            user.join()
+        elapsed = time.perf_counter() - started
+        cpu_seconds = time.process_time() - cpu_started
+    peak_rss = max(probe.peak_rss_bytes, rss_bytes())
+
+    return {
+        "sessions": sessions,
+        "turns_per_second": len(turn_times) / elapsed,
+        "reruns_per_second": (len(page_loads) + len(reruns) + len(turn_times)) / elapsed,
+        "page_load_seconds_p95": _percentile(page_loads, 0.95),
+        "rerun_seconds_p50": statistics.median(reruns) if reruns else 0.0,
+        "rerun_seconds_p95": _percentile(reruns, 0.95),
+        "turn_seconds_p50": statistics.median(turn_times) if turn_times else 0.0,
+        "turn_seconds_p95": _percentile(turn_times, 0.95),
+        "scheduler_lag_seconds_p95": _percentile(probe.lags, 0.95),
+        "scheduler_lag_seconds_max": max(probe.lags, default=0.0),
+        "peak_active_workers": probe.peak_active_workers,
+        "worker_pool_size": agent_worker_stats()["pool_size"],
+        "peak_queued_invocations": probe.peak_queued_invocations,
+        "cpu_cores_busy": cpu_seconds / elapsed,
+        "rss_peak_bytes": peak_rss,
+        "rss_per_session_bytes": max(peak_rss - rss_before, 0) / sessions,
+        "errors": len(errors),
+    }
+
+
+def capacity_curve(fake_aws, session_counts, turns=3, think_time=0.5, rerun_slo_seconds=1.0):
+    """Run the scripted load at each session count against fake_aws and return the curve.
+
+    fake_aws must already be installed as the client factory.
+    """
+    fake_aws.config.link_keyword = LINK_KEYWORD
+    if not fake_aws.config.reply_link_count:
+        fake_aws.config.reply_link_count = 20
+
+    # One-time imports and client setup stay out of the first point
+    run_sessions(1, turns=1, think_time=0.0)
+
+    curve = {}
+    within_slo = 0
+    for sessions in session_counts:
+        point = run_sessions(sessions, turns=turns, think_time=think_time)
+        curve[f"{sessions}_sessions"] = point
+        if point["rerun_seconds_p95"] <= rerun_slo_seconds and not point["errors"]:
+            within_slo = max(within_slo, sessions)
+    curve["rerun_slo_seconds"] = rerun_slo_seconds
+    curve["max_sessions_within_slo"] = within_slo
+    return curve
+
+
+def measure(fake_aws, quick=False):
+    """Capacity curve at the benchmark suite's default sizes."""
+    fake_aws.config.first_byte_latency = 0.3
+    fake_aws.config.chunk_latency = 0.005
+    if quick:
+        return capacity_curve(fake_aws, (1, 4, 8), turns=2, think_time=0.2)
+    return capacity_curve(fake_aws, (1, 5, 10, 20, 40), turns=3, think_time=0.5)
+
+
+def print_curve(curve):
+    columns = (
+        ("sessions", "sessions", "{:>8}"),
+        ("turns/s", "turns_per_second", "{:>8.2f}"),
+        ("load p95", "page_load_seconds_p95", "{:>8.3f}"),
+        ("rerun p50", "rerun_seconds_p50", "{:>9.3f}"),
+        ("rerun p95", "rerun_seconds_p95", "{:>9.3f}"),
+        ("turn p95", "turn_seconds_p95", "{:>8.3f}"),
+        ("lag p95", "scheduler_lag_seconds_p95", "{:>8.3f}"),
+        ("workers", "peak_active_workers", "{:>7}"),
+        ("queued", "peak_queued_invocations", "{:>6}"),
+        ("cpu", "cpu_cores_busy", "{:>5.2f}"),
+        ("MB/session", "rss_per_session_bytes", "{:>10.1f}"),
+        ("errors", "errors", "{:>6}"),
+    )
+    print("  ".join(f"{title:>{len(fmt.format(0))}}" for title, _key, fmt in columns))
+    for point in curve.values():
+        if not isinstance(point, dict):
+            continue
+        values = {**point, "rss_per_session_bytes": point["rss_per_session_bytes"] / (1024 * 1024)}
+        print("  ".join(fmt.format(values[key]) for _title, key, fmt in columns))
+    print()
+    print(f"Sessions within a {curve['rerun_slo_seconds']:.2f}s rerun p95: {curve['max_sessions_within_slo']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,5,10,20,40", help="Comma-separated concurrent session counts")
+    parser.add_argument("--turns", type=int, default=3, help="Chat turns per simulated user")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Seconds a user waits between actions")
+    parser.add_argument("--rerun-slo", type=float, default=1.0, help="Rerun p95 target in seconds")
+    parser.add_argument("--reply-words", type=int, default=200, help="Words per agent reply")
+    parser.add_argument("--reply-links", type=int, default=20, help="S3 links in the link-heavy reply")
+    parser.add_argument("--reply-format", default="sse", choices=("sse", "ndjson", "json", "text"))
+    parser.add_argument("--first-byte-latency", type=float, default=0.3, help="Agent seconds to first byte")
+    parser.add_argument("--chunk-latency", type=float, default=0.005, help="Agent seconds between chunks")
+    parser.add_argument("--output", help="Write the curve as JSON to this path")
+    args = parser.parse_args(argv)
+
+    from streamlit.logger import set_log_level
+    from app.core.aws_client import set_client_factory
+    from app.core.conversation_store import SQLiteConversationStore, set_conversation_store
+    from benchmarks.fakes import FakeAws, FakeConfig
+
+    # Bare-mode warnings and per-observation metric logs drown the report
+    set_log_level("error")
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    logging.getLogger("app.core.metrics").setLevel(logging.WARNING)
+
+    fake_aws = FakeAws(FakeConfig(
+        reply_words=args.reply_words,
+        reply_link_count=args.reply_links,
+        reply_format=args.reply_format,
+        first_byte_latency=args.first_byte_latency,
+        chunk_latency=args.chunk_latency,
+    ))
+    session_counts = [int(count) for count in args.sessions.split(",") if count.strip()]
+    with tempfile.TemporaryDirectory() as store_dir:
+        set_conversation_store(SQLiteConversationStore(str(Path(store_dir) / "conversations.db")))
+        set_client_factory(fake_aws)
+        try:
+            curve = capacity_curve(fake_aws, session_counts, args.turns, args.think_time, args.rerun_slo)
+        finally:
+            set_client_factory(None)
+            set_conversation_store(None)
+
+    print_curve(curve)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(curve, indent=2))
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,898 @@
+"""Offline benchmark suite for the chat app.
+
+Drives the real app/main.py through Streamlit's AppTest harness with local
+stand-ins for AgentCore, STS and S3 injected via the client pool, and writes
+the results as JSON that can be compared against a saved baseline.
+
+Usage:
+    python -m benchmarks.run
+    python -m benchmarks.run --scenarios rerun_history,time_to_first_token
+    python -m benchmarks.run --save-baseline benchmarks/results/baseline.json
+    python -m benchmarks.run --baseline benchmarks/results/baseline.json
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from streamlit.logger import set_log_level
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.element_tree import Block
+
+from app.core import agent_discovery
+from app.core.aws_client import set_client_factory
+from app.core.conversation_store import SQLiteConversationStore, get_conversation_store, set_conversation_store
+from app.core.session_memory import get_session_accountant
+from app.core.session_state import SESSION_QUERY_PARAM, new_session_id
+from app.core.metrics import metrics
+from app.core.rate_limiter import RateLimiter
+from app.services.admission import AdaptiveConcurrencyLimiter, AdmissionLease, get_agent_limiter
+from app.services.agent_warmup import get_agent_warmer
+from app.services.response_cache import ResponseLayer, ResponseStore, get_response_layer, set_response_layer
+from app.services import s3_handler
+from app.services.s3_cache import S3ObjectCache, get_object_cache, object_digest, set_object_cache
+from app.services.streaming import (
+    extract_assistant_message,
+    iter_response_text,
+    recover_response_text,
+    stream_agent_response,
+)
+from app.ui.streaming_placeholder import ThrottledMarkdown
+from benchmarks import loadtest, startup
+from benchmarks.fakes import FakeAws, FakeConfig, FakeStreamingBody, build_reply, encode_reply
+
+APP_PATH = PROJECT_ROOT / "app" / "main.py"
+DEFAULT_OUTPUT = PROJECT_ROOT / "benchmarks" / "results" / "latest.json"
+AGENT_ARN = "arn:aws:bedrock-agentcore:us-east-1:123456789012:runtime/bench-agent-0"
+CALLER_ARN = "arn:aws:iam::123456789012:user/bench"
+
+# Metric name suffixes where a larger value is an improvement
+HIGHER_IS_BETTER = ("_per_second", "_within_slo")
+
+
+class CountingPlaceholder:
+    """Stand-in for st.empty() that counts repaints and bytes sent."""
+
+    def __init__(self):
+        self.repaints = 0
+        self.bytes_sent = 0
+        self.text = ""
+
+    def markdown(self, text):
+        self.repaints += 1
+        self.bytes_sent += len(text.encode("utf-8"))
+        self.text = text
+
+
+def make_app(messages=None, timeout=120):
+    """Return an AppTest for app/main.py with credentials already configured."""
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    at.session_state["aws_access_key_id"] = "AKIABENCHMARK"
+    at.session_state["aws_secret_access_key"] = "bench-secret"
+    at.session_state["aws_account_id"] = "123456789012"
+    at.session_state["aws_caller_arn"] = CALLER_ARN
+    at.session_state["credentials_configured"] = True
+    at.session_state["agent_arn"] = AGENT_ARN
+    if messages:
+        # Open a stored conversation the way a reload of its URL would
+        session_id = new_session_id()
+        store = get_conversation_store()
+        store.claim(session_id, CALLER_ARN)
+        for message in messages:
+            store.append(session_id, message)
+        at.query_params[SESSION_QUERY_PARAM] = session_id
+    return at
+
+
+def make_history(turns, link_every=10):
+    """Return a conversation of the given number of user/assistant turns."""
+    messages = []
+    for turn in range(turns):
+        messages.append({"id": uuid.uuid4().hex, "role": "user", "content": f"Question {turn}?"})
+        reply = build_reply(60, link_count=1 if turn % link_every == 0 else 0)
+        messages.append({"id": uuid.uuid4().hex, "role": "assistant", "content": reply})
+    return messages
+
+
+def rss_bytes():
+    """Resident set size of this process (Linux), or 0 where unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def count_elements(at):
+    """Count rendered elements (not containers) in the main area and sidebar."""
+    return sum(
+        1 for root in (at.main, at.sidebar) for node in root if not isinstance(node, Block)
+    )
+
+
+def count_stylesheets(at):
+    """Count <style> blocks on the page, including the event container."""
+    return sum(
+        1 for root in at._tree.children.values() for node in root
+        if not isinstance(node, Block) and "<style" in str(getattr(node, "proto", ""))
+    )
+
+
+def timed_runs(at, repeats):
+    """Run the app repeatedly and return the per-run wall times."""
+    durations = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        at.run()
+        durations.append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(f"App raised: {at.exception[0].value}")
+    return durations
+
+
+# Largest allowed rerun time of the longest history over the shortest one
+RERUN_GROWTH_LIMIT = 3.0
+
+
+def bench_rerun_history(fake_aws, quick=False):
+    """Rerun time as the conversation grows.
+
+    Fails if the longest history renders more elements than the second
+    size, whose history already fills the rendered window, or if its rerun
+    takes over RERUN_GROWTH_LIMIT times that of the shortest.
+    """
+    fake_aws.config.s3_latency = 0.0
+    sizes = (10, 100, 1000) if quick else (10, 100, 1000, 5000)
+    results = {}
+    for turns in sizes:
+        at = make_app(make_history(turns))
+        at.run()  # warm up caches
+        durations = timed_runs(at, 3 if quick else 10)
+        results[str(turns)] = {
+            "median_seconds": statistics.median(durations),
+            "elements": count_elements(at),
+        }
+    shortest, windowed, longest = (results[str(turns)] for turns in (sizes[0], sizes[1], sizes[-1]))
+    if longest["elements"] > windowed["elements"]:
+        raise RuntimeError(
+            f"{sizes[-1]} turns render {longest['elements']} elements, {sizes[1]} turns {windowed['elements']}"
+        )
+    growth = longest["median_seconds"] / shortest["median_seconds"]
+    if growth > RERUN_GROWTH_LIMIT:
+        raise RuntimeError(f"Rerun time grows {growth:.1f}x from {sizes[0]} to {sizes[-1]} turns")
+    return results
+
+
+# Per-word delay the replay of a fully read reply used to add
+REPLAY_WORD_DELAY_SECONDS = 0.02
+
+
+def bench_time_to_first_token(fake_aws, quick=False):
+    """Time to first token and total reply time per response format.
+
+    Fails if a streamed format's first token waits for most of the reply, or
+    if a single JSON document is replayed with a per-word delay.
+    """
+    results = {}
+    for reply_format in ("sse", "ndjson", "json"):
+        fake_aws.config.reply_format = reply_format
+        fake_aws.config.reply_words = 500
+        fake_aws.config.chunk_latency = 0.001
+        client = fake_aws("bedrock-agentcore", "us-east-1")
+        samples = []
+        for _ in range(2 if quick else 5):
+            stats = {}
+            for _chunk in stream_agent_response(AGENT_ARN, "s" * 40, "hi", "us-east-1", stats=stats, client=client):
+                pass
+            samples.append(stats)
+        first_token = statistics.median(s["first_token_seconds"] for s in samples)
+        total = statistics.median(s["total_seconds"] for s in samples)
+        if reply_format != "json" and first_token > total / 2:
+            raise RuntimeError(
+                f"{reply_format} first token after {first_token:.3f}s of a {total:.3f}s reply; the body is not streamed"
+            )
+        if total > fake_aws.config.reply_words * REPLAY_WORD_DELAY_SECONDS / 4:
+            raise RuntimeError(f"{reply_format} reply took {total:.3f}s; text is replayed with a delay")
+        results[reply_format] = {"first_token_seconds": first_token, "total_seconds": total}
+
+    # Full chat turn through the app, from prompt submit to rendered reply
+    fake_aws.config.reply_format = "sse"
+    at = make_app()
+    at.run()
+    started = time.perf_counter()
+    at.chat_input[0].set_value("Hello").run()
+    results["app_turn_seconds"] = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(f"App raised: {at.exception[0].value}")
+    return results
+
+
+def random_json_reply(rng, text):
+    """Return a JSON reply with the assistant text fields in random order and of random types."""
+    result = []
+    if rng.random() < 0.7:
+        result.append(("response", rng.choice([text, 42, None, {"text": text}])))
+    if rng.random() < 0.8:
+        result.append(("messages", ["Question?", [rng.choice([text, "draft \\ ☃", 7]), "tool"], "end"]))
+    if rng.random() < 0.5:
+        result.append(("metadata", {"response": "nested", "messages": [0, ["nested"]]}))
+    rng.shuffle(result)
+    document = [("result", dict(result)), ("id", "reply")]
+    rng.shuffle(document)
+    return dict(document)
+
+
+def bench_json_key_order(fake_aws, quick=False):
+    """Time to first token of single-document JSON replies per key order, checked against a full parse.
+
+    Fails if the streamed text of any reply, including randomly ordered ones
+    split at random chunk boundaries, differs from extract_assistant_message.
+    """
+    text = build_reply(2000)
+    shapes = {
+        "response_first": {"result": {"response": text, "messages": ["Question?", ["draft"]]}},
+        "messages_first": {"result": {"messages": ["Question?", ["draft"]], "response": text}},
+        "messages_only": {"result": {"messages": ["Question?", [text]]}},
+    }
+    results = {}
+    for name, document in shapes.items():
+        body = FakeStreamingBody(json.dumps(document).encode("utf-8"), chunk_bytes=256, chunk_latency=0.001)
+        stats = {}
+        streamed = "".join(iter_response_text(body, "application/json", stats=stats))
+        if streamed != extract_assistant_message(document):
+            raise RuntimeError(f"Streamed text of the {name} reply differs from a full parse")
+        results[name] = {
+            "first_token_seconds": stats["first_token_seconds"],
+            "total_seconds": stats["total_seconds"],
+        }
+
+    rng = random.Random(0)
+    documents = 300 if quick else 3000
+    for _ in range(documents):
+        document = random_json_reply(rng, "Final \"answer\" é 😀 " * rng.randint(1, 20))
+        data = json.dumps(document, ensure_ascii=rng.random() < 0.5).encode("utf-8")
+        pieces = list(iter_response_text(FakeStreamingBody(data, chunk_bytes=rng.randint(1, 64)), "application/json"))
+        expected = extract_assistant_message(document)
+        if isinstance(expected, str):
+            matches = "".join(pieces) == expected
+        else:
+            # Non-text fields are only found by the full parse that follows the body
+            matches = pieces == ([expected] if expected else [])
+        if not matches:
+            raise RuntimeError(f"Streamed text differs from a full parse for {data[:200]!r}")
+    results["key_order_documents_checked"] = documents
+    return results
+
+
+def bench_stream_throughput(fake_aws, quick=False):
+    """Repaint count, bytes sent and CPU per streamed reply, throttled vs per-chunk.
+
+    per_chunk repaints the whole reply after every chunk, as before the
+    throttle. Fails unless the throttle repaints less, sends fewer bytes and
+    ends on the complete reply.
+    """
+    words = 2000 if quick else 10000
+    chunks = [f"word{i} " for i in range(words)]
+
+    naive = CountingPlaceholder()
+    cpu_started = time.process_time()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        naive.markdown(text + "▌")
+    naive_cpu = time.process_time() - cpu_started
+
+    throttled = CountingPlaceholder()
+    cpu_started = time.process_time()
+    renderer = ThrottledMarkdown(throttled)
+    for chunk in chunks:
+        renderer.append(chunk)
+    renderer.flush()
+    throttled_cpu = time.process_time() - cpu_started
+
+    if throttled.text != "".join(chunks):
+        raise RuntimeError("Throttled rendering did not end on the complete reply")
+    if throttled.repaints >= naive.repaints or throttled.bytes_sent >= naive.bytes_sent:
+        raise RuntimeError(
+            f"Throttled rendering sent {throttled.repaints} repaints / {throttled.bytes_sent} bytes, "
+            f"per-chunk {naive.repaints} / {naive.bytes_sent}"
+        )
+    return {
+        "words": words,
+        "per_chunk": {"repaints": naive.repaints, "bytes_sent": naive.bytes_sent, "cpu_seconds": naive_cpu},
+        "throttled": {"repaints": throttled.repaints, "bytes_sent": throttled.bytes_sent, "cpu_seconds": throttled_cpu},
+    }
+
+
+# Longest allowed time to tokenize a reply with a 4000-character hyphenated host
+PATHOLOGICAL_HOST_SECONDS = 0.1
+
+
+def s3_reads(fake_aws):
+    """Return (get_object calls, body reads) across every fake S3 client so far."""
+    clients = [client for (service, _region), client in fake_aws.clients.items() if service == "s3"]
+    return sum(client.get_object_calls for client in clients), sum(client.body_reads for client in clients)
+
+
+def bench_s3_links(fake_aws, quick=False):
+    """Render time, element count and stylesheets of a reply with many S3 links, per download mode.
+
+    Fails if presigned mode calls get_object or reads an object body, or if
+    tokenizing a reply with a hyphen-heavy host after ".s3" exceeds
+    PATHOLOGICAL_HOST_SECONDS.
+    """
+    fake_aws.config.s3_latency = 0.02
+    link_counts = (1, 10, 50) if quick else (1, 10, 50, 200)
+    modes = (("presigned", False), ("proxy", False), ("proxy", True))
+    original = (s3_handler.S3_DOWNLOAD_MODE, s3_handler.S3_PREFETCH_LINKS)
+    empty_page = make_app()
+    empty_page.run()
+    page_elements = count_elements(empty_page)
+    results = {}
+    try:
+        for mode, prefetch in modes:
+            s3_handler.S3_DOWNLOAD_MODE = mode
+            s3_handler.S3_PREFETCH_LINKS = prefetch
+            label = f"{mode}+prefetch" if prefetch else mode
+            results[label] = {}
+            for links in link_counts:
+                reply = build_reply(50, link_count=links)
+                # Unique keys so every run starts with an empty object cache
+                reply = reply.replace("report-", f"report-{uuid.uuid4().hex[:8]}-")
+                messages = [{"id": uuid.uuid4().hex, "role": "assistant", "content": reply}]
+                at = make_app(messages)
+                reads_before = s3_reads(fake_aws)
+                first_run = timed_runs(at, 1)[0]
+                renders = render_message_stats()
+                rerun = statistics.median(timed_runs(at, 3))
+                render_count, render_seconds = (now - before for now, before in zip(render_message_stats(), renders))
+                get_object_calls, body_reads = (now - before for now, before in zip(s3_reads(fake_aws), reads_before))
+                if mode == "presigned" and (get_object_calls or body_reads):
+                    raise RuntimeError(
+                        f"Presigned links fetched object bytes: {get_object_calls} get_object calls, "
+                        f"{body_reads} body reads"
+                    )
+                results[label][str(links)] = {
+                    "first_render_seconds": first_run,
+                    "rerun_seconds": rerun,
+                    "elements": count_elements(at),
+                    "message_elements": count_elements(at) - page_elements,
+                    "stylesheets": count_stylesheets(at),
+                    "message_render_seconds": render_seconds / render_count if render_count else 0.0,
+                    "get_object_calls": get_object_calls,
+                }
+    finally:
+        s3_handler.S3_DOWNLOAD_MODE, s3_handler.S3_PREFETCH_LINKS = original
+
+    # Nested quantifiers in the host pattern made this take seconds at 24 hyphens
+    pathological = "see https://b.s3" + "-a" * 2000 + "x.example.com/k done"
+    started = time.perf_counter()
+    s3_handler.tokenize_message(pathological)
+    results["pathological_host_seconds"] = time.perf_counter() - started
+    if results["pathological_host_seconds"] > PATHOLOGICAL_HOST_SECONDS:
+        raise RuntimeError(
+            f"Tokenizing a hyphen-heavy S3 host took {results['pathological_host_seconds']:.2f}s"
+        )
+    return results
+
+
+def render_message_stats():
+    """Return (count, total seconds) of render_message_seconds observations so far."""
+    for histogram in metrics.snapshot()["histograms"]:
+        if histogram["name"] == "render_message_seconds":
+            return histogram["count"], histogram["sum"]
+    return 0, 0.0
+
+
+def bench_peak_memory(fake_aws, quick=False):
+    """Peak Python heap while downloading a large object, rerunning with its download button and a long chat.
+
+    Fails unless a proxied link renders as one download button that fetches
+    nothing on rerun.
+    """
+    results = {}
+    object_bytes = (64 if quick else 256) * 1024 * 1024
+    fake_aws.config.s3_latency = 0.0
+    fake_aws.config.s3_object_bytes = object_bytes
+    s3_client = fake_aws("s3", "us-east-1")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = S3ObjectCache(cache_dir=cache_dir)
+        gc.collect()
+        tracemalloc.start()
+        cache.fetch(s3_client, "bench-bucket", "exports/large.bin")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    results["large_object_download"] = {"object_bytes": object_bytes, "peak_bytes": peak}
+
+    # A session that fetched the object reruns with its download button on the page
+    configured = (get_object_cache(), s3_handler.S3_DOWNLOAD_MODE)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        set_object_cache(S3ObjectCache(cache_dir=cache_dir))
+        s3_handler.S3_DOWNLOAD_MODE = "proxy"
+        try:
+            reply = "The export is ready: [large.bin](s3://bench-bucket/exports/large.bin)"
+            get_object_cache().fetch(s3_client, "bench-bucket", "exports/large.bin")
+            at = make_app([{"id": uuid.uuid4().hex, "role": "assistant", "content": reply}])
+            at.session_state["s3_downloads"] = {object_digest("bench-bucket", "exports/large.bin"): time.time()}
+            at.run()
+            fetches = s3_reads(fake_aws)[0]
+            gc.collect()
+            tracemalloc.start()
+            timed_runs(at, 3)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            buttons = len(at.get("download_button"))
+            rerun_fetches = s3_reads(fake_aws)[0] - fetches
+            del at
+        finally:
+            set_object_cache(configured[0])
+            s3_handler.S3_DOWNLOAD_MODE = configured[1]
+    results["proxied_download_rerun"] = {"object_bytes": object_bytes, "peak_bytes": peak, "download_buttons": buttons}
+    if buttons != 1 or rerun_fetches:
+        raise RuntimeError(
+            f"proxied link rendered {buttons} download buttons and fetched {rerun_fetches} objects "
+            "on rerun; expected one button that fetches on click"
+        )
+
+    at = make_app(make_history(500 if quick else 2000))
+    at.run()
+    gc.collect()
+    tracemalloc.start()
+    at.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["long_chat_rerun"] = {"peak_bytes": peak}
+    return results
+
+
+def bench_session_memory(fake_aws, quick=False):
+    """RSS and accounted bytes as many sessions with heavy chats stay open, with and without budgets."""
+    sessions = 15 if quick else 40
+    # 100 replies of about 60 KB each fill a session's in-memory history window
+    heavy_history = [
+        {"id": uuid.uuid4().hex, "role": "assistant", "content": build_reply(8000) + f" #{turn}"}
+        for turn in range(100)
+    ]
+    accountant = get_session_accountant()
+    defaults = (accountant.session_budget_bytes, accountant.global_budget_bytes, accountant.idle_ttl_seconds)
+    # Budgeted first: freed heap is reused rather than returned to the OS,
+    # so a run after the unbounded one would start with room to spare
+    budgets = {
+        "budgeted": (2 * 1024 * 1024, 16 * 1024 * 1024),
+        "unbounded": (1 << 40, 1 << 40),
+    }
+    results = {}
+    try:
+        for mode, (session_budget, global_budget) in budgets.items():
+            accountant.session_budget_bytes = session_budget
+            accountant.global_budget_bytes = global_budget
+            accountant.idle_ttl_seconds = 3600
+            with accountant._lock:
+                accountant._sessions.clear()
+            released_before = accountant.released_sessions
+            gc.collect()
+            rss_before = rss_bytes()
+            open_sessions = []
+            for _ in range(sessions):
+                at = make_app(heavy_history)
+                at.run()
+                # Keep the session state, as the server does, but not the
+                # rendered page, which a real server sends to the browser
+                open_sessions.append(at.session_state)
+                del at
+            gc.collect()
+            stats = accountant.stats()
+            rss_open = rss_bytes()
+
+            # An hour later, a new session's rerun releases every idle one
+            accountant.track("benchmark-late-session", {}, now=time.time() + 3601)
+            gc.collect()
+            released_history = sum(state["messages"].memory_messages for state in open_sessions)
+            results[mode] = {
+                "sessions": sessions,
+                "accounted_bytes": stats["bytes"],
+                "largest_session_bytes": stats["largest_session_bytes"],
+                "rss_growth_bytes": rss_open - rss_before,
+                "rss_growth_per_session_bytes": (rss_open - rss_before) / sessions,
+                "accounted_bytes_after_idle_release": accountant.stats()["bytes"],
+                "released_sessions": accountant.released_sessions - released_before,
+                "messages_in_memory_after_idle_release": released_history,
+            }
+            del open_sessions
+    finally:
+        accountant.session_budget_bytes, accountant.global_budget_bytes, accountant.idle_ttl_seconds = defaults
+        with accountant._lock:
+            accountant._sessions.clear()
+    return results
+
+
+def bench_agent_warmup(fake_aws, quick=False):
+    """First-turn time of new conversations against a runtime with cold starts, with and without warm-up.
+
+    Fails if a warm-up call is sent without being admitted by the agent's
+    admission limiter.
+    """
+    fake_aws.config.cold_start_latency = 0.5 if quick else 1.5
+    fake_aws.config.reply_words = 50
+    # The user reads the page before sending the first message
+    think_time = fake_aws.config.cold_start_latency + 0.2
+    client = fake_aws("bedrock-agentcore", "us-east-1")
+    limiter = get_agent_limiter("123456789012", AGENT_ARN)
+    warmer = get_agent_warmer()
+    defaults = (warmer.warmup_enabled, warmer.keepalive_enabled, warmer.rate_limiter)
+    # One warm-up per new conversation; the production cap would skip some
+    warmer.rate_limiter = RateLimiter(0)
+    results = {}
+    try:
+        for mode in ("cold", "warmed"):
+            warmer.warmup_enabled = mode == "warmed"
+            warmer.keepalive_enabled = False
+            cold_starts, warmups, admitted = client.cold_starts, client.warmups, limiter.stats()["admitted"]
+            samples = []
+            for _ in range(2 if quick else 5):
+                at = make_app()
+                at.run()
+                time.sleep(think_time)
+                started = time.perf_counter()
+                at.chat_input[0].set_value("Hello").run()
+                samples.append(time.perf_counter() - started)
+                if at.exception:
+                    raise RuntimeError(f"App raised: {at.exception[0].value}")
+            results[mode] = {
+                "first_turn_seconds": statistics.median(samples),
+                "cold_starts": client.cold_starts - cold_starts,
+            }
+            calls = len(samples) + client.warmups - warmups
+            admitted = limiter.stats()["admitted"] - admitted
+            if admitted < calls:
+                raise RuntimeError(f"{mode}: {calls} agent calls sent but only {admitted} admitted")
+    finally:
+        warmer.warmup_enabled, warmer.keepalive_enabled, warmer.rate_limiter = defaults
+    results["warmup_calls"] = client.warmups
+
+    # Time to first token of first turns as recorded by the app, per session warmth
+    for histogram in metrics.snapshot()["histograms"]:
+        if histogram["name"] == "agent_first_turn_seconds" and histogram["labels"].get("agent_arn") == AGENT_ARN:
+            results[f"{histogram['labels']['session']}_first_token_p50_seconds"] = histogram["p50"]
+    return results
+
+
+def bench_agent_discovery(fake_aws, quick=False):
+    """Discovery wall time, first paint and time until the sidebar lists agents, in one region and in four."""
+    region_latency = {"us-east-1": 0.3, "us-west-2": 0.2, "eu-central-1": 0.4, "ap-southeast-2": 0.5}
+    fake_aws.config.region_latency = region_latency
+    configured_regions = agent_discovery.AGENT_DISCOVERY_REGIONS
+    results = {"sequential_estimate_seconds": sum(region_latency.values())}
+    try:
+        for mode, regions in (("one_region", ()), ("four_regions", tuple(region_latency))):
+            agent_discovery.AGENT_DISCOVERY_REGIONS = regions
+            samples, listed = [], []
+            for _ in range(2 if quick else 5):
+                agent_discovery.invalidate_available_agents()
+                at = make_app()
+                started = time.perf_counter()
+                at.run()
+                samples.append(time.perf_counter() - started)
+                # Discovery runs in the background; the page's poll reruns it
+                while not at.session_state["available_agents"]:
+                    time.sleep(0.05)
+                    at.run()
+                listed.append(time.perf_counter() - started)
+                if at.exception:
+                    raise RuntimeError(f"App raised: {at.exception[0].value}")
+            results[f"{mode}_first_run_seconds"] = statistics.median(samples)
+            results[f"{mode}_agents_listed_seconds"] = statistics.median(listed)
+        for histogram in metrics.snapshot()["histograms"]:
+            if histogram["name"] == "agent_discovery_seconds":
+                results[f"discovery_seconds_{histogram['labels']['regions']}_regions"] = histogram["p50"]
+        agents = at.session_state["available_agents"]
+        # Every fake region has the same agent names; each should resolve to the fastest
+        results["agents"] = len(agents)
+        results["agents_in_fastest_region"] = sum(agent["region"] == "us-west-2" for agent in agents)
+    finally:
+        agent_discovery.AGENT_DISCOVERY_REGIONS = configured_regions
+        agent_discovery.invalidate_available_agents()
+    return results
+
+
+def bench_response_cache(fake_aws, quick=False):
+    """Turn time and agent invocations live, recording, replaying a cassette and answering from the cache."""
+    fake_aws.config.first_byte_latency = 0.3
+    fake_aws.config.chunk_latency = 0.005
+    client = fake_aws("bedrock-agentcore", "us-east-1")
+    configured_layer = get_response_layer()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cassette = ResponseStore(os.path.join(tmp_dir, "cassette"))
+        cache = ResponseStore(os.path.join(tmp_dir, "cache"), max_bytes=64 * 1024 * 1024, ttl_seconds=3600)
+        modes = (
+            ("live", "live", 1.0),
+            ("record", "record", 1.0),
+            ("replay_1x", "replay", 1.0),
+            ("replay_10x", "replay", 10.0),
+            ("replay_instant", "replay", 0.0),
+            ("cache", "cache", 0.0),
+        )
+        try:
+            for name, mode, speed in modes:
+                set_response_layer(ResponseLayer(mode, cache=cache, cassette=cassette, replay_speed=speed))
+                invocations = client.invocations
+                samples = []
+                for _ in range(3 if quick else 10):
+                    # Every turn opens a new conversation with the same prompt
+                    at = make_app()
+                    at.run()
+                    started = time.perf_counter()
+                    at.chat_input[0].set_value("Summarize the quarterly report").run()
+                    samples.append(time.perf_counter() - started)
+                    if at.exception:
+                        raise RuntimeError(f"App raised: {at.exception[0].value}")
+                results[name] = {
+                    "turn_seconds_p50": statistics.median(samples),
+                    "agent_invocations": client.invocations - invocations,
+                }
+        finally:
+            set_response_layer(configured_layer)
+    return results
+
+
+def bench_invoke_failures(fake_aws, quick=False):
+    """Agent invocations and reply text when the invoke call or the reply stream fails.
+
+    Fails unless every transient invoke failure is retried once and still
+    yields the full reply, a validation error is not retried, and a reply
+    whose stream breaks is never re-invoked: the text is recovered from the
+    raw body received so far, as the chat does.
+    """
+    overrides = {"reply_words": 50, "first_byte_latency": 0.0}
+    data, content_type = encode_reply(build_reply(overrides["reply_words"]), FakeConfig().reply_format)
+    full_text = recover_response_text(data, content_type)
+    cases = {
+        "status_500": {"fail_times": 1, "fail_status": 500},
+        "status_503": {"fail_times": 1, "fail_status": 503},
+        "throttled": {"fail_times": 1, "fail_status": 429},
+        "connection_reset": {"fail_times": 1, "fail_connection": "reset"},
+        "http_client_error": {"fail_times": 1, "fail_connection": "http"},
+        "validation_error": {"fail_times": 1, "fail_status": 400},
+        "reset_after_reply": {"reset_after_bytes": len(data)},
+        "reset_midway": {"reset_after_bytes": len(data) // 2},
+    }
+    results = {}
+    for name, failure in cases.items():
+        client = FakeAws(FakeConfig(**overrides, **failure))("bedrock-agentcore", "us-east-1")
+        raw_body = bytearray()
+        parts = []
+        error = None
+        try:
+            for chunk in stream_agent_response(AGENT_ARN, "s" * 40, "hi", "us-east-1", client=client,
+                                               raw_body=raw_body):
+                parts.append(chunk)
+        except Exception as e:
+            error = e
+        text = "".join(parts)
+        if error is not None and raw_body:
+            text = recover_response_text(raw_body, content_type)
+
+        if name == "validation_error":
+            expected = (1, False, "")
+        elif name == "reset_midway":
+            expected = (1, False, recover_response_text(data[:len(data) // 2], content_type))
+        elif name == "reset_after_reply":
+            expected = (1, False, full_text)
+        else:
+            expected = (2, True, full_text)
+        outcome = (client.invocations, error is None, text)
+        if outcome != expected:
+            raise RuntimeError(
+                f"{name}: {client.invocations} invocations, error {error!r}, "
+                f"{len(text)} of {len(expected[2])} expected characters"
+            )
+        results[name] = {"invocations": client.invocations}
+    return results
+
+
+def bench_admission_control(fake_aws, quick=False):
+    """Goodput and error rate of a burst against an agent that throttles above a set concurrency.
+
+    The burst overloads the agent enough that retries alone cannot absorb it.
+    Fails unless admission control lowers the error rate of the unlimited
+    baseline without lowering its goodput.
+    """
+    fake_aws.config.max_concurrency = 4
+    fake_aws.config.first_byte_latency = 0.2
+    fake_aws.config.reply_words = 50
+    sessions = 32 if quick else 64
+    calls_per_session = 2 if quick else 4
+
+    def burst(limiter):
+        client = FakeAws(fake_aws.config)("bedrock-agentcore", "us-east-1")
+        outcomes = []
+
+        def session(session_key):
+            for _ in range(calls_per_session):
+                lease = AdmissionLease(limiter, session_key) if limiter is not None else None
+                try:
+                    for _chunk in stream_agent_response(AGENT_ARN, "s" * 40, "hi", "us-east-1",
+                                                        client=client, lease=lease):
+                        pass
+                    outcomes.append(True)
+                except Exception:
+                    outcomes.append(False)
+
+        threads = [threading.Thread(target=session, args=(f"session-{i}",)) for i in range(sessions)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        succeeded = sum(outcomes)
+        return {
+            "goodput_per_second": succeeded / elapsed,
+            "error_rate": 1 - succeeded / len(outcomes),
+            "throttled_calls": client.throttled,
+            "elapsed_seconds": elapsed,
+        }
+
+    results = {
+        "unlimited": burst(None),
+        "admission": burst(AdaptiveConcurrencyLimiter(initial_limit=8)),
+    }
+    unlimited, admission = results["unlimited"], results["admission"]
+    if admission["error_rate"] >= unlimited["error_rate"]:
+        raise RuntimeError(
+            f"Error rate with admission control is {admission['error_rate']:.0%}, "
+            f"{unlimited['error_rate']:.0%} without"
+        )
+    if admission["goodput_per_second"] < unlimited["goodput_per_second"]:
+        raise RuntimeError(
+            f"Goodput with admission control is {admission['goodput_per_second']:.1f}/s, "
+            f"{unlimited['goodput_per_second']:.1f}/s without"
+        )
+    return results
+
+
+def bench_capacity(fake_aws, quick=False):
+    """Throughput, rerun latency, saturation and RSS as concurrent simulated users grow."""
+    return loadtest.measure(fake_aws, quick=quick)
+
+
+def bench_cold_start(fake_aws, quick=False):
+    """Import time and time to first render of each page in a fresh interpreter."""
+    return startup.measure(quick=quick)
+
+
+SCENARIOS = {
+    "rerun_history": bench_rerun_history,
+    "time_to_first_token": bench_time_to_first_token,
+    "json_key_order": bench_json_key_order,
+    "stream_throughput": bench_stream_throughput,
+    "s3_links": bench_s3_links,
+    "peak_memory": bench_peak_memory,
+    "session_memory": bench_session_memory,
+    "invoke_failures": bench_invoke_failures,
+    "admission_control": bench_admission_control,
+    "agent_warmup": bench_agent_warmup,
+    "agent_discovery": bench_agent_discovery,
+    "response_cache": bench_response_cache,
+    "capacity": bench_capacity,
+    "cold_start": bench_cold_start,
+}
+
+
+def flatten(results, prefix=""):
+    """Flatten nested results into {"a.b.c": number}."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Return (metric, baseline, current, change) rows that regressed beyond tolerance.
+
+    Metrics ending in "_per_second" or "_within_slo" are higher-is-better;
+    every other metric (seconds, bytes, repaints, error rates) is lower-is-better.
+    """
+    current = flatten(results["scenarios"])
+    previous = flatten(baseline["scenarios"])
+    regressions = []
+    for metric, value in sorted(current.items()):
+        before = previous.get(metric)
+        if not before:
+            continue
+        change = (value - before) / before
+        if metric.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append((metric, before, value, change))
+    return regressions
+
+
+def run(scenarios, quick=False):
+    """Run the selected scenarios against fresh fakes and return the results."""
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "scenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as store_dir:
+        set_conversation_store(SQLiteConversationStore(str(Path(store_dir) / "conversations.db")))
+        for name in scenarios:
+            fake_aws = FakeAws(FakeConfig())
+            set_client_factory(fake_aws)
+            try:
+                started = time.perf_counter()
+                results["scenarios"][name] = SCENARIOS[name](fake_aws, quick=quick)
+                print(f"{name}: done in {time.perf_counter() - started:.1f}s")
+            finally:
+                set_client_factory(None)
+        set_conversation_store(None)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="Comma-separated scenarios to run")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes and fewer repeats")
+    parser.add_argument("--output", default=str(DEFAULT_OUTPUT), help="Where to write results JSON")
+    parser.add_argument("--baseline", help="Baseline results JSON to compare against")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline path")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown before a metric counts as a regression")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    # Bare-mode warnings and per-observation metric logs drown the report
+    set_log_level("error")
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+    logging.getLogger("app.core.metrics").setLevel(logging.WARNING)
+
+    results = run(scenarios, quick=args.quick)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        for metric, before, after, change in regressions:
+            print(f"REGRESSION {metric}: {before:.6g} -> {after:.6g} (+{change:.0%})")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Cold start benchmark: import-time breakdown and time to first render.
+
+Every measurement runs in a fresh interpreter, so module caches and parsed
+AWS service models from earlier runs do not hide startup cost.
+
+Usage:
+    python -m benchmarks.startup            # import-time breakdown of app.main
+    python -m benchmarks.startup --top 40
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Modules whose cumulative import time is reported
+TRACKED_MODULES = ("app.main", "streamlit", "boto3", "botocore")
+
+
+def parse_importtime(stderr):
+    """Parse `-X importtime` output into [(module, self_us, cumulative_us, depth)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def import_breakdown(statement="import streamlit; import app.main"):
+    """Import app.main in a fresh interpreter and return its importtime rows."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return parse_importtime(result.stderr)
+
+
+def _run_child(page, think_time):
+    """Measure one page in a fresh interpreter and return its timings."""
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child", page, "--think-time", str(think_time)],
+        cwd=PROJECT_ROOT,
+        env={**os.environ, "CONVERSATION_STORE": "memory"},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(quick=False, think_time=1.0):
+    """Import times and time to first render of the setup and chat pages."""
+    # Streamlit is imported first so its own cost stays out of app.main's number
+    rows = import_breakdown()
+    cumulative = {}
+    for name, _self_us, cumulative_us, _depth in rows:
+        if name in TRACKED_MODULES:
+            cumulative[name] = max(cumulative.get(name, 0), cumulative_us)
+
+    repeats = 1 if quick else 3
+    pages = {}
+    for page in ("setup", "chat"):
+        samples = [_run_child(page, think_time) for _ in range(repeats)]
+        pages[page] = {key: min(sample[key] for sample in samples) for key in samples[0]}
+
+    return {
+        "import_seconds": {name: us / 1e6 for name, us in cumulative.items()},
+        "boto3_imported_by_app_main": "boto3" in cumulative,
+        **pages,
+    }
+
+
+def _child(page, think_time):
+    """Runs in the fresh interpreter: render one page and print its timings as JSON."""
+    started = time.perf_counter()
+    sys.path.insert(0, str(PROJECT_ROOT))
+    import logging
+    logging.disable(logging.WARNING)
+
+    from streamlit.testing.v1 import AppTest
+    timings = {"streamlit_import_seconds": time.perf_counter() - started}
+
+    at = AppTest.from_file(str(PROJECT_ROOT / "app" / "main.py"), default_timeout=60)
+    if page == "chat":
+        from benchmarks.fakes import FakeAws
+        from benchmarks.run import AGENT_ARN
+        from app.core.aws_client import ClientPool, set_client_factory
+
+        # Build a real boto3 client for every call, so the SDK import and model
+        # loading are paid as in production, but answer with the local fakes
+        real_pool = ClientPool()
+        fake_aws = FakeAws()
+
+        def factory(service_name, region_name):
+            real_pool.get_client(service_name, region_name, "AKIABENCHMARK", "bench-secret")
+            return fake_aws(service_name, region_name)
+
+        set_client_factory(factory)
+        at.session_state["aws_access_key_id"] = "AKIABENCHMARK"
+        at.session_state["aws_secret_access_key"] = "bench-secret"
+        at.session_state["aws_account_id"] = "123456789012"
+        at.session_state["credentials_configured"] = True
+        at.session_state["agent_arn"] = AGENT_ARN
+
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"App raised: {at.exception[0].value}")
+    timings["first_render_seconds"] = time.perf_counter() - started
+
+    if page == "chat":
+        # The user reads the page before typing; the SDK warms up meanwhile
+        time.sleep(think_time)
+        turn_started = time.perf_counter()
+        at.chat_input[0].set_value("Hello").run()
+        if at.exception:
+            raise RuntimeError(f"App raised: {at.exception[0].value}")
+        timings["first_turn_seconds"] = time.perf_counter() - turn_started
+
+    print(json.dumps(timings))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25, help="Number of slowest imports to list")
+    parser.add_argument("--child", choices=("setup", "chat"), help=argparse.SUPPRESS)
+    parser.add_argument("--think-time", type=float, default=1.0, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.child, args.think_time)
+        return 0
+
+    rows = import_breakdown()
+    # Children are listed before their parent, so everything after the
+    # top-level streamlit row was imported on behalf of app.main
+    streamlit_row = max(i for i, row in enumerate(rows) if row[0] == "streamlit" and row[3] == 0)
+    app_rows = rows[streamlit_row + 1:]
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module (imported by app.main)")
+    for name, self_us, cumulative_us, depth in sorted(app_rows, key=lambda row: -row[2])[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {'  ' * depth}{name}")
+    print()
+    print(f"boto3 imported by app.main: {'yes' if any(row[0] == 'boto3' for row in app_rows) else 'no'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())